@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+## \file __main__.py
+# \brief Entry point of python -m arsc, see cli.py
+import sys
+from arsc.cli import main
+
+sys.exit(main())
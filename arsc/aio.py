@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+## \file aio.py
+# \brief Loading and resolving tables without blocking asyncio event loop
+import asyncio
+import os
+import tempfile
+import unittest
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from arsc.parallel import assemble
+from arsc.parallel import batches
+from arsc.parallel import chunks
+from arsc.parallel import parse_ranges
+from arsc.parallel import _parse_ranges
+from arsc.parallel import _share
+from arsc.resolver import Resolver
+
+## \class AsyncLoader
+# \brief Runs parsing and resolving of tables in executor in bounded slices
+# \details Every blocking step (reading file, parsing batch of chunks of at
+# least BATCH bytes, building Resolver, resolving SLICE ids) is a separate
+# call in EXECUTOR (default executor of the loop, if None), so the event loop
+# gets control between them and other requests are not delayed by one large
+# table. At most LIMIT tables are parsed at once, others wait for their turn.
+#
+# EXECUTOR may also be concurrent.futures.ProcessPoolExecutor. Parsed tables
+# and resolvers can not be sent to other processes (tables keep views of
+# their source), so only batches of chunks are parsed there: workers map the
+# table file into memory (bytes are written to temporary file first, see
+# parallel.from_bytes()) and send parsed chunks back. The table is assembled
+# and resolved in threads of default executor of the loop.
+#
+# Cancelling awaiting task stops the work after current slice; the slice
+# itself can not be interrupted and finishes in background.
+class AsyncLoader:
+
+    def __init__(self, executor=None, limit=4, batch=256 << 10, slice=1024):
+        ## concurrent.futures.Executor running the work, None for default
+        self.executor = executor
+        ## Maximal number of tables parsed at once
+        self.limit = limit
+        ## Minimal number of bytes of chunks parsed in one slice
+        self.batch = batch
+        ## Number of ids resolved in one slice
+        self.slice = slice
+        self._semaphore = asyncio.Semaphore(limit)
+
+    ## Checks whether executor runs the work in other processes
+    def _processes(self):
+        return isinstance(self.executor, ProcessPoolExecutor)
+
+    ## Calls FN with ARGS in executor and waits for result
+    # \details Pool of processes is left to parsing, see _parse(), and FN
+    # runs in a thread.
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        executor = None if self._processes() else self.executor
+        return await loop.run_in_executor(executor, fn, *args)
+
+    ## Parses chunks at RANGES of table B, stored in file at PATH
+    # \details Processes read the chunks from the file, threads from B.
+    async def _parse(self, b, path, ranges):
+        loop = asyncio.get_running_loop()
+        if self._processes():
+            return await loop.run_in_executor(self.executor, _parse_ranges,
+                    path, ranges)
+        return await loop.run_in_executor(self.executor, parse_ranges, b,
+                ranges)
+
+    ## Deserializes table B, stored in file at PATH, if not None
+    async def _from_bytes(self, b, path):
+        async with self._semaphore:
+            table, packages, ranges = await self._call(chunks, b)
+            shared = None
+            if self._processes() and path is None:
+                shared = await self._call(_share, b)
+                path = shared.name
+            try:
+                objs = []
+                for r in batches(ranges, self.batch):
+                    objs += await self._parse(b, path, r)
+            finally:
+                if shared is not None:
+                    shared.close()
+            return await self._call(assemble, b, table, packages, ranges,
+                    objs)
+
+    ## Deserializes table from B
+    # \details Returns the same as ResTable.from_bytes().
+    async def from_bytes(self, b):
+        return await self._from_bytes(b, None)
+
+    ## Deserializes table stored in file at PATH
+    async def open(self, path):
+        b = await self._call(_read, path)
+        table, _ = await self._from_bytes(b, path)
+        return table
+
+    ## Returns resolver.Resolver of TABLE, building it on first use
+    # \details Resolver is kept by the table, so it is shared by all loaders.
+    async def resolver(self, table):
+        resolver = getattr(table, '_resolver', None)
+        if resolver is None:
+            resolver = await self._call(Resolver, table)
+            table._resolver = resolver
+        return resolver
+
+    ## Resolves every resource id of IDS for DEVICE
+    # \details Returns list of ResTable_type chunks, as returned by
+    # Resolver.resolve(), in order of IDS.
+    async def resolve(self, table, ids, device):
+        resolver = await self.resolver(table)
+        ids = list(ids)
+        ret = []
+        for i in range(0, len(ids), self.slice):
+            ret += await self._call(_resolve, resolver, ids[i:i + self.slice],
+                    device)
+        return ret
+
+## Default loaders, one for every event loop
+_loaders = weakref.WeakKeyDictionary()
+
+## Returns AsyncLoader used, when none is given
+def default_loader():
+    loop = asyncio.get_running_loop()
+    loader = _loaders.get(loop)
+    if loader is None:
+        loader = AsyncLoader()
+        _loaders[loop] = loader
+    return loader
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _resolve(resolver, ids, device):
+    return [resolver.resolve(resid, device) for resid in ids]
+
+
+class AsyncLoaderTests(unittest.TestCase):
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        return MergeTests.sample()
+
+    def test_from_bytes(self):
+        from arsc.arsc import ResTable
+        b = AsyncLoaderTests.tv1_bytes()
+        expected = ResTable.from_bytes(b)
+        actual = asyncio.run(AsyncLoader(batch=1).from_bytes(b))
+
+        self.assertEqual(expected, actual)
+
+    def test_aopen(self):
+        from arsc.arsc import ResTable
+        b = AsyncLoaderTests.tv1_bytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            expected, _ = ResTable.from_bytes(b)
+            actual = asyncio.run(ResTable.aopen(path))
+
+        self.assertEqual(expected, actual)
+
+    def test_aresolve(self):
+        from arsc.arsc import ResTable
+        from arsc.config import ResTable_config
+        table, _ = ResTable.from_bytes(AsyncLoaderTests.tv1_bytes())
+        default, de = table.packages[0].types[0][1:]
+        device = ResTable_config(locale=ResTable_config.Locale('de'))
+        expected = [de, default, None]
+        actual = asyncio.run(table.aresolve([0x7f010000, 0x7f010001,
+            0x7f010002], device, AsyncLoader(slice=1)))
+
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            self.assertIs(e, a)
+
+    ## AsyncLoader recording every parsed slice
+    class Recording(AsyncLoader):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            ## Number of slices being parsed now
+            self.active = 0
+            ## Maximal number of slices parsed at once
+            self.peak = 0
+            ## Number of started slices
+            self.started = 0
+            ## Set, when first slice starts
+            self.first = asyncio.Event()
+
+        async def _parse(self, b, path, ranges):
+            self.started += 1
+            self.first.set()
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                # keep the slice running, so others can overlap it
+                await asyncio.sleep(0.01)
+                return await super()._parse(b, path, ranges)
+            finally:
+                self.active -= 1
+
+    def test_process_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from arsc.arsc import ResTable
+        from arsc.config import ResTable_config
+        b = AsyncLoaderTests.tv1_bytes()
+        device = ResTable_config(locale=ResTable_config.Locale('de'))
+
+        async def main(loader, path):
+            table, _ = await loader.from_bytes(b)
+            opened = await loader.open(path)
+            resolved = await table.aresolve([0x7f010000, 0x7f010001],
+                    device, loader)
+            return table, opened, resolved
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            with ProcessPoolExecutor(2) as executor:
+                table, opened, resolved = asyncio.run(main(AsyncLoader(
+                    executor, batch=1, slice=1), path))
+        expected, _ = ResTable.from_bytes(b)
+        default, de = table.packages[0].types[0][1:]
+
+        self.assertEqual((expected, expected), (table, opened))
+        self.assertEqual(2, len(resolved))
+        self.assertIs(de, resolved[0])
+        self.assertIs(default, resolved[1])
+
+    def test_limit(self):
+        b = AsyncLoaderTests.tv1_bytes()
+        loader = AsyncLoaderTests.Recording(limit=2, batch=1)
+
+        async def main():
+            return await asyncio.gather(*[loader.from_bytes(b)
+                for i in range(5)])
+
+        results = asyncio.run(main())
+        expected = (5, 2, False)
+        actual = (len(results), loader.peak, loader._semaphore.locked())
+
+        self.assertEqual(expected, actual)
+
+    def test_cancel(self):
+        b = AsyncLoaderTests.tv1_bytes()
+        loader = AsyncLoaderTests.Recording(batch=1)
+
+        async def main():
+            task = asyncio.create_task(loader.from_bytes(b))
+            await loader.first.wait()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                cancelled = True
+            else:
+                cancelled = False
+            started = loader.started
+            # give the loader time to start another slice, if it would
+            await asyncio.sleep(0.05)
+            return cancelled, started, loader.started
+
+        # sample table has 6 chunks, parsed one by one with batch=1
+        expected = (True, 1, 1)
+        actual = asyncio.run(main())
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+## \file apk.py
+# \brief Reading tables straight from APK and other ZIP archives
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+import zipfile
+
+## Local file header of ZIP member, without name and extra field
+_local = struct.Struct('<4sHHHHHIIIHH')
+_LOCAL_MAGIC = b'PK\3\4'
+
+## Returns offset of data of member INFO in ZIP archive opened as F
+# \details Extra field of local header may differ from the one in central
+# directory, so local header has to be read.
+def data_offset(f, info):
+    f.seek(info.header_offset)
+    header = f.read(_local.size)
+    if len(header) != _local.size or header[:4] != _LOCAL_MAGIC:
+        raise zipfile.BadZipFile('wrong local header of {}'.format(
+            info.filename))
+    fields = _local.unpack(header)
+    return info.header_offset + _local.size + fields[9] + fields[10]
+
+## Returns contents of MEMBER of ZIP archive at PATH
+# \details Member that is STORED (as resources.arsc has to be since API 30)
+# is not read at all: archive is mapped into memory and view of the member
+# is returned. Compressed member is decompressed in a stream into buffer
+# allocated once for its whole size.
+def read_member(path, member='resources.arsc'):
+    with zipfile.ZipFile(path) as z:
+        info = z.getinfo(member)
+        if info.compress_type == zipfile.ZIP_STORED and \
+                not info.flag_bits & 0x1:
+            with open(path, 'rb') as f:
+                offset = data_offset(f, info)
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(buf)[offset:offset + info.file_size]
+
+        buf = bytearray(info.file_size)
+        view = memoryview(buf)
+        with z.open(info) as src:
+            pos = 0
+            while pos < len(buf):
+                n = src.readinto(view[pos:])
+                if n == 0:
+                    break
+                pos += n
+        return buf
+
+
+class ApkTests(unittest.TestCase):
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        from arsc.config import ResTable_config
+        return bytes(MergeTests.table({ResTable_config(): {'a': 'x'}}))
+
+    def write_apk(directory, compression):
+        path = os.path.join(directory, 'app.apk')
+        with zipfile.ZipFile(path, 'w') as z:
+            z.writestr('AndroidManifest.xml', b'\0' * 100,
+                    zipfile.ZIP_DEFLATED)
+            z.writestr('resources.arsc', ApkTests.tv1_bytes(), compression)
+        return path
+
+    def test_read_member_stored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = ApkTests.write_apk(directory, zipfile.ZIP_STORED)
+            invector = read_member(path)
+            expected = (ApkTests.tv1_bytes(), True)
+            actual = (bytes(invector), isinstance(invector.obj, mmap.mmap))
+            invector.release()
+
+        self.assertEqual(expected, actual)
+
+    def test_read_member_deflated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = ApkTests.write_apk(directory, zipfile.ZIP_DEFLATED)
+            expected = ApkTests.tv1_bytes()
+            actual = bytes(read_member(path))
+
+        self.assertEqual(expected, actual)
+
+    def test_open_apk(self):
+        from arsc.arsc import ResTable
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            with tempfile.TemporaryDirectory() as directory:
+                path = ApkTests.write_apk(directory, compression)
+                expected, _ = ResTable.from_bytes(ApkTests.tv1_bytes())
+                actual = ResTable.open_apk(path)
+
+                self.assertEqual(expected, actual)
+                self.assertEqual(ApkTests.tv1_bytes(), bytes(actual))
+
+    def test_missing_member(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'app.apk')
+            with zipfile.ZipFile(path, 'w') as z:
+                z.writestr('classes.dex', b'dex')
+            with self.assertRaises(KeyError):
+                read_member(path)
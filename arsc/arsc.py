@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 ## \file arsc.py
 # \brief Main resource table functionality
+import io
+import os
+import tempfile
 import unittest
 from arsc.type.uint32 import uint32
 from arsc.chunk import ResChunk_header
@@ -14,13 +17,25 @@ from arsc.tabletype import ResTable_typeSpec
 from arsc.tabletype import ResTable_typeSpec_header
 from arsc.tabletype import ResTable_type
 from arsc.tabletype import ResTable_type_header
+from arsc.config import ResTable_config
+from arsc.config import ResTable_configPool
+from arsc.library import DynamicRefTable
+from arsc.library import ResTable_lib
+from arsc.library import ResTable_lib_header
+from arsc.library import ResTable_lib_entry
+from arsc.merkle import tree
+from arsc.sidecar import IndexedTable
+from arsc.apk import read_member
+from arsc.columns import columns
+from arsc.memory import memory_report
+from arsc.tracked import Tracked
 from arsc.exceptions import WrongTypeException
 from arsc.exceptions import ChunkHeaderWrongTypeException
 
 ## \class ResTable
-class ResTable:
+class ResTable(Tracked):
 
-    def __init__(self, header=None, values=None, packages=None):
+    def __init__(self, header=None, values=None, packages=None, configs=None):
         # handle defaults
         if header is None:
             header = ResTable_header()
@@ -44,6 +59,12 @@ class ResTable:
         if len(packages) > 0 and not isinstance(packages[0], ResTable_package):
             raise WrongTypeException('packages[0]', ResTable_package)
 
+        if configs is None:
+            configs = ResTable_configPool()
+
+        if not isinstance(configs, ResTable_configPool):
+            raise WrongTypeException('configs', ResTable_configPool)
+
         # store in object
         ## table.ResTable_header instance. Defines length of resource table and
         #  number of packages.
@@ -54,6 +75,74 @@ class ResTable:
         ## List of package.ResTable_package of length defined in
         #  table.ResTable_header. Stores all resource names and attributes.
         self.packages = packages
+        ## config.ResTable_configPool with unique configurations of all
+        #  ResTable_type chunks in the table.
+        self.configs = configs
+
+        self.intern_configs()
+
+    ## Makes all ResTable_type chunks reference configurations from self.configs
+    # \details Chunks already referencing the pool are left untouched, so
+    # this is cheap to call after adding new chunks to the table.
+    def intern_configs(self):
+        configs = self.configs
+        for pkg in self.packages:
+            for spec in pkg.types or []:
+                for typ in (spec or [])[1:]:
+                    header = typ.header
+                    if header.configId is not None and \
+                            header.configId < len(configs) and \
+                            configs[header.configId] is header.config:
+                        continue
+                    header.configId = configs.intern(header.config)
+                    header.config = configs[header.configId]
+
+    ## Returns library.DynamicRefTable of every package, keyed by package id
+    # \details Shared libraries referenced by a package are mapped to ids of
+    # packages of the same name present in this table.
+    def dynamic_ref_tables(self):
+        ids = {}
+        for pkg in self.packages:
+            name = pkg.header.name.decode('utf-16-le').split('\0', 1)[0]
+            ids[name] = pkg.header.id.integer
+
+        tables = {}
+        for pkg in self.packages:
+            table = DynamicRefTable(pkg.header.id.integer)
+            if pkg.library is not None:
+                table.load(pkg.library)
+                for name, id in ids.items():
+                    table.add_mapping(name, id)
+            tables[pkg.header.id.integer] = table
+        return tables
+
+    ## Generates entries matching given predicates
+    # \details See query.query() for arguments and results.
+    def query(self, **predicates):
+        # query depends on this module, so it can not be imported at top
+        from arsc.query import query
+        return query(self, **predicates)
+
+    ## Returns NumPy structured array with one row for every entry
+    # \details See columns.columns() for fields. Requires NumPy.
+    def to_columns(self):
+        return columns(self)
+
+    ## Returns estimated memory retained by parts of the table
+    # \details See memory.memory_report() for the parts.
+    def memory_report(self):
+        return memory_report(self)
+
+    ## Returns merkle.MerkleNode hash tree of the serialized table
+    # \details Two tables can be compared with merkle.diff() on their trees,
+    # which only descends into chunks that differ. Nodes are cached in
+    # chunks, so the table is not serialized again while it stays clean and
+    # only chunks changed since then are hashed again.
+    def merkle(self):
+        cached = self.__dict__.get('_merkle')
+        if cached is not None and not self.is_dirty():
+            return cached
+        return tree(bytes(self), self)
 
     def __str__(self):
         pkgstrlist = []
@@ -79,23 +168,132 @@ class ResTable:
         return len(bytes(self))
 
     def __bytes__(self):
-        header = bytes(self.header)
-        values = bytes(self.values)
-        packages = bytes()
-        for pkg in self.packages:
-            packages += bytes(pkg)
+        return b''.join(self.parts())
 
-        return header + values + packages
+    def snapshot(self):
+        return (bytes(self.header), tuple(self.packages))
 
+    def is_dirty(self):
+        if Tracked.is_dirty(self) or self.values.is_dirty():
+            return True
+        for pkg in self.packages:
+            if pkg.is_dirty():
+                return True
+        return False
+
+    ## Marks table as changed
+    # \details Besides encoding the table again on serialization, this counts
+    # the change, so indexes built over the table are built again, see
+    # changes(). Call it after adding, removing or reconfiguring chunks of
+    # the table in place.
+    def touch(self):
+        Tracked.touch(self)
+        object.__setattr__(self, '_changes', self.changes() + 1)
+
+    ## Returns number of changes of the table, see touch()
+    # \details Assigning public attributes of the table counts as change too.
+    def changes(self):
+        return self.__dict__.get('_changes', 0)
+
+    def __setattr__(self, name, value):
+        Tracked.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            object.__setattr__(self, '_changes', self.changes() + 1)
+
+    ## Returns list of bytes-like objects, that serialize the table
+    # \details Only chunks changed since parsing are encoded, everything
+    # else is a view of the source buffer. If table was parsed, its size and
+    # number of packages are updated first.
+    def parts(self):
+        if not self.is_dirty():
+            return [self.source()]
+
+        parts = [self.values.buffer()]
+        for pkg in self.packages:
+            parts += pkg.parts()
+        if self.source() is not None:
+            self.header.header.size = uint32(
+                    self.header.header.headerSize.integer +
+                    sum(len(p) for p in parts), little=True)
+            self.header.packageCount = uint32(len(self.packages),
+                    little=True)
+        return [bytes(self.header)] + parts
+
+    ## Writes serialized table to file object F
+    # \details Clean chunks are written straight from the source buffer.
+    def write(self, f):
+        for part in self.parts():
+            f.write(part)
+
+    ## Returns list of chunks contained in the table, in serialization order
+    def chunks(self):
+        return [self.values] + self.packages
+
+    ## Remembers SOURCE as original bytes of the table and all its chunks
+    def track(self, source):
+        Tracked.track(self, source)
+        offset = self.header.header.headerSize.integer
+        for chunk in self.chunks():
+            size = chunk.header.header.size.integer
+            chunk.track(source[offset:offset + size])
+            offset += size
+
+    ## Deserializes table from B
+    # \details Every chunk remembers its range of B, so serializing table
+    # after small change copies most of the bytes instead of encoding them.
     def from_bytes(b, little=True):
+        source = memoryview(b)
         header, b = ResTable_header.from_bytes(b)
         values, b = ResStringPool.from_bytes(b)
+        configs = ResTable_configPool()
         packages = []
         for i in range(header.packageCount.integer):
-            pkg, b = ResTable_package.from_bytes(b)
+            pkg, b = ResTable_package.from_bytes(b, configs=configs)
             packages.append(pkg)
 
-        return ResTable(header, values, packages), b
+        table = ResTable(header, values, packages, configs)
+        table.track(source[:header.header.size.integer])
+        return table, b
+
+    ## Opens table stored as MEMBER of APK (or other ZIP archive) at PATH
+    # \details STORED member is parsed straight from archive mapped into
+    # memory and the table keeps the mapping as its source, compressed one is
+    # decompressed first (see apk.read_member()).
+    def open_apk(path, member='resources.arsc'):
+        table, _ = ResTable.from_bytes(read_member(path, member))
+        return table
+
+    ## Opens table stored in file at PATH without blocking event loop
+    # \details Work is done by LOADER, aio.default_loader() if None.
+    async def aopen(path, loader=None):
+        # aio depends on this module, so it can not be imported at top
+        from arsc.aio import default_loader
+        if loader is None:
+            loader = default_loader()
+        return await loader.open(path)
+
+    ## Resolves resource ids IDS for DEVICE without blocking event loop
+    # \details Returns list of ResTable_type chunks defining every id, as
+    # resolver.Resolver.resolve() does. Work is done by LOADER,
+    # aio.default_loader() if None.
+    async def aresolve(self, ids, device, loader=None):
+        from arsc.aio import default_loader
+        if loader is None:
+            loader = default_loader()
+        return await loader.resolve(self, ids, device)
+
+    ## Opens table stored in file at PATH
+    # \details Without INDEX the whole file is parsed and ResTable is
+    # returned. INDEX may be sidecar.Sidecar or path to .arscidx file made by
+    # it, then sidecar.IndexedTable is returned, which reads only the few
+    # bytes needed by every lookup. If VERIFY is set, checksum of the file is
+    # compared with the one stored in the index.
+    def open(path, index=None, verify=False):
+        if index is not None:
+            return IndexedTable.open(path, index, verify)
+        with open(path, 'rb') as f:
+            table, _ = ResTable.from_bytes(f.read())
+        return table
 
 
 class ResTableTests(unittest.TestCase):
@@ -420,3 +618,164 @@ class ResTableTests(unittest.TestCase):
         actual = ResTable.from_bytes(invector)
 
         self.assertEqual(expected, actual)
+
+    def test_from_bytes_interns_configs(self):
+        invector = ResTableTests.tv1_bytes
+        table, _ = ResTable.from_bytes(invector)
+        default, de = table.packages[0].types[0][1:]
+        expected = (0, 1, 2)
+        actual = (default.header.configId, de.header.configId,
+                len(table.configs))
+
+        self.assertEqual(expected, actual)
+        self.assertIs(table.configs[1], de.header.config)
+
+    def test_init_interns_configs(self):
+        invector = ResTable(ResTable_header(), ResStringPool(), [
+            ResTable_package(types=[[ResTable_typeSpec(),
+                ResTable_type(ResTable_type_header(config=ResTable_config())),
+                ResTable_type(ResTable_type_header(config=ResTable_config()))
+            ]])])
+        lhs, rhs = invector.packages[0].types[0][1:]
+        expected = (0, 0, 1)
+        actual = (lhs.header.configId, rhs.header.configId,
+                len(invector.configs))
+
+        self.assertEqual(expected, actual)
+        self.assertIs(lhs.header.config, rhs.header.config)
+
+    def test_dynamic_ref_tables(self):
+        lib = ResTable_package(ResTable_package_header(id=0x7f,
+            name='com.app\0'.encode('utf-16-le')), types=[],
+            library=ResTable_lib(ResTable_lib_header(count=1),
+                [ResTable_lib_entry(2, 'com.lib')]))
+        shared = ResTable_package(ResTable_package_header(id=0x05,
+            name='com.lib\0'.encode('utf-16-le')), types=[])
+        invector = ResTable(ResTable_header(packageCount=2), ResStringPool(),
+                [lib, shared])
+        tables = invector.dynamic_ref_tables()
+        expected = (0x05010000, 0x05010000)
+        actual = (tables[0x7f].lookup_resource_id(0x02010000),
+                tables[0x05].lookup_resource_id(0x00010000))
+
+        self.assertEqual(expected, actual)
+
+    def test_merkle(self):
+        invector, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+        # fixture declares wrong size, which is fixed when table is encoded
+        invector.touch()
+        expected = ResTableTests.tv1_obj.packages[0].header.header.size.integer
+        actual = invector.merkle().children[('package', 0x7f)].chunk.size
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_is_clean(self):
+        invector, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+        expected = (False, ResTableTests.tv1_bytes)
+        actual = (invector.is_dirty(), bytes(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_changes(self):
+        invector, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+        before = invector.changes()
+        invector.packages[0].types[0][2].touch()
+        untouched = invector.changes()
+        invector.touch()
+        touched = invector.changes()
+        invector.packages = invector.packages[:1]
+        expected = (0, 1, 2, True)
+        actual = (untouched - before, touched - before,
+                invector.changes() - before, invector.is_dirty())
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes_reencodes_dirty_chunk(self):
+        invector, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+        pkg = invector.packages[0]
+        pkg.keyStrings.set_string(3, 'backward')
+        expected = ResTableTests.tv1_bytes[:0x1b4 + 0x28] + \
+                bytes(pkg.keyStrings) + ResTableTests.tv1_bytes[0x228:]
+        actual = bytes(invector)
+
+        self.assertEqual(True, invector.is_dirty())
+        self.assertEqual(False, pkg.types[0][1].is_dirty())
+        # package grew by 4 bytes, table size declared by fixture is fixed
+        self.assertEqual(expected[:4] + b'\x34\3\0\0', actual[:8])
+        self.assertEqual(776 + 4, pkg.header.header.size.integer)
+        self.assertEqual(expected[0x30:], actual[0x30:])
+
+    def tv2_obj():
+        from arsc.merge import MergeTests
+        invector, _ = ResTable.from_bytes(MergeTests.sample())
+        return invector
+
+    def test_nested_header_edit_is_serialized(self):
+        invector = ResTableTests.tv2_obj()
+        invector.packages[0].header.id = uint32(0x7e, little=True)
+        table, _ = ResTable.from_bytes(bytes(invector))
+        expected = (True, 0x7e)
+        actual = (invector.is_dirty(), table.packages[0].header.id.integer)
+
+        self.assertEqual(expected, actual)
+
+    def test_nested_config_edit_is_serialized(self):
+        invector = ResTableTests.tv2_obj()
+        invector.packages[0].types[0][2].header.config = ResTable_config(
+                locale=ResTable_config.Locale('fr'))
+        table, _ = ResTable.from_bytes(bytes(invector))
+        expected = (False, {'locale': 'fr'})
+        actual = (invector.packages[0].types[0][1].is_dirty(),
+                table.packages[0].types[0][2].header.config.qualifiers())
+
+        self.assertEqual(expected, actual)
+
+    def test_types_list_edit_is_serialized(self):
+        invector = ResTableTests.tv2_obj()
+        removed = invector.packages[0].types[0][2]
+        del invector.packages[0].types[0][2]
+        table, _ = ResTable.from_bytes(bytes(invector))
+        invector.packages[0].types[0].append(removed)
+        appended, _ = ResTable.from_bytes(bytes(invector))
+        expected = (2, 3)
+        actual = (len(table.packages[0].types[0]),
+                len(appended.packages[0].types[0]))
+
+        self.assertEqual(expected, actual)
+
+    def test_packages_list_edit_is_serialized(self):
+        invector = ResTableTests.tv2_obj()
+        invector.packages.append(ResTableTests.tv2_obj().packages[0])
+        invector.packages[1].header.id = uint32(0x7e, little=True)
+        table, _ = ResTable.from_bytes(bytes(invector))
+        expected = [0x7f, 0x7e]
+        actual = [pkg.header.id.integer for pkg in table.packages]
+
+        self.assertEqual(expected, actual)
+
+    def test_write(self):
+        invector, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+        invector.packages[0].types[0][2].touch()
+        f = io.BytesIO()
+        invector.write(f)
+        expected = len(ResTableTests.tv1_bytes)
+        actual = len(f.getvalue())
+
+        self.assertEqual(expected, actual)
+
+    def test_open(self):
+        from arsc.sidecar import Sidecar
+        from arsc.merge import MergeTests
+        b = bytes(MergeTests.table({ResTable_config(): {'a': 'x'}}))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            table = ResTable.open(path)
+            with ResTable.open(path, Sidecar.build(b)) as indexed:
+                entry = indexed.entry(0x7f010000)
+                string = indexed.string(entry.value.data.integer)
+        expected = ('x', 'x')
+        actual = (table.values.string(0), string)
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+## \file batch.py
+# \brief Parsing many tables in parallel processes
+import os
+import tempfile
+import traceback
+import unittest
+import zipfile
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from arsc.arsc import ResTable
+from arsc.apk import read_member
+
+## \class BatchResult
+# \brief Outcome of processing one table of a batch
+class BatchResult:
+
+    def __init__(self, source, value=None, error=None):
+        ## Path or (archive path, member name) the table was read from
+        self.source = source
+        ## Value returned by extraction function
+        self.value = value
+        ## Formatted traceback, if parsing or extraction failed
+        self.error = error
+
+    def __str__(self):
+        return '{{source={source}, value={value}, error={error}}}'.format(
+                source=self.source, value=self.value, error=self.error)
+
+    def __repr__(self):
+        return '{c}({source}, {value}, {error})'.format(
+                c=type(self).__name__, source=repr(self.source),
+                value=repr(self.value), error=repr(self.error))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.source == rhs.source and \
+                self.value == rhs.value and \
+                self.error == rhs.error
+
+    ## Checks whether table was processed without error
+    def ok(self):
+        return self.error is None
+
+## Returns bytes of table from SOURCE
+# \details SOURCE is either path to table file or pair of path to zip archive
+# (eg. APK) and name of its member, which is read with apk.read_member().
+def read_source(source):
+    if isinstance(source, tuple):
+        archive, member = source
+        return read_member(archive, member)
+    with open(source, 'rb') as f:
+        return f.read()
+
+## Parses tables of SOURCES and applies EXTRACT to every one of them
+# \details Runs in worker process. Only the list of BatchResult, holding what
+# EXTRACT returned, is sent back to the parent, never the parsed tables.
+def _work(extract, sources):
+    ret = []
+    for source in sources:
+        try:
+            table, _ = ResTable.from_bytes(read_source(source))
+            ret.append(BatchResult(source, extract(table)))
+        except Exception:
+            ret.append(BatchResult(source, error=traceback.format_exc()))
+    return ret
+
+## Parses tables of SOURCES in pool of processes and yields results
+# \details EXTRACT is called with every parsed ResTable in worker process and
+# has to return something small and picklable; it must be picklable itself,
+# so it has to be defined at module level. SOURCES are submitted in chunks of
+# CHUNKSIZE and at most PENDING chunks are in flight at once, so SOURCES may be
+# a lazy iterable of any length. BatchResult objects are yielded in order of
+# completion. Failure of one table does not affect others, it is reported in
+# BatchResult.error. If worker process dies, all tables of its chunk (and
+# of other chunks still running in the pool) get the error.
+#
+# Pool of WORKERS processes is created, unless EXECUTOR is given. Pool broken
+# by dead worker is replaced with a new one and remaining sources are
+# processed by it. Broken EXECUTOR can not be replaced, so all sources, that
+# were not processed yet, get the error.
+def parse_all(sources, extract, workers=None, chunksize=16, pending=None,
+        executor=None):
+    own = executor is None
+    if own:
+        executor = ProcessPoolExecutor(workers)
+    if pending is None:
+        pending = 2 * (workers or os.cpu_count() or 1)
+
+    sources = iter(sources)
+    futures = {}
+    try:
+        while True:
+            while len(futures) < pending:
+                chunk = list(islice(sources, chunksize))
+                if len(chunk) == 0:
+                    break
+                try:
+                    future = executor.submit(_work, extract, chunk)
+                except BrokenProcessPool:
+                    if not own:
+                        error = traceback.format_exc()
+                        yield from [BatchResult(s, error=error)
+                                for s in chunk]
+                        continue
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(workers)
+                    future = executor.submit(_work, extract, chunk)
+                futures[future] = chunk
+            if len(futures) == 0:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = futures.pop(future)
+                try:
+                    results = future.result()
+                except Exception:
+                    error = traceback.format_exc()
+                    results = [BatchResult(s, error=error) for s in chunk]
+                yield from results
+    finally:
+        for future in futures:
+            future.cancel()
+        if own:
+            executor.shutdown()
+
+
+class BatchTests(unittest.TestCase):
+
+    def package_names(table):
+        return [p.header.name.decode('utf-16-le').split('\0', 1)[0]
+                for p in table.packages]
+
+    def failing(table):
+        raise ValueError('failed on purpose')
+
+    def dying(table):
+        if table.packages[0].keyStrings.index('die') is not None:
+            os._exit(1)
+        return True
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        from arsc.config import ResTable_config
+        return bytes(MergeTests.table({ResTable_config(): {'a': 'x'}}))
+
+    def write_dying(directory):
+        from arsc.merge import MergeTests
+        from arsc.config import ResTable_config
+        path = os.path.join(directory, 'dying.arsc')
+        with open(path, 'wb') as f:
+            f.write(bytes(MergeTests.table({
+                ResTable_config(): {'die': 'x'}})))
+        return path
+
+    def write_sources(directory):
+        b = BatchTests.tv1_bytes()
+        path = os.path.join(directory, 'resources.arsc')
+        with open(path, 'wb') as f:
+            f.write(b)
+        archive = os.path.join(directory, 'app.apk')
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('resources.arsc', b)
+        broken = os.path.join(directory, 'broken.arsc')
+        with open(broken, 'wb') as f:
+            f.write(b[:20])
+        return path, (archive, 'resources.arsc'), broken
+
+    def test_read_source(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, member, _ = BatchTests.write_sources(directory)
+            expected = read_source(path)
+            actual = read_source(member)
+
+        self.assertEqual(expected, actual)
+
+    def test_work_isolates_failures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, member, broken = BatchTests.write_sources(directory)
+            results = _work(BatchTests.package_names, [path, broken, member])
+        name = BatchTests.package_names(ResTable.from_bytes(
+            BatchTests.tv1_bytes())[0])
+        expected = [(path, name, True), (broken, None, False),
+                (member, name, True)]
+        actual = [(r.source, r.value, r.ok()) for r in results]
+
+        self.assertEqual(expected, actual)
+
+    def test_parse_all(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, member, broken = BatchTests.write_sources(directory)
+            sources = [path, member, broken] * 3
+            results = list(parse_all(sources, BatchTests.package_names,
+                workers=2, chunksize=2, pending=1))
+        expected = [(broken, False)] * 3 + [(path, True)] * 3 + \
+                [(member, True)] * 3
+        actual = sorted([(r.source, r.ok()) for r in results],
+                key=lambda r: str(r))
+
+        self.assertEqual(expected, actual)
+
+    def test_parse_all_extract_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, _, _ = BatchTests.write_sources(directory)
+            result, = parse_all([path], BatchTests.failing, workers=1)
+        expected = 'ValueError: failed on purpose'
+        actual = result.error.strip().splitlines()[-1]
+
+        self.assertEqual(expected, actual)
+
+    def test_parse_all_worker_dies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, _, _ = BatchTests.write_sources(directory)
+            dying = BatchTests.write_dying(directory)
+            sources = [path, dying, path, path]
+            results = list(parse_all(sources, BatchTests.dying, workers=1,
+                chunksize=1, pending=1))
+        expected = [(path, True), (dying, False), (path, True), (path, True)]
+        actual = [(r.source, r.ok()) for r in results]
+
+        self.assertEqual(expected, actual)
+        self.assertIn('BrokenProcessPool', results[1].error)
+
+    def test_parse_all_given_executor_breaks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, _, _ = BatchTests.write_sources(directory)
+            dying = BatchTests.write_dying(directory)
+            sources = [path, dying, path, path]
+            with ProcessPoolExecutor(1) as executor:
+                results = list(parse_all(sources, BatchTests.dying,
+                    chunksize=1, pending=1, executor=executor))
+        expected = [(path, True), (dying, False), (path, False),
+                (path, False)]
+        actual = [(r.source, r.ok()) for r in results]
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+## \file bench.py
+# \brief Benchmark suite run on synthetic tables of configurable scale
+import json
+import platform
+import statistics
+import string
+import struct
+import time
+import tracemalloc
+import unittest
+from arsc.types import ResourceType
+from arsc.chunk import ResChunk_header
+from arsc.arsc import ResTable
+from arsc.merge import package
+from arsc.merge import table
+from arsc.package import ResTable_package_header
+from arsc.stringpool import ResStringPool
+from arsc.stringpool import ResStringPool_header
+from arsc.tabletype import ResTable_typeSpec
+from arsc.tabletype import ResTable_typeSpec_header
+from arsc.tabletype import ResTable_type
+from arsc.tabletype import ResTable_type_header
+from arsc.config import ResTable_config
+from arsc.entry import Res_value
+
+## Version of result format produced by run()
+VERSION = 2
+
+## Benchmarks checked by compare() by default
+GATED = ('parse', 'serialize')
+
+## Default maximal relative loss of throughput allowed by compare()
+THRESHOLD = 0.15
+
+## Named scales of synthetic tables, arguments of generate()
+SCALES = {
+        'small': {'packages': 1, 'types': 2, 'entries': 100, 'configs': 2},
+        'medium': {'packages': 1, 'types': 8, 'entries': 2000,
+            'configs': 4},
+        'large': {'packages': 2, 'types': 16, 'entries': 5000,
+            'configs': 8},
+        'utf16': {'packages': 1, 'types': 8, 'entries': 2000, 'configs': 4,
+            'utf8': False},
+        }
+
+## Returns list of COUNT distinct two-letter language codes
+def _languages(count):
+    letters = string.ascii_lowercase
+    return [a + b for a in letters for b in letters][:count]
+
+## Returns string pool of STRINGS, UTF-8 if UTF8 is true, UTF-16 otherwise
+def _pool(strings, utf8):
+    flags = ResStringPool_header.Flags.UTF8_FLAG if utf8 else 0
+    return ResStringPool(ResStringPool_header(flags=flags)).extended(strings)
+
+## Returns list of chunks of type TYPEID: typeSpec and one type per config
+# \details Default configuration defines every entry, configuration number c
+# (counting from 1) defines every entry, whose index is divisible by c + 1.
+def _type(typeId, entries, configs, strings):
+    locales = [None] + _languages(configs - 1)
+    varies = ResTable_config.Config.CONFIG_LOCALE if configs > 1 else 0
+    flags = [int(varies) if i % 2 == 0 else 0 for i in range(entries)]
+    spec = ResTable_typeSpec(ResTable_typeSpec_header(ResChunk_header(
+        ResourceType.RES_TABLE_TYPE_SPEC_TYPE, 16, 16 + 4 * entries),
+        typeId, 0, 0, entries), struct.pack('<{}I'.format(entries), *flags))
+
+    ret = [spec]
+    for c, locale in enumerate(locales):
+        if locale is None:
+            config = ResTable_config()
+        else:
+            config = ResTable_config(locale=ResTable_config.Locale(locale))
+        raws = []
+        for i in range(entries):
+            if i % (c + 1) != 0:
+                raws.append(None)
+                continue
+            value = (typeId * entries * configs + i * configs + c) % strings
+            raws.append(struct.pack('<HHIHBBI', 8, 0, i, 8, 0,
+                Res_value.TYPE_STRING, value))
+        ret.append(ResTable_type.from_entries(ResTable_type_header(id=typeId,
+            config=config), raws))
+    return ret
+
+## Returns synthetic ResTable of given scale
+# \details Table has PACKAGES packages (ids going down from 0x7f), each with
+# TYPES types of ENTRIES entries in CONFIGS configurations (default one and
+# CONFIGS - 1 locales). Value pool has STRINGS strings (as many as entries
+# of one type by default), key pool has one key per entry and all pools are
+# UTF-8 if UTF8 is true, UTF-16 otherwise. Every entry is a string value
+# and the table is the same for the same arguments.
+def generate(packages=1, types=1, entries=100, configs=1, strings=None,
+        utf8=True):
+    if strings is None:
+        strings = entries
+    values = _pool(['value {:08d}'.format(i) for i in range(strings)], utf8)
+    keys = _pool(['entry_{}'.format(i) for i in range(entries)], utf8)
+    typeStrings = _pool(['type{}'.format(t) for t in range(types)], utf8)
+
+    pkgs = []
+    for p in range(packages):
+        header = ResTable_package_header(id=0x7f - p,
+                name='pkg{}\0'.format(p).encode('utf-16-le'))
+        pkgs.append(package(header, typeStrings, keys, [_type(t + 1, entries,
+            configs, strings) for t in range(types)]))
+    return table(values, pkgs)
+
+## Marks every chunk of TABLE dirty, so serialization encodes all of it
+def touch_all(table):
+    table.touch()
+    table.values.touch()
+    for pkg in table.packages:
+        pkg.touch()
+        for chunk in pkg.chunks():
+            chunk.touch()
+
+## Returns list of REPEAT times of single call of FN, in seconds
+# \details FN is called once more before, so caches are warm when timing
+# starts. Every time is mean of as many consecutive calls, as needed to take
+# at least MINIMUM seconds (at least one), so short calls are not lost in
+# timer resolution and scheduling noise.
+def measure(fn, repeat, minimum=0.05):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    number = max(1, int(minimum / elapsed)) if elapsed > 0 else 1
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+## Returns dictionary of statistics of TIMES, see measure()
+# \details Throughput is WORK (bytes or lookups) done per second in the best
+# run.
+def summary(times, work, unit):
+    best = min(times)
+    return {
+            'best': best,
+            'mean': statistics.mean(times),
+            'median': statistics.median(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'work': work,
+            'throughput': work / best if best > 0 else float('inf'),
+            'unit': unit,
+            'times': times,
+            }
+
+## Returns peak size of memory allocated while calling FN, in bytes
+def peak_memory(fn):
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    del result
+    if not tracing:
+        tracemalloc.stop()
+    return peak - base
+
+## Returns list of resource ids of every entry of TABLE
+def _ids(table):
+    ret = []
+    for pkg in table.packages:
+        for spec in pkg.types or []:
+            header = spec[0].header
+            base = (pkg.header.id.integer << 24) | (header.id.integer << 16)
+            ret += [base | i for i in range(header.entryCount.integer)]
+    return ret
+
+## Returns results of benchmarks of table serialized as B
+# \details Every benchmark is run REPEAT times:
+#
+#   * parse - ResTable.from_bytes(), in bytes per second
+#   * lookup - resolving every resource id for a device and decoding the
+#     entry, with resolver already built and offsets of every chunk decoded
+#     once per run, in lookups per second
+#   * serialize - bytes() of table with all chunks dirty, in bytes per second
+#   * round_trip - parsing, marking all chunks dirty and serializing again,
+#     in bytes per second
+#
+# Peak memory allocated by parsing and by round trip is measured in separate
+# runs, so tracing does not distort the timings.
+def bench(b, repeat=5):
+    from arsc.resolver import Resolver
+    size = len(b)
+    parsed, _ = ResTable.from_bytes(b)
+    ids = _ids(parsed)
+    configs = parsed.configs or [ResTable_config()]
+    device = configs[-1]
+    resolver = Resolver(parsed)
+
+    def lookup():
+        offsets = {}
+        for resid in ids:
+            typ = resolver.resolve(resid, device)
+            if typ is None:
+                continue
+            if id(typ) not in offsets:
+                offsets[id(typ)] = typ.entry_offsets()
+            typ.entry(resid & 0xffff, offsets[id(typ)])
+
+    dirty, _ = ResTable.from_bytes(b)
+    touch_all(dirty)
+
+    def round_trip():
+        tab, _ = ResTable.from_bytes(b)
+        touch_all(tab)
+        return bytes(tab)
+
+    return {
+            'size': size,
+            'entries': len(ids),
+            'results': {
+                'parse': summary(measure(lambda: ResTable.from_bytes(b),
+                    repeat), size, 'B/s'),
+                'lookup': summary(measure(lookup, repeat), len(ids),
+                    'lookups/s'),
+                'serialize': summary(measure(lambda: bytes(dirty), repeat),
+                    size, 'B/s'),
+                'round_trip': summary(measure(round_trip, repeat), size,
+                    'B/s'),
+                },
+            'peak_memory': {
+                'parse': peak_memory(lambda: ResTable.from_bytes(b)),
+                'round_trip': peak_memory(round_trip),
+                },
+            }
+
+## Workload of calibrate(), that does not depend on the library
+# \details Decodes integers with struct, like parsing does, so its time
+# follows speed of interpreter and machine.
+def _calibration():
+    b = bytes(range(256)) * 64
+    total = 0
+    for i in range(0, len(b), 4):
+        total += struct.unpack_from('<I', b, i)[0]
+    return total
+
+## Returns median time of fixed workload, in seconds
+# \details Results recorded on different machines are compared by
+# throughput relative to this time, see compare().
+def calibrate(repeat=5):
+    return statistics.median(measure(_calibration, repeat))
+
+## Returns results of the suite run on synthetic tables of SCALES
+# \details SCALES is dictionary of name to arguments of generate(), by
+# default all of bench.SCALES. Result is JSON-compatible dictionary with
+# format VERSION, Python version and platform, time of calibrate() and
+# results of bench() and scale under 'benchmarks', keyed by name.
+def run(scales=None, repeat=5):
+    if scales is None:
+        scales = SCALES
+    benchmarks = {}
+    for name, scale in scales.items():
+        result = bench(bytes(generate(**scale)), repeat)
+        result['scale'] = scale
+        benchmarks[name] = result
+    return {
+            'version': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'calibration': calibrate(repeat),
+            'benchmarks': benchmarks,
+            }
+
+## Writes RESULTS of run() to text file F as JSON
+def write(results, f):
+    json.dump(results, f, indent=2, sort_keys=True)
+    f.write('\n')
+
+## Returns results of run() read from text file F
+def read(f):
+    return json.load(f)
+
+
+## Returns median throughput of summary STATS, see summary()
+def _median_throughput(stats):
+    median = statistics.median(stats['times'])
+    return stats['work'] / median if median > 0 else float('inf')
+
+## Returns comparison of results of run() CURRENT against BASELINE
+# \details Every benchmark of GATED, run on scale present in both results,
+# is compared by its median throughput, so single slow or fast run does not
+# decide. If both results have time of calibrate(), baseline throughput is
+# first scaled by ratio of the times, so baseline recorded on other machine
+# still applies. Result is list of dictionaries with 'scale', 'benchmark',
+# median 'baseline' (scaled) and 'current' throughput, its relative 'change'
+# and 'regressed', true if throughput dropped by more than THRESHOLD
+# (fraction of baseline throughput).
+def compare(baseline, current, threshold=THRESHOLD, gated=GATED):
+    ret = []
+    factor = 1.0
+    if baseline.get('calibration') and current.get('calibration'):
+        factor = baseline['calibration'] / current['calibration']
+    for scale, base in baseline['benchmarks'].items():
+        if scale not in current['benchmarks']:
+            continue
+        results = current['benchmarks'][scale]['results']
+        for benchmark in gated:
+            if benchmark not in base['results'] or benchmark not in results:
+                continue
+            old = _median_throughput(base['results'][benchmark]) * factor
+            new = _median_throughput(results[benchmark])
+            change = new / old - 1 if old > 0 else 0.0
+            ret.append({
+                'scale': scale,
+                'benchmark': benchmark,
+                'baseline': old,
+                'current': new,
+                'change': change,
+                'regressed': change < -threshold,
+                })
+    return ret
+
+## Returns true if any row of COMPARISON (see compare()) regressed
+def regressed(comparison):
+    return any(row['regressed'] for row in comparison)
+
+## Returns COMPARISON (see compare()) as text with one line per benchmark
+def report(comparison):
+    lines = []
+    for row in comparison:
+        lines.append('{:<4} {:<10} {:<12} {:14.1f} -> {:14.1f} {:+7.1%}'.format(
+            'FAIL' if row['regressed'] else 'ok', row['scale'],
+            row['benchmark'], row['baseline'], row['current'],
+            row['change']))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+## Runs the suite on scales of BASELINE and compares results with it
+# \details Returns pair of results of run() and compare().
+def check(baseline, repeat=5, threshold=THRESHOLD, gated=GATED):
+    current = run({name: result['scale']
+        for name, result in baseline['benchmarks'].items()}, repeat)
+    return current, compare(baseline, current, threshold, gated)
+
+class BenchTests(unittest.TestCase):
+
+    def test_generate(self):
+        b = bytes(generate(packages=2, types=3, entries=10, configs=3))
+        invector, _ = ResTable.from_bytes(b)
+        expected = ([0x7f, 0x7e], [4, 4, 4], [10, 5, 4],
+                'value {:08d}'.format(0), 'type2', 'entry_9')
+        pkg = invector.packages[1]
+        actual = ([p.header.id.integer for p in invector.packages],
+                [len(spec) for spec in pkg.types],
+                [sum(e is not None for e in typ.entries())
+                    for typ in pkg.types[2][1:]],
+                invector.values.string(0), pkg.typeStrings.string(2),
+                pkg.keyStrings.string(9))
+
+        self.assertEqual(expected, actual)
+
+    def test_generate_utf16(self):
+        invector = generate(entries=4, utf8=False)
+        expected = (False, False, 'entry_3')
+        actual = (invector.values.is_utf8(),
+                invector.packages[0].keyStrings.is_utf8(),
+                invector.packages[0].keyStrings.string(3))
+
+        self.assertEqual(expected, actual)
+
+    def test_generate_strings(self):
+        invector = generate(entries=10, strings=3)
+        expected = (3, 2)
+        actual = (len(invector.values.strings),
+                invector.packages[0].types[0][1].entry(4).value.data.integer)
+
+        self.assertEqual(expected, actual)
+
+    def test_generate_round_trip(self):
+        invector = bytes(generate(types=2, entries=20, configs=4))
+        table, _ = ResTable.from_bytes(invector)
+        touch_all(table)
+        expected = invector
+        actual = bytes(table)
+
+        self.assertEqual(expected, actual)
+
+    def test_run(self):
+        import io
+        results = run({'tiny': {'entries': 8, 'configs': 2}}, repeat=2)
+        f = io.StringIO()
+        write(results, f)
+        f.seek(0)
+        invector = read(f)
+        tiny = invector['benchmarks']['tiny']
+        expected = (VERSION, True, ['lookup', 'parse', 'round_trip',
+            'serialize'], 8, 2, ['parse', 'round_trip'], True)
+        actual = (invector['version'], invector['calibration'] > 0,
+                sorted(tiny['results']),
+                tiny['entries'], len(tiny['results']['parse']['times']),
+                sorted(tiny['peak_memory']),
+                tiny['peak_memory']['parse'] > 0)
+
+        self.assertEqual(expected, actual)
+
+    def results(calibration=None, **times):
+        ret = {'benchmarks': {'small': {'results': {name: summary(t, 100,
+            'B/s') for name, t in times.items()}}}}
+        if calibration is not None:
+            ret['calibration'] = calibration
+        return ret
+
+    def test_compare(self):
+        baseline = BenchTests.results(parse=[1.0, 1.0, 5.0],
+                serialize=[1.0, 1.0, 1.0], lookup=[1.0])
+        current = BenchTests.results(parse=[1.1, 1.1, 0.1],
+                serialize=[2.0, 2.0, 2.0], lookup=[9.0])
+        invector = compare(baseline, current, threshold=0.2)
+        expected = [('small', 'parse', False), ('small', 'serialize', True)]
+        actual = [(r['scale'], r['benchmark'], r['regressed'])
+                for r in invector]
+
+        self.assertEqual(expected, actual)
+        self.assertAlmostEqual(-0.5, invector[1]['change'])
+        self.assertEqual(True, regressed(invector))
+
+    def test_compare_calibrated(self):
+        # current machine is twice slower on calibration and on the suite
+        baseline = BenchTests.results(calibration=0.5, parse=[1.0],
+                serialize=[1.0])
+        current = BenchTests.results(calibration=1.0, parse=[2.0],
+                serialize=[4.0])
+        invector = compare(baseline, current, threshold=0.2)
+        expected = [(50.0, 50.0, False), (50.0, 25.0, True)]
+        actual = [(r['baseline'], r['current'], r['regressed'])
+                for r in invector]
+
+        self.assertEqual(expected, actual)
+
+    def test_calibrate(self):
+        expected = True
+        actual = calibrate(repeat=1) > 0
+
+        self.assertEqual(expected, actual)
+
+    def test_compare_missing_scale(self):
+        baseline = BenchTests.results(parse=[1.0])
+        current = {'benchmarks': {}}
+        expected = (False, '')
+        comparison = compare(baseline, current)
+        actual = (regressed(comparison), report(comparison))
+
+        self.assertEqual(expected, actual)
+
+    def test_report(self):
+        baseline = BenchTests.results(parse=[1.0])
+        current = BenchTests.results(parse=[4.0])
+        expected = 'FAIL small      parse                 100.0 -> ' \
+                '          25.0  -75.0%\n'
+        actual = report(compare(baseline, current))
+
+        self.assertEqual(expected, actual)
+
+    def test_check(self):
+        baseline = run({'tiny': {'entries': 8}}, repeat=1)
+        current, comparison = check(baseline, repeat=3, threshold=1.0)
+        expected = (3, ['parse', 'serialize'], False)
+        actual = (len(current['benchmarks']['tiny']['results']['parse'][
+            'times']), [r['benchmark'] for r in comparison],
+            regressed(comparison))
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+## \file cache.py
+# \brief Persistent cache of indexes derived from parsed tables
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+from arsc.arsc import ResTable
+from arsc.config import ResTable_config
+from arsc.entry import Res_value
+from arsc.exceptions import WrongTypeException
+from arsc.exceptions import IndexFormatException
+
+## \class TableIndex
+# \brief Compact, memory-mappable form of data derived from a ResTable
+# \details Holds decoded strings of all pools, unique configurations and
+# sorted arrays of resource values and resource names. Serialized form
+# (see serialize()) consists of a header followed by sections, all
+# little-endian and aligned to 4 bytes:
+#
+#   * header: magic b'ARSCIDXC', uint32 version, then offset and length of
+#     every section as pairs of uint32
+#   * string offsets: uint32 offsets of every string into string data, plus
+#     one offset past the last string
+#   * string data: all strings encoded as UTF-8, without terminators. Value
+#     pool comes first, so value string indices are valid string indices.
+#   * pools: records of uint32 package id, kind (0 - values, 1 - types,
+#     2 - keys), index of first string and number of strings
+#   * configs: ResTable_config of every config id, padded to 0x40 bytes
+#   * ids: records of uint32 resource id, uint16 config id, uint8 data type,
+#     uint8 entry flags, uint32 key string index and uint32 data, sorted by
+#     resource id and config id
+#   * names: records of uint32 resource id, uint32 type string index and
+#     uint32 key string index, sorted by package id, type name and key name
+#
+# Arrays are not loaded at all, lookups binary search them in place, so
+# opening an index is cheap even when it is backed by mmap.
+class TableIndex:
+
+    MAGIC = b'ARSCIDXC'
+    VERSION = 2
+    SECTIONS = 6
+    _header = struct.Struct('<8sI{}I'.format(SECTIONS * 2))
+    _pool = struct.Struct('<IIII')
+    _id = struct.Struct('<IHBBII')
+    _name = struct.Struct('<III')
+
+    POOL_VALUES = 0
+    POOL_TYPES = 1
+    POOL_KEYS = 2
+
+    def __init__(self, buf):
+        if len(buf) < TableIndex._header.size:
+            raise IndexFormatException('file too short')
+        header = TableIndex._header.unpack_from(buf, 0)
+        magic, version, sections = header[0], header[1], header[2:]
+        if magic != TableIndex.MAGIC:
+            raise IndexFormatException('wrong magic')
+        if version != TableIndex.VERSION:
+            raise IndexFormatException('unsupported version {}'.format(
+                version))
+        sections = list(zip(sections[0::2], sections[1::2]))
+        for offset, length in sections:
+            if offset + length > len(buf):
+                raise IndexFormatException('section out of bounds')
+
+        ## Buffer (bytes or mmap) holding the index
+        self.buf = buf
+        self._offsets, self._data, pools, configs, self._ids, self._names = \
+                sections
+        ## Number of strings
+        self.stringCount = self._offsets[1] // 4 - 1
+
+        ## Dictionary of (package id, pool kind) to (first string, count)
+        self.pools = {}
+        for i in range(pools[1] // TableIndex._pool.size):
+            pkgid, kind, start, count = TableIndex._pool.unpack_from(buf,
+                    pools[0] + i * TableIndex._pool.size)
+            self.pools[(pkgid, kind)] = (start, count)
+
+        ## List of ResTable_config, indexed by config id
+        self.configs = []
+        for offset in range(configs[0], configs[0] + configs[1],
+                ResTable_config.len):
+            config, _ = ResTable_config.from_bytes(bytes(
+                buf[offset:offset + ResTable_config.len]))
+            self.configs.append(config)
+
+        self.idCount = self._ids[1] // TableIndex._id.size
+        self.nameCount = self._names[1] // TableIndex._name.size
+
+    ## Returns string with global index INDEX
+    def string(self, index):
+        start, end = struct.unpack_from('<II', self.buf,
+                self._offsets[0] + 4 * index)
+        base = self._data[0]
+        return bytes(self.buf[base + start:base + end]).decode('utf-8')
+
+    def _id_record(self, i):
+        return TableIndex._id.unpack_from(self.buf,
+                self._ids[0] + i * TableIndex._id.size)
+
+    def _name_record(self, i):
+        return TableIndex._name.unpack_from(self.buf,
+                self._names[0] + i * TableIndex._name.size)
+
+    ## Returns index of first record of RESID in ids section
+    def _find(self, resid):
+        low, high = 0, self.idCount
+        while low < high:
+            middle = (low + high) // 2
+            if self._id_record(middle)[0] < resid:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    ## Returns list of (config id, Res_value, entry flags) defining RESID
+    # \details Complex entries have Res_value of TYPE_NULL.
+    def values(self, resid):
+        ret = []
+        for i in range(self._find(resid), self.idCount):
+            rid, configId, dataType, flags, key, data = self._id_record(i)
+            if rid != resid:
+                break
+            ret.append((configId, Res_value(8, 0, dataType, data), flags))
+        return ret
+
+    ## Returns 'type/name' of RESID, None if there is no such resource
+    def name(self, resid):
+        i = self._find(resid)
+        if i == self.idCount or self._id_record(i)[0] != resid:
+            return None
+        key = self._id_record(i)[4]
+        types = self.pools[(resid >> 24, TableIndex.POOL_TYPES)][0]
+        return '{}/{}'.format(self.string(types + ((resid >> 16) & 0xff) - 1),
+                self.string(key))
+
+    ## Returns (package id, type name, key name) of I-th name record
+    def _name_key(self, i):
+        rid, typeIndex, keyIndex = self._name_record(i)
+        return rid >> 24, self.string(typeIndex), self.string(keyIndex)
+
+    ## Returns id of resource TYPE/NAME of PACKAGE, None if there is none
+    # \details PACKAGE is package id, application package by default. Other
+    # packages (eg. android, 0x01) may define resources of the same name.
+    def resid(self, type, name, package=0x7f):
+        target = (package, type, name)
+        low, high = 0, self.nameCount
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.nameCount and self._name_key(low) == target:
+            return self._name_record(low)[0]
+        return None
+
+    ## Returns serialized TableIndex of TABLE
+    def serialize(table):
+        if not isinstance(table, ResTable):
+            raise WrongTypeException('table', ResTable)
+        table.intern_configs()
+
+        strings = []
+        pools = []
+
+        def add_pool(pkgid, kind, pool):
+            pools.append((pkgid, kind, len(strings), len(pool.strings)))
+            strings.extend(pool.string(i) for i in range(len(pool.strings)))
+            return pools[-1][2]
+
+        add_pool(0, TableIndex.POOL_VALUES, table.values)
+        ids = []
+        names = {}
+        for pkg in table.packages:
+            pkgid = pkg.header.id.integer
+            types = add_pool(pkgid, TableIndex.POOL_TYPES, pkg.typeStrings)
+            keys = add_pool(pkgid, TableIndex.POOL_KEYS, pkg.keyStrings)
+            for spec in pkg.types or []:
+                for typ in (spec or [])[1:]:
+                    typeId = typ.header.id.integer
+                    for i, entry in enumerate(typ.entries()):
+                        if entry is None:
+                            continue
+                        resid = (pkgid << 24) | (typeId << 16) | i
+                        key = keys + entry.key.integer
+                        if entry.is_complex():
+                            value = Res_value()
+                        else:
+                            value = entry.value
+                        ids.append((resid, typ.header.configId,
+                            value.dataType.integer, entry.flags.integer,
+                            key, value.data.integer))
+                        names[resid] = (types + typeId - 1, key)
+        ids.sort()
+        names = sorted(((rid, t, k) for rid, (t, k) in names.items()),
+                key=lambda r: (r[0] >> 24, strings[r[1]], strings[r[2]]))
+
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = [0]
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+        configs = b''.join(bytes(c).ljust(ResTable_config.len, b'\0')
+                [:ResTable_config.len] for c in table.configs)
+
+        sections = [
+                struct.pack('<{}I'.format(len(offsets)), *offsets),
+                b''.join(encoded),
+                b''.join(TableIndex._pool.pack(*p) for p in pools),
+                configs,
+                b''.join(TableIndex._id.pack(*r) for r in ids),
+                b''.join(TableIndex._name.pack(*r) for r in names),
+                ]
+        positions = []
+        offset = TableIndex._header.size
+        body = b''
+        for section in sections:
+            section += bytes(-len(section) % 4)
+            positions += [offset, len(section)]
+            body += section
+            offset += len(section)
+
+        return TableIndex._header.pack(TableIndex.MAGIC, TableIndex.VERSION,
+                *positions) + body
+
+
+## \class ParseCache
+# \brief Directory of TableIndex files keyed by hash of table bytes
+# \details Every file is named by BLAKE2 digest of the table it was built
+# from, so the cache is never stale and can be shared by many processes.
+# Hits are mapped into memory. Least recently used files are removed when
+# total size of the directory grows over MAXSIZE bytes; use time of a file
+# is its modification time, refreshed on every hit.
+class ParseCache:
+
+    SUFFIX = '.arscpc'
+
+    def __init__(self, directory, maxSize=256 * 1024 * 1024):
+        ## Directory with cached files
+        self.directory = directory
+        ## Maximal total size of cached files in bytes
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+
+    ## Returns cache key of table stored in B
+    def key(b):
+        return hashlib.blake2b(b, digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ParseCache.SUFFIX)
+
+    ## Returns TableIndex of table B from the cache, None if it is not cached
+    def get(self, b):
+        path = self._path(ParseCache.key(b))
+        try:
+            with open(path, 'rb') as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index = TableIndex(buf)
+        except (OSError, ValueError, IndexFormatException):
+            return None
+        os.utime(path)
+        return index
+
+    ## Stores index of TABLE parsed from B and returns it
+    def put(self, b, table):
+        data = TableIndex.serialize(table)
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(ParseCache.key(b)))
+        self.evict()
+        return TableIndex(data)
+
+    ## Returns TableIndex of table B, parsing and caching it on miss
+    def open(self, b):
+        index = self.get(b)
+        if index is None:
+            table, _ = ResTable.from_bytes(b)
+            index = self.put(b, table)
+        return index
+
+    ## Removes least recently used files until cache fits in maxSize
+    def evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ParseCache.SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, name in files:
+            if total <= self.maxSize:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+class TableIndexTests(unittest.TestCase):
+
+    def table():
+        from arsc.merge import MergeTests
+        return ResTable.from_bytes(MergeTests.sample(default={
+            'app_name': 'App', 'title': 'Title'}, de={'title': 'Titel'}))[0]
+
+    tv1_obj = TableIndex(TableIndex.serialize(table()))
+
+    def test_wrong_magic(self):
+        with self.assertRaises(Exception) as cm:
+            invector = TableIndex(bytes(TableIndex._header.size))
+
+        expected = 'wrong index format: wrong magic'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_values(self):
+        invector = TableIndexTests.tv1_obj
+        expected = ['Title', 'Titel']
+        actual = [invector.string(value.data.integer)
+                for _, value, _ in invector.values(0x7f010001)]
+
+        self.assertEqual(expected, actual)
+
+    def test_values_configs(self):
+        invector = TableIndexTests.tv1_obj
+        expected = ['', 'de']
+        actual = [invector.configs[configId].locale_tag()
+                for configId, _, _ in invector.values(0x7f010001)]
+
+        self.assertEqual(expected, actual)
+
+    def test_values_missing(self):
+        invector = TableIndexTests.tv1_obj
+        expected = []
+        actual = invector.values(0x7f010002)
+
+        self.assertEqual(expected, actual)
+
+    def test_resid(self):
+        invector = TableIndexTests.tv1_obj
+        expected = (0x7f010000, 0x7f010001, None)
+        actual = (invector.resid('string', 'app_name'),
+                invector.resid('string', 'title'),
+                invector.resid('string', 'missing'))
+
+        self.assertEqual(expected, actual)
+
+    def test_resid_package(self):
+        import copy
+        from arsc.merge import table
+        from arsc.type.uint32 import uint32
+        app = TableIndexTests.table()
+        pkg = app.packages[0]
+        framework = copy.copy(pkg)
+        framework.header = copy.copy(pkg.header)
+        framework.header.id = uint32(0x01, little=True)
+        invector = TableIndex(TableIndex.serialize(table(app.values,
+            [framework, pkg])))
+        expected = (0x7f010001, 0x01010001, None)
+        actual = (invector.resid('string', 'title'),
+                invector.resid('string', 'title', 0x01),
+                invector.resid('string', 'title', 0x02))
+
+        self.assertEqual(expected, actual)
+
+    def test_name(self):
+        invector = TableIndexTests.tv1_obj
+        expected = 'string/title'
+        actual = invector.name(0x7f010001)
+
+        self.assertEqual(expected, actual)
+
+
+class ParseCacheTests(unittest.TestCase):
+
+    def test_open_caches(self):
+        b = bytes(TableIndexTests.table())
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ParseCache(directory)
+            self.assertIsNone(cache.get(b))
+            cache.open(b)
+            invector = cache.get(b)
+            expected = 0x7f010000
+            actual = invector.resid('string', 'app_name')
+            invector.buf.close()
+
+        self.assertEqual(expected, actual)
+
+    def test_evict(self):
+        b = bytes(TableIndexTests.table())
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ParseCache(directory, maxSize=0)
+            cache.open(b)
+            expected = []
+            actual = os.listdir(directory)
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+## \file cli.py
+# \brief Command line interface, run as python -m arsc or arsc
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from arsc.arsc import ResTable
+from arsc.types import ResourceType
+from arsc.scan import scan
+from arsc.apk import read_member
+from arsc.export import record
+from arsc.export import records
+from arsc.export import write_jsonl
+from arsc.profiling import profile as parse_profile
+from arsc.bench import SCALES
+from arsc.bench import THRESHOLD
+from arsc.bench import check as check_baseline
+from arsc.bench import read
+from arsc.bench import regressed
+from arsc.bench import report
+from arsc.bench import measure
+from arsc.bench import run
+from arsc.bench import summary
+from arsc.bench import touch_all
+from arsc.bench import write
+
+## Returns buffer with table from PATH
+# \details PATH is either table file or APK (or other ZIP archive), from
+# which MEMBER is read.
+def load(path, member='resources.arsc'):
+    if zipfile.is_zipfile(path):
+        return read_member(path, member)
+    with open(path, 'rb') as f:
+        return f.read()
+
+## Returns dictionary of chunk type name to [count, size] of chunks in B
+# \details Only chunk headers are read, see scan.scan().
+def chunk_stats(b):
+    stats = {}
+
+    def walk(chunks):
+        for chunk in chunks:
+            try:
+                name = ResourceType(chunk.type).name
+            except ValueError:
+                name = hex(chunk.type)
+            counts = stats.setdefault(name, [0, 0])
+            counts[0] += 1
+            counts[1] += chunk.size
+            walk(chunk.children)
+
+    walk(scan(b))
+    return stats
+
+## Returns VALUE (see export.value()) formatted for text output
+def _format(v):
+    if v['type'] == 'string':
+        return json.dumps(v['data'], ensure_ascii=False)
+    if v['type'] in ('reference', 'dynamic_reference'):
+        return '@0x{:08x}'.format(v['data'])
+    if v['type'] in ('attribute', 'dynamic_attribute'):
+        return '?0x{:08x}'.format(v['data'])
+    return '{}:{}'.format(v['type'], v['data'])
+
+## Returns RECORD (see export.records()) as one line of text
+def format_record(record):
+    config = '-'.join('{}'.format(v) if k == 'locale' else '{}={}'.format(k, v)
+            for k, v in record['config'].items())
+    head = '0x{:08x} {}/{}{}'.format(record['id'], record['type'],
+            record['name'], ' [{}]'.format(config) if config else '')
+    if 'value' in record:
+        return '{} = {}'.format(head, _format(record['value']))
+    return '{} = {{parent=0x{:08x}, {}}}'.format(head, record['parent'],
+            ', '.join('0x{:08x}={}'.format(m['name'], _format(m['value']))
+                for m in record['map']))
+
+def stats(args, out):
+    b = load(args.file, args.member)
+    result = chunk_stats(b)
+    if args.json:
+        json.dump({'size': len(b), 'chunks': result}, out)
+        out.write('\n')
+        return 0
+    out.write('size {}\n'.format(len(b)))
+    for name in sorted(result):
+        count, size = result[name]
+        out.write('{:<32} {:>8} {:>12}\n'.format(name, count, size))
+    return 0
+
+def dump(args, out):
+    table, _ = ResTable.from_bytes(load(args.file, args.member))
+    if args.json:
+        write_jsonl(table, out)
+        return 0
+    for record in records(table):
+        out.write(format_record(record))
+        out.write('\n')
+    return 0
+
+def get(args, out):
+    table, _ = ResTable.from_bytes(load(args.file, args.member))
+    try:
+        resid = int(args.resource, 0)
+        predicates = {'package': resid >> 24,
+                'type_id': (resid >> 16) & 0xff, 'index': resid & 0xffff}
+    except ValueError:
+        typeName, _, name = args.resource.partition('/')
+        predicates = {'type': typeName, 'name': name}
+
+    packages = {pkg.header.id.integer: pkg for pkg in table.packages}
+    found = 0
+    for match, typ, entry in table.query(**predicates):
+        out.write(format_record(record(table, packages[match >> 24], typ,
+            match & 0xffff, entry)))
+        out.write('\n')
+        found += 1
+    if found == 0:
+        sys.stderr.write('arsc: {}: resource not found\n'.format(
+            args.resource))
+        return 1
+    return 0
+
+def bench(args, out):
+    b = bytes(load(args.file, args.member))
+    table, _ = ResTable.from_bytes(b)
+    dirty, _ = ResTable.from_bytes(b)
+    touch_all(dirty)
+    results = {
+            'parse': measure(lambda: ResTable.from_bytes(b), args.repeat),
+            'serialize': measure(lambda: bytes(table), args.repeat),
+            'encode': measure(lambda: bytes(dirty), args.repeat),
+            }
+    if args.json:
+        json.dump({'size': len(b), 'repeat': args.repeat,
+            'results': {k: summary(v, len(b), 'B/s')
+                for k, v in results.items()}}, out)
+        out.write('\n')
+        return 0
+    out.write('size {}, {} runs\n'.format(len(b), args.repeat))
+    for name, times in results.items():
+        out.write('{:<10} best {:10.3f} ms  mean {:10.3f} ms\n'.format(name,
+            min(times) * 1000, sum(times) / len(times) * 1000))
+    return 0
+
+def profile(args, out):
+    b = load(args.file, args.member)
+    with parse_profile(memory=args.memory) as profiler:
+        ResTable.from_bytes(b)
+    summary = profiler.summary()
+    if args.json:
+        json.dump(summary, out)
+        out.write('\n')
+        return 0
+    total = sum(stats['time'] for stats in summary.values())
+    for name, stats in sorted(summary.items(), key=lambda i: -i[1]['time']):
+        out.write('{:<20} {:>8} {:>12} {:10.3f} ms {:6.1%}{}\n'.format(name,
+            stats['count'], stats['size'], stats['time'] * 1000,
+            stats['time'] / total if total > 0 else 0,
+            ' {:>12} B'.format(stats['allocated'])
+            if 'allocated' in stats else ''))
+    return 0
+
+def suite(args, out):
+    scales = SCALES
+    if args.scale:
+        unknown = [name for name in args.scale if name not in SCALES]
+        if unknown:
+            sys.stderr.write('arsc: unknown scale: {}\n'.format(
+                ', '.join(unknown)))
+            return 1
+        scales = {name: SCALES[name] for name in args.scale}
+    results = run(scales, args.repeat)
+    if args.output is None:
+        write(results, out)
+        return 0
+    with open(args.output, 'w') as f:
+        write(results, f)
+    for name, result in results['benchmarks'].items():
+        out.write('{} ({} bytes, {} entries)\n'.format(name, result['size'],
+            result['entries']))
+        for bench, stats in result['results'].items():
+            out.write('  {:<12} {:14.1f} {}\n'.format(bench,
+                stats['throughput'], stats['unit']))
+    return 0
+
+def check(args, out):
+    with open(args.baseline) as f:
+        baseline = read(f)
+    current, comparison = check_baseline(baseline, args.repeat,
+            args.threshold)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            write(current, f)
+    out.write(report(comparison))
+    if regressed(comparison):
+        out.write('throughput regressed by more than {:.0%}\n'.format(
+            args.threshold))
+        return 1
+    return 0
+
+## Returns argparse.ArgumentParser of the tool
+def parser():
+    ret = argparse.ArgumentParser(prog='arsc',
+            description='Inspect Android resource tables (resources.arsc).')
+    sub = ret.add_subparsers(dest='command', metavar='command')
+    sub.required = True
+
+    def command(name, fn, help):
+        p = sub.add_parser(name, help=help)
+        p.add_argument('file', help='resources.arsc or APK file')
+        p.add_argument('--member', default='resources.arsc',
+                help='name of table inside APK (default: %(default)s)')
+        p.set_defaults(fn=fn)
+        return p
+
+    p = command('stats', stats, 'print counts and sizes of chunks')
+    p.add_argument('--json', action='store_true', help='print as JSON')
+    p = command('dump', dump, 'print every resource')
+    p.add_argument('--json', action='store_true', help='print as JSON Lines')
+    p = command('get', get, 'print values of one resource')
+    p.add_argument('resource', help='resource id, eg. 0x7f010000, or '
+            'type/name, eg. string/app_name')
+    p = command('bench', bench, 'time parsing and serialization')
+    p.add_argument('-n', '--repeat', type=int, default=5,
+            help='number of runs (default: %(default)s)')
+    p.add_argument('--json', action='store_true', help='print as JSON')
+    p = command('profile', profile, 'print parse time spent in every kind '
+            'of chunk')
+    p.add_argument('--memory', action='store_true', help='also trace '
+            'allocations (slow)')
+    p.add_argument('--json', action='store_true', help='print as JSON')
+    p = sub.add_parser('suite', help='run benchmark suite on synthetic '
+            'tables')
+    p.add_argument('-s', '--scale', action='append', metavar='NAME',
+            help='scale to run, one of: {} (default: all)'.format(
+                ', '.join(SCALES)))
+    p.add_argument('-n', '--repeat', type=int, default=5,
+            help='number of runs (default: %(default)s)')
+    p.add_argument('-o', '--output', help='write results to file as JSON, '
+            'instead of standard output')
+    p.set_defaults(fn=suite)
+    p = sub.add_parser('check', help='compare benchmark suite with baseline')
+    p.add_argument('baseline', help='results of suite to compare with')
+    p.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+            help='allowed loss of throughput, as fraction '
+            '(default: %(default)s)')
+    p.add_argument('-n', '--repeat', type=int, default=5,
+            help='number of runs (default: %(default)s)')
+    p.add_argument('-o', '--output', help='also write current results to '
+            'file as JSON')
+    p.set_defaults(fn=check)
+    return ret
+
+## Runs the tool with ARGV and returns exit status
+def main(argv=None, out=None):
+    if out is None:
+        out = sys.stdout
+    args = parser().parse_args(argv)
+    try:
+        return args.fn(args, out)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        sys.stderr.write('arsc: {}\n'.format(e))
+        return 1
+
+
+class CliTests(unittest.TestCase):
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        return MergeTests.sample()
+
+    def run_main(*argv):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(CliTests.tv1_bytes())
+            out = io.StringIO()
+            status = main([argv[0], path] + list(argv[1:]), out)
+        return status, out.getvalue()
+
+    def test_stats(self):
+        status, out = CliTests.run_main('stats', '--json')
+        result = json.loads(out)
+        size = len(CliTests.tv1_bytes())
+        expected = (0, size, [1, size], 1, 3, 1, 2)
+        actual = (status, result['size'], result['chunks']['RES_TABLE_TYPE'],
+                result['chunks']['RES_TABLE_PACKAGE_TYPE'][0],
+                result['chunks']['RES_STRING_POOL_TYPE'][0],
+                result['chunks']['RES_TABLE_TYPE_SPEC_TYPE'][0],
+                result['chunks']['RES_TABLE_TYPE_TYPE'][0])
+
+        self.assertEqual(expected, actual)
+
+    def test_stats_text(self):
+        status, out = CliTests.run_main('stats')
+        expected = (0, 'size {}'.format(len(CliTests.tv1_bytes())), 6)
+        actual = (status, out.splitlines()[0], len(out.splitlines()))
+
+        self.assertEqual(expected, actual)
+
+    def test_dump(self):
+        status, out = CliTests.run_main('dump')
+        expected = (0, ['0x7f010000 string/a = "x"',
+            '0x7f010001 string/b = "y"', '0x7f010000 string/a [de] = "z"'])
+        actual = (status, out.splitlines())
+
+        self.assertEqual(expected, actual)
+
+    def test_dump_json(self):
+        status, out = CliTests.run_main('dump', '--json')
+        expected = (0, 3, 'z')
+        actual = (status, len(out.splitlines()),
+                json.loads(out.splitlines()[2])['value']['data'])
+
+        self.assertEqual(expected, actual)
+
+    def test_get_by_id(self):
+        status, out = CliTests.run_main('get', '0x7f010000')
+        expected = (0, ['0x7f010000 string/a = "x"',
+            '0x7f010000 string/a [de] = "z"'])
+        actual = (status, out.splitlines())
+
+        self.assertEqual(expected, actual)
+
+    def test_get_by_name(self):
+        status, out = CliTests.run_main('get', 'string/b')
+        expected = (0, ['0x7f010001 string/b = "y"'])
+        actual = (status, out.splitlines())
+
+        self.assertEqual(expected, actual)
+
+    def test_get_missing(self):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            status, out = CliTests.run_main('get', 'string/missing')
+        finally:
+            sys.stderr = stderr
+        expected = (1, '')
+        actual = (status, out)
+
+        self.assertEqual(expected, actual)
+
+    def test_bench(self):
+        status, out = CliTests.run_main('bench', '-n', '1', '--json')
+        expected = (0, ['encode', 'parse', 'serialize'])
+        actual = (status, sorted(json.loads(out)['results']))
+
+        self.assertEqual(expected, actual)
+
+    def test_profile(self):
+        status, out = CliTests.run_main('profile', '--json', '--memory')
+        result = json.loads(out)
+        expected = (0, ['ResStringPool', 'ResTable', 'ResTable_package',
+            'ResTable_type', 'ResTable_typeSpec'], 2)
+        actual = (status, sorted(result), result['ResTable_type']['count'])
+
+        self.assertEqual(expected, actual)
+
+    def test_suite(self):
+        out = io.StringIO()
+        status = main(['suite', '-s', 'small', '-n', '1'], out)
+        expected = (0, ['small'])
+        actual = (status, list(json.loads(out.getvalue())['benchmarks']))
+
+        self.assertEqual(expected, actual)
+
+    def test_check(self):
+        from arsc.bench import run
+        baseline = run({'tiny': {'entries': 8}}, repeat=1)
+        for stats in baseline['benchmarks']['tiny']['results'].values():
+            stats['times'] = [t / 1000 for t in stats['times']]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            with open(path, 'w') as f:
+                write(baseline, f)
+            out = io.StringIO()
+            status = main(['check', path, '-n', '1'], out)
+        expected = (1, 'FAIL tiny')
+        actual = (status, out.getvalue()[:9])
+
+        self.assertEqual(expected, actual)
+
+    def test_apk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'app.apk')
+            with zipfile.ZipFile(path, 'w') as z:
+                z.writestr('resources.arsc', CliTests.tv1_bytes())
+            out = io.StringIO()
+            status = main(['get', path, 'string/a'], out)
+        expected = (0, 2)
+        actual = (status, len(out.getvalue().splitlines()))
+
+        self.assertEqual(expected, actual)
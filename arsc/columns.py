@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+## \file columns.py
+# \brief Columnar view of all entries of a table as NumPy arrays
+# \details NumPy is optional, it is only needed by columns(). rows() gives
+# the same rows as plain tuples without it.
+import unittest
+from arsc.entry import ResTable_entry
+from arsc.tabletype import ResTable_type
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## Fields of rows returned by columns()
+DTYPE = [
+        ('resid', '<u4'),
+        ('typeId', 'u1'),
+        ('configId', '<u2'),
+        ('flags', '<u2'),
+        ('dataType', 'u1'),
+        ('data', '<u4'),
+        ('key', '<u4'),
+        ]
+
+## Returns little-endian uint16 at every offset of POS in byte array B
+def _u16(b, pos):
+    return b[pos].astype(numpy.uint16) | \
+            (b[pos + 1].astype(numpy.uint16) << 8)
+
+## Returns little-endian uint32 at every offset of POS in byte array B
+def _u32(b, pos):
+    return b[pos].astype(numpy.uint32) | \
+            (b[pos + 1].astype(numpy.uint32) << 8) | \
+            (b[pos + 2].astype(numpy.uint32) << 16) | \
+            (b[pos + 3].astype(numpy.uint32) << 24)
+
+## Returns rows of all defined entries of ResTable_type TYP of package PKGID
+# \details Offsets and entry headers are gathered from raw bytes of the
+# chunk with array indexing, no entry objects are created.
+def _type_rows(typ, pkgid):
+    header = typ.header
+    count = header.entryCount.integer
+    rest = numpy.frombuffer(typ.rest, dtype=numpy.uint8)
+    base = header.entriesStart.integer - header.header.headerSize.integer
+    if header.res0.integer & ResTable_type.FLAG_SPARSE:
+        pairs = numpy.frombuffer(typ.rest, dtype='<u2', count=2 * count)
+        index = pairs[0::2].astype(numpy.uint32)
+        offsets = pairs[1::2].astype(numpy.int64) * 4
+    else:
+        offsets = numpy.frombuffer(typ.rest, dtype='<u4', count=count)
+        index = numpy.nonzero(offsets != ResTable_type.NO_ENTRY)[0]
+        offsets = offsets[index].astype(numpy.int64)
+        index = index.astype(numpy.uint32)
+
+    pos = base + offsets
+    size = _u16(rest, pos)
+    flags = _u16(rest, pos + 2)
+    simple = (flags & ResTable_entry.FLAG_COMPLEX) == 0
+    # complex entries have no value, read their own header instead and
+    # zero it below
+    value = numpy.where(simple, pos + size, pos)
+
+    rows = numpy.zeros(len(pos), dtype=DTYPE)
+    typeId = header.id.integer
+    rows['resid'] = (pkgid << 24) | (typeId << 16) | index
+    rows['typeId'] = typeId
+    rows['configId'] = header.configId
+    rows['flags'] = flags
+    rows['key'] = _u32(rest, pos + 4)
+    rows['dataType'] = numpy.where(simple, rest[value + 3], 0)
+    rows['data'] = numpy.where(simple, _u32(rest, value + 4), 0)
+    return rows
+
+## Returns NumPy structured array with one row for every entry of TABLE
+# \details Row fields are listed in DTYPE: resource id, type id, id of
+# config in table.configs, entry flags, data type and data of value (zero
+# for complex entries) and index of key string in key pool of the package.
+# Rows go in order of packages, types and chunks, entries of one chunk are
+# sorted by index. Raises ImportError, if NumPy is not installed.
+def columns(table):
+    if numpy is None:
+        raise ImportError('columns() requires numpy')
+    table.intern_configs()
+
+    parts = [numpy.zeros(0, dtype=DTYPE)]
+    for pkg in table.packages:
+        pkgid = pkg.header.id.integer
+        for spec in pkg.types or []:
+            for typ in (spec or [])[1:]:
+                parts.append(_type_rows(typ, pkgid))
+    return numpy.concatenate(parts)
+
+## Returns rows of columns() as list of tuples, without NumPy
+# \details Tuples hold fields of DTYPE in its order. Every entry is decoded
+# into an object, so this is much slower than columns(); it serves where
+# NumPy is not installed and as reference of what columns() computes.
+def rows(table):
+    table.intern_configs()
+
+    ret = []
+    for pkg in table.packages:
+        pkgid = pkg.header.id.integer
+        for spec in pkg.types or []:
+            for typ in (spec or [])[1:]:
+                typeId = typ.header.id.integer
+                base = (pkgid << 24) | (typeId << 16)
+                for i, entry in enumerate(typ.entries()):
+                    if entry is None:
+                        continue
+                    if entry.is_complex():
+                        dataType, data = 0, 0
+                    else:
+                        dataType = entry.value.dataType.integer
+                        data = entry.value.data.integer
+                    ret.append((base | i, typeId, typ.header.configId,
+                        entry.flags.integer, dataType, data,
+                        entry.key.integer))
+    return ret
+
+
+class ColumnsTests(unittest.TestCase):
+
+    def tv1_obj():
+        from arsc.arsc import ResTable
+        from arsc.merge import MergeTests
+        table, _ = ResTable.from_bytes(MergeTests.sample(de={'b': 'z'}))
+        return table
+
+    @unittest.skipIf(numpy is not None, 'numpy is installed')
+    def test_requires_numpy(self):
+        with self.assertRaises(ImportError):
+            columns(ColumnsTests.tv1_obj())
+
+    @unittest.skipUnless(numpy is not None, 'numpy is not installed')
+    def test_columns(self):
+        from arsc.entry import Res_value
+        invector = columns(ColumnsTests.tv1_obj())
+        expected = [(0x7f010000, 1, 0, 0, Res_value.TYPE_STRING, 0, 0),
+                (0x7f010001, 1, 0, 0, Res_value.TYPE_STRING, 1, 1),
+                (0x7f010001, 1, 1, 0, Res_value.TYPE_STRING, 2, 1)]
+        actual = invector.tolist()
+
+        self.assertEqual(expected, actual)
+
+    def test_rows(self):
+        from arsc.entry import Res_value
+        invector = rows(ColumnsTests.tv1_obj())
+        expected = [(0x7f010000, 1, 0, 0, Res_value.TYPE_STRING, 0, 0),
+                (0x7f010001, 1, 0, 0, Res_value.TYPE_STRING, 1, 1),
+                (0x7f010001, 1, 1, 0, Res_value.TYPE_STRING, 2, 1)]
+        actual = invector
+
+        self.assertEqual(expected, actual)
+
+    ## Returns tv1_obj() with first entry marked complex
+    def tv2_obj():
+        from arsc.entry import ResTable_entry
+        table = ColumnsTests.tv1_obj()
+        typ = table.packages[0].types[0][1]
+        rest = bytearray(typ.rest)
+        start = typ.header.entriesStart.integer - \
+                typ.header.header.headerSize.integer
+        rest[start + 2] |= ResTable_entry.FLAG_COMPLEX
+        typ.rest = bytes(rest)
+        return table
+
+    def test_rows_complex_entry(self):
+        from arsc.entry import ResTable_entry
+        expected = (ResTable_entry.FLAG_COMPLEX, 0, 0)
+        actual = rows(ColumnsTests.tv2_obj())[0][3:6]
+
+        self.assertEqual(expected, actual)
+
+    @unittest.skipUnless(numpy is not None, 'numpy is not installed')
+    def test_columns_match_rows(self):
+        for table in (ColumnsTests.tv1_obj(), ColumnsTests.tv2_obj()):
+            expected = rows(table)
+            actual = columns(table).tolist()
+
+            self.assertEqual(expected, actual)
+
+    @unittest.skipUnless(numpy is not None, 'numpy is not installed')
+    def test_columns_match_entries(self):
+        table = ColumnsTests.tv1_obj()
+        invector = columns(table)
+        expected = [(e.key.integer, e.value.data.integer)
+                for typ in table.packages[0].types[0][1:]
+                for e in typ.entries() if e is not None]
+        actual = list(zip(invector['key'].tolist(),
+            invector['data'].tolist()))
+
+        self.assertEqual(expected, actual)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 ## \file config.py
 # \brief ResTable_config and related
+import struct
 import unittest
+from arsc.type.uint8 import uint8
+from arsc.type.uint16 import uint16
 from arsc.type.uint32 import uint32
 from arsc.type.flag import Flag
 from arsc.chunk import ResChunk_header
@@ -9,91 +12,976 @@ from arsc.types import ResourceType
 from arsc.external.configuration import AConfiguration
 from arsc.exceptions import WrongTypeException
 from arsc.exceptions import ChunkHeaderWrongTypeException
+from arsc.exceptions import ConfigSizeException
 
 ## \class ResTable_config
 #\brief Describes current ResTable_type configuration
+# \details All qualifiers are decoded with a single struct unpack. On
+# construction the qualifiers are additionally packed into one integer (key),
+# so comparing, hashing and sorting configurations never has to touch nested
+# objects. Nested qualifier objects are treated as immutable: to change
+# a qualifier, assign a new object to the attribute and the key will follow.
 class ResTable_config:
 
+    ## Size of the structure with all fields known to this library
+    len = 0x40
+
+    DENSITY_DEFAULT = 0
+    DENSITY_MEDIUM = 160
+    DENSITY_ANY = 0xfffe
+    DENSITY_NONE = 0xffff
+
+    MASK_KEYSHIDDEN = 0x03
+    KEYSHIDDEN_NO = 0x01
+    KEYSHIDDEN_SOFT = 0x03
+    MASK_NAVHIDDEN = 0x0c
+
+    MASK_SCREENSIZE = 0x0f
+    SCREENSIZE_NORMAL = 0x02
+    MASK_SCREENLONG = 0x30
+    MASK_LAYOUTDIR = 0xc0
+
+    MASK_UI_MODE_TYPE = 0x0f
+    MASK_UI_MODE_NIGHT = 0x30
+
+    MASK_SCREENROUND = 0x03
+    MASK_WIDE_COLOR_GAMUT = 0x03
+    MASK_HDR = 0x0c
+
+    ## Layout of the structure after size field, as stored in the file
+    _format = '<HH2s2sBBHBBBBHHHHBBHHH4s8sBBHB8s3s'
+
+    ## Layout of fields used to compute key. Most significant fields first.
+    _key_format = '>HH2s2s4s8s8sBBHBBBBHHHHBBHBBHHHB3s'
+
+    ## Attributes, which change requires recomputing the key
+    _key_attrs = ('imsi', 'locale', 'screenType', 'input', 'screenSize',
+            'version', 'screenConfig', 'screenSizeDp', 'localeScript',
+            'localeVariant', 'screenConfig2', 'localeScriptWasComputed',
+            'localeNumberingSystem', 'pad')
+
     def __init__(self, size=0x30, imsi=None, locale=None, screenType=None,
             input=None, screenSize=None, version=None, screenConfig=None,
-            screenSizeDp=None):
-        notimpl = None
+            screenSizeDp=None, localeScript=b'\0\0\0\0',
+            localeVariant=bytes(8), screenConfig2=None,
+            localeScriptWasComputed=0, localeNumberingSystem=bytes(8),
+            pad=bytes(3), extra=b''):
+        if isinstance(size, bytes):
+            obj, _ = ResTable_config.from_bytes(size)
+            size, imsi, locale, screenType, input, screenSize, version, \
+                    screenConfig, screenSizeDp, localeScript, localeVariant, \
+                    screenConfig2, localeScriptWasComputed, \
+                    localeNumberingSystem, pad, extra = obj._astuple()
+
         if isinstance(size, uint32):
             ## Number of bytes in this structure
             self.size = size
-        elif isinstance(size, bytes):
-            # TODO: remove after full implementation
-            self.size, notimpl = uint32.from_bytes(size, little=True)
         else:
             self.size = uint32(size, little=True)
 
-        if notimpl is None:
-            notimpl = bytes(self.size.integer - 4)
-        self.notimpl = notimpl
+        if imsi is None:
+            imsi = ResTable_config.Imsi()
+        if locale is None:
+            locale = ResTable_config.Locale()
+        if screenType is None:
+            screenType = ResTable_config.ScreenType()
+        if input is None:
+            input = ResTable_config.Input()
+        if screenSize is None:
+            screenSize = ResTable_config.ScreenSize()
+        if version is None:
+            version = ResTable_config.Version()
+        if screenConfig is None:
+            screenConfig = ResTable_config.ScreenConfig()
+        if screenSizeDp is None:
+            screenSizeDp = ResTable_config.ScreenSizeDp()
+        if screenConfig2 is None:
+            screenConfig2 = ResTable_config.ScreenConfig2()
+
+        checks = (('imsi', imsi, ResTable_config.Imsi),
+                ('locale', locale, ResTable_config.Locale),
+                ('screenType', screenType, ResTable_config.ScreenType),
+                ('input', input, ResTable_config.Input),
+                ('screenSize', screenSize, ResTable_config.ScreenSize),
+                ('version', version, ResTable_config.Version),
+                ('screenConfig', screenConfig, ResTable_config.ScreenConfig),
+                ('screenSizeDp', screenSizeDp, ResTable_config.ScreenSizeDp),
+                ('screenConfig2', screenConfig2,
+                    ResTable_config.ScreenConfig2))
+        for field, value, cls in checks:
+            if not isinstance(value, cls):
+                raise WrongTypeException(field, cls)
+
+        if isinstance(localeScript, str):
+            localeScript = localeScript.encode('ascii')
+        if isinstance(localeVariant, str):
+            localeVariant = localeVariant.encode('ascii')
+        if isinstance(localeNumberingSystem, str):
+            localeNumberingSystem = localeNumberingSystem.encode('ascii')
+
+        # defer key computation until all fields are set
+        object.__setattr__(self, 'key', None)
+
+        ## Mobile country and network code
+        self.imsi = imsi
+        ## Language and country
+        self.locale = locale
+        ## Orientation, touchscreen and density
+        self.screenType = screenType
+        ## Keyboard, navigation and input flags
+        self.input = input
+        ## Screen dimensions in pixels
+        self.screenSize = screenSize
+        ## Required SDK version
+        self.version = version
+        ## Screen layout, UI mode and smallest width
+        self.screenConfig = screenConfig
+        ## Screen dimensions in dp
+        self.screenSizeDp = screenSizeDp
+        ## The ISO-15924 short name for the script corresponding to this
+        #  configuration (eg. Hant, Latn, etc.).
+        self.localeScript = localeScript.ljust(4, b'\0')
+        ## A single BCP-47 variant subtag, padded with NULLs.
+        self.localeVariant = localeVariant.ljust(8, b'\0')
+        ## Round screen, color mode
+        self.screenConfig2 = screenConfig2
+        ## Whether localeScript was computed by the platform, not set by the
+        #  user
+        self.localeScriptWasComputed = int(localeScriptWasComputed)
+        ## Unicode numbering system extension, padded with NULLs.
+        self.localeNumberingSystem = localeNumberingSystem.ljust(8, b'\0')
+        ## Reserved bytes at the end of the structure
+        self.pad = pad
+        ## Bytes past the fields known to this library, preserved verbatim
+        self.extra = extra
+
+        self._update_key()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in ResTable_config._key_attrs and self.key is not None:
+            self._update_key()
+
+    ## Recomputes packed comparison key from current qualifiers
+    def _update_key(self):
+        imsi = self.imsi
+        locale = self.locale
+        st = self.screenType
+        inp = self.input
+        ss = self.screenSize
+        ver = self.version
+        sc = self.screenConfig
+        sdp = self.screenSizeDp
+        sc2 = self.screenConfig2
+        packed = struct.pack(ResTable_config._key_format,
+                imsi.mcc.integer, imsi.mnc.integer,
+                locale.language, locale.country, self.localeScript,
+                self.localeVariant, self.localeNumberingSystem,
+                st.orientation.integer, st.touchscreen.integer,
+                st.density.integer, inp.keyboard.integer,
+                inp.navigation.integer, inp.inputFlags.integer,
+                inp.inputPad0.integer, ss.screenWidth.integer,
+                ss.screenHeight.integer, ver.sdkVersion.integer,
+                ver.minorVersion.integer, sc.screenLayout.integer,
+                sc.uiMode.integer, sc.smallestScreenWidthDp.integer,
+                sc2.screenLayout2.integer, sc2.colorMode.integer,
+                sc2.screenConfigPad2.integer, sdp.screenWidthDp.integer,
+                sdp.screenHeightDp.integer, self.localeScriptWasComputed,
+                self.pad)
+        ## Packed integer of all qualifiers, used for equality, hashing and
+        #  ordering
+        object.__setattr__(self, 'key', int.from_bytes(packed, 'big'))
+
+    ## Languages considered equivalent when matching
+    # \details Tagalog and Filipino, the latter in packed three-letter form.
+    _equivalent_languages = ((b'tl', b'\xad\x05'), (b'\xad\x05', b'tl'))
+
+    def _langs_are_equivalent(lhs, rhs):
+        return lhs == rhs or (lhs, rhs) in \
+                ResTable_config._equivalent_languages
+
+    ## Checks whether resources of this configuration may be used on a device
+    #  described by SETTINGS
+    # \details Mirrors ResTable_config::match() of the platform. As this
+    # library does not ship CLDR likely-subtags data, scripts are not
+    # computed from language and country: when either side lacks a script,
+    # countries must match instead.
+    def match(self, settings):
+        if self.imsi.mcc.integer or self.imsi.mnc.integer:
+            mcc = self.imsi.mcc.integer
+            mnc = self.imsi.mnc.integer
+            if mcc != 0 and mcc != settings.imsi.mcc.integer:
+                return False
+            if mnc != 0 and mnc != settings.imsi.mnc.integer:
+                return False
+
+        language = self.locale.language
+        if language != b'\0\0' or self.locale.country != b'\0\0':
+            if not ResTable_config._langs_are_equivalent(language,
+                    settings.locale.language):
+                return False
+            if settings.localeScript[0] == 0 or self.localeScript[0] == 0:
+                country = self.locale.country
+                if country[0] != 0 and country != settings.locale.country:
+                    return False
+            elif self.localeScript != settings.localeScript:
+                return False
+
+        sc = self.screenConfig
+        ssc = settings.screenConfig
+        if sc.screenLayout.integer or sc.uiMode.integer or \
+                sc.smallestScreenWidthDp.integer:
+            layout = sc.screenLayout.integer
+            setLayout = ssc.screenLayout.integer
+            layoutDir = layout & ResTable_config.MASK_LAYOUTDIR
+            if layoutDir != 0 and layoutDir != \
+                    setLayout & ResTable_config.MASK_LAYOUTDIR:
+                return False
+            # any screen sizes for larger screens than the setting do not
+            # match
+            screenSize = layout & ResTable_config.MASK_SCREENSIZE
+            if screenSize != 0 and screenSize > \
+                    setLayout & ResTable_config.MASK_SCREENSIZE:
+                return False
+            screenLong = layout & ResTable_config.MASK_SCREENLONG
+            if screenLong != 0 and screenLong != \
+                    setLayout & ResTable_config.MASK_SCREENLONG:
+                return False
+            uiMode = sc.uiMode.integer
+            setUiMode = ssc.uiMode.integer
+            uiModeType = uiMode & ResTable_config.MASK_UI_MODE_TYPE
+            if uiModeType != 0 and uiModeType != \
+                    setUiMode & ResTable_config.MASK_UI_MODE_TYPE:
+                return False
+            uiModeNight = uiMode & ResTable_config.MASK_UI_MODE_NIGHT
+            if uiModeNight != 0 and uiModeNight != \
+                    setUiMode & ResTable_config.MASK_UI_MODE_NIGHT:
+                return False
+            sw = sc.smallestScreenWidthDp.integer
+            if sw != 0 and sw > ssc.smallestScreenWidthDp.integer:
+                return False
+
+        sc2 = self.screenConfig2
+        ssc2 = settings.screenConfig2
+        if sc2.screenLayout2.integer or sc2.colorMode.integer:
+            round = sc2.screenLayout2.integer & \
+                    ResTable_config.MASK_SCREENROUND
+            if round != 0 and round != ssc2.screenLayout2.integer & \
+                    ResTable_config.MASK_SCREENROUND:
+                return False
+            colorMode = sc2.colorMode.integer
+            setColorMode = ssc2.colorMode.integer
+            hdr = colorMode & ResTable_config.MASK_HDR
+            if hdr != 0 and hdr != setColorMode & ResTable_config.MASK_HDR:
+                return False
+            gamut = colorMode & ResTable_config.MASK_WIDE_COLOR_GAMUT
+            if gamut != 0 and gamut != \
+                    setColorMode & ResTable_config.MASK_WIDE_COLOR_GAMUT:
+                return False
+
+        width = self.screenSizeDp.screenWidthDp.integer
+        height = self.screenSizeDp.screenHeightDp.integer
+        if width != 0 and width > settings.screenSizeDp.screenWidthDp.integer:
+            return False
+        if height != 0 and \
+                height > settings.screenSizeDp.screenHeightDp.integer:
+            return False
+
+        orientation = self.screenType.orientation.integer
+        if orientation != 0 and \
+                orientation != settings.screenType.orientation.integer:
+            return False
+        # density always matches, as it can be scaled
+        touchscreen = self.screenType.touchscreen.integer
+        if touchscreen != 0 and \
+                touchscreen != settings.screenType.touchscreen.integer:
+            return False
+
+        inp = self.input
+        sinp = settings.input
+        if inp.keyboard.integer or inp.navigation.integer or \
+                inp.inputFlags.integer:
+            flags = inp.inputFlags.integer
+            setFlags = sinp.inputFlags.integer
+            keysHidden = flags & ResTable_config.MASK_KEYSHIDDEN
+            setKeysHidden = setFlags & ResTable_config.MASK_KEYSHIDDEN
+            if keysHidden != 0 and keysHidden != setKeysHidden:
+                # for compatibility, a request for KEYSHIDDEN_NO also
+                # matches the more recent KEYSHIDDEN_SOFT
+                if keysHidden != ResTable_config.KEYSHIDDEN_NO or \
+                        setKeysHidden != ResTable_config.KEYSHIDDEN_SOFT:
+                    return False
+            navHidden = flags & ResTable_config.MASK_NAVHIDDEN
+            if navHidden != 0 and navHidden != \
+                    setFlags & ResTable_config.MASK_NAVHIDDEN:
+                return False
+            keyboard = inp.keyboard.integer
+            if keyboard != 0 and keyboard != sinp.keyboard.integer:
+                return False
+            navigation = inp.navigation.integer
+            if navigation != 0 and navigation != sinp.navigation.integer:
+                return False
+
+        width = self.screenSize.screenWidth.integer
+        height = self.screenSize.screenHeight.integer
+        if width != 0 and width > settings.screenSize.screenWidth.integer:
+            return False
+        if height != 0 and height > settings.screenSize.screenHeight.integer:
+            return False
+
+        sdkVersion = self.version.sdkVersion.integer
+        minorVersion = self.version.minorVersion.integer
+        if sdkVersion != 0 and sdkVersion > settings.version.sdkVersion.integer:
+            return False
+        if minorVersion != 0 and \
+                minorVersion != settings.version.minorVersion.integer:
+            return False
+
+        return True
+
+    def _locale_importance(self):
+        return (4 if self.localeVariant[0] else 0) + \
+                (2 if self.localeScript[0] and \
+                not self.localeScriptWasComputed else 0) + \
+                (1 if self.localeNumberingSystem[0] else 0)
+
+    def _is_locale_more_specific_than(self, o):
+        if self.locale.language[0] != o.locale.language[0]:
+            if not self.locale.language[0]:
+                return -1
+            if not o.locale.language[0]:
+                return 1
+        if self.locale.country[0] != o.locale.country[0]:
+            if not self.locale.country[0]:
+                return -1
+            if not o.locale.country[0]:
+                return 1
+        return self._locale_importance() - o._locale_importance()
+
+    ## Compares regions of two resources against requested one
+    # \details Simplified version of localeDataCompareRegions(), which knows
+    # no region hierarchy: exact region is better than no region, which in
+    # turn is better than any other region.
+    def _compare_regions(lhs, rhs, requested):
+        if lhs == rhs:
+            return 0
+        if lhs == requested:
+            return 1
+        if rhs == requested:
+            return -1
+        if lhs[0] == 0:
+            return 1
+        if rhs[0] == 0:
+            return -1
+        return 0
+
+    def _is_locale_better_than(self, o, requested):
+        if requested.locale.language[0] == 0 and \
+                requested.locale.country[0] == 0:
+            return False
+        if self.locale.language[0] == 0 and self.locale.country[0] == 0 and \
+                o.locale.language[0] == 0 and o.locale.country[0] == 0 and \
+                self.localeScript[0] == 0 and o.localeScript[0] == 0:
+            return False
+
+        language = self.locale.language
+        country = self.locale.country
+        if not ResTable_config._langs_are_equivalent(language,
+                o.locale.language):
+            # no-language resources are where US English traditionally lives
+            if requested.locale.language == b'en' and \
+                    requested.locale.country == b'US':
+                if language[0] != 0:
+                    return country[0] == 0 or country == b'US'
+                return not (o.locale.country[0] == 0 or \
+                        o.locale.country == b'US')
+            return language[0] != 0
+
+        region = ResTable_config._compare_regions(country, o.locale.country,
+                requested.locale.country)
+        if region != 0:
+            return region > 0
+
+        variant = self.localeVariant == requested.localeVariant
+        oVariant = o.localeVariant == requested.localeVariant
+        if variant != oVariant:
+            return variant
+
+        numbering = self.localeNumberingSystem == \
+                requested.localeNumberingSystem
+        oNumbering = o.localeNumberingSystem == \
+                requested.localeNumberingSystem
+        if numbering != oNumbering:
+            return numbering
+
+        # identical language is better than just equivalent
+        return language == requested.locale.language and \
+                o.locale.language != requested.locale.language
+
+    ## Checks whether this configuration is more specific than O
+    # \details The order of the tests defines importance of one qualifier
+    # over another.
+    def isMoreSpecificThan(self, o):
+        def more(lhs, rhs):
+            if lhs == rhs:
+                return None
+            if not lhs:
+                return False
+            if not rhs:
+                return True
+            return None
+
+        checks = [(self.imsi.mcc.integer, o.imsi.mcc.integer),
+                (self.imsi.mnc.integer, o.imsi.mnc.integer)]
+        for lhs, rhs in checks:
+            ret = more(lhs, rhs)
+            if ret is not None:
+                return ret
+
+        diff = self._is_locale_more_specific_than(o)
+        if diff != 0:
+            return diff > 0
+
+        layout = self.screenConfig.screenLayout.integer
+        oLayout = o.screenConfig.screenLayout.integer
+        layout2 = self.screenConfig2.screenLayout2.integer
+        oLayout2 = o.screenConfig2.screenLayout2.integer
+        colorMode = self.screenConfig2.colorMode.integer
+        oColorMode = o.screenConfig2.colorMode.integer
+        uiMode = self.screenConfig.uiMode.integer
+        oUiMode = o.screenConfig.uiMode.integer
+        flags = self.input.inputFlags.integer
+        oFlags = o.input.inputFlags.integer
+        C = ResTable_config
+        checks = [(layout & C.MASK_LAYOUTDIR, oLayout & C.MASK_LAYOUTDIR),
+                (self.screenConfig.smallestScreenWidthDp.integer,
+                    o.screenConfig.smallestScreenWidthDp.integer),
+                (self.screenSizeDp.screenWidthDp.integer,
+                    o.screenSizeDp.screenWidthDp.integer),
+                (self.screenSizeDp.screenHeightDp.integer,
+                    o.screenSizeDp.screenHeightDp.integer),
+                (layout & C.MASK_SCREENSIZE, oLayout & C.MASK_SCREENSIZE),
+                (layout & C.MASK_SCREENLONG, oLayout & C.MASK_SCREENLONG),
+                (layout2 & C.MASK_SCREENROUND, oLayout2 & C.MASK_SCREENROUND),
+                (colorMode & C.MASK_HDR, oColorMode & C.MASK_HDR),
+                (colorMode & C.MASK_WIDE_COLOR_GAMUT,
+                    oColorMode & C.MASK_WIDE_COLOR_GAMUT),
+                (self.screenType.orientation.integer,
+                    o.screenType.orientation.integer),
+                (uiMode & C.MASK_UI_MODE_TYPE, oUiMode & C.MASK_UI_MODE_TYPE),
+                (uiMode & C.MASK_UI_MODE_NIGHT,
+                    oUiMode & C.MASK_UI_MODE_NIGHT),
+                # density is never more specific, as the default equals 160
+                (self.screenType.touchscreen.integer,
+                    o.screenType.touchscreen.integer),
+                (flags & C.MASK_KEYSHIDDEN, oFlags & C.MASK_KEYSHIDDEN),
+                (flags & C.MASK_NAVHIDDEN, oFlags & C.MASK_NAVHIDDEN),
+                (self.input.keyboard.integer, o.input.keyboard.integer),
+                (self.input.navigation.integer, o.input.navigation.integer),
+                (self.screenSize.screenWidth.integer,
+                    o.screenSize.screenWidth.integer),
+                (self.screenSize.screenHeight.integer,
+                    o.screenSize.screenHeight.integer),
+                (self.version.sdkVersion.integer,
+                    o.version.sdkVersion.integer),
+                (self.version.minorVersion.integer,
+                    o.version.minorVersion.integer)]
+        for lhs, rhs in checks:
+            ret = more(lhs, rhs)
+            if ret is not None:
+                return ret
+
+        return False
+
+    ## Checks whether this configuration is a better match for REQUESTED
+    #  than O
+    # \details Both this configuration and O must already match REQUESTED.
+    # Mirrors ResTable_config::isBetterThan() of the platform. Without
+    # REQUESTED, falls back to isMoreSpecificThan().
+    def isBetterThan(self, o, requested=None):
+        if requested is None:
+            return self.isMoreSpecificThan(o)
+
+        C = ResTable_config
+        mcc, oMcc = self.imsi.mcc.integer, o.imsi.mcc.integer
+        if mcc != oMcc and requested.imsi.mcc.integer:
+            return bool(mcc)
+        mnc, oMnc = self.imsi.mnc.integer, o.imsi.mnc.integer
+        if mnc != oMnc and requested.imsi.mnc.integer:
+            return bool(mnc)
+
+        if self._is_locale_better_than(o, requested):
+            return True
+        elif o._is_locale_better_than(self, requested):
+            return False
+
+        layout = self.screenConfig.screenLayout.integer
+        oLayout = o.screenConfig.screenLayout.integer
+        reqLayout = requested.screenConfig.screenLayout.integer
+        if (layout ^ oLayout) & C.MASK_LAYOUTDIR and \
+                reqLayout & C.MASK_LAYOUTDIR:
+            return layout & C.MASK_LAYOUTDIR > oLayout & C.MASK_LAYOUTDIR
+
+        sw = self.screenConfig.smallestScreenWidthDp.integer
+        oSw = o.screenConfig.smallestScreenWidthDp.integer
+        if sw != oSw:
+            # larger configs are already filtered out, so take the largest
+            return sw > oSw
+
+        # sum of differences from the requested dimensions; an unspecified
+        # dimension yields a large delta, preferring specified ones
+        def delta(dims, oDims, reqDims):
+            mine = other = 0
+            for d, oD, reqD in zip(dims, oDims, reqDims):
+                if reqD:
+                    mine += reqD - d
+                    other += reqD - oD
+            return mine, other
+
+        mine, other = delta(
+                (self.screenSizeDp.screenWidthDp.integer,
+                    self.screenSizeDp.screenHeightDp.integer),
+                (o.screenSizeDp.screenWidthDp.integer,
+                    o.screenSizeDp.screenHeightDp.integer),
+                (requested.screenSizeDp.screenWidthDp.integer,
+                    requested.screenSizeDp.screenHeightDp.integer))
+        if mine != other:
+            return mine < other
+
+        if (layout ^ oLayout) & C.MASK_SCREENSIZE and \
+                reqLayout & C.MASK_SCREENSIZE:
+            # undefined is considered equivalent to normal, but only if the
+            # requested size is at least normal
+            mySL = layout & C.MASK_SCREENSIZE
+            oSL = oLayout & C.MASK_SCREENSIZE
+            fixedMySL, fixedOSL = mySL, oSL
+            if reqLayout & C.MASK_SCREENSIZE >= C.SCREENSIZE_NORMAL:
+                fixedMySL = fixedMySL or C.SCREENSIZE_NORMAL
+                fixedOSL = fixedOSL or C.SCREENSIZE_NORMAL
+            if fixedMySL == fixedOSL:
+                return mySL != 0
+            return fixedMySL > fixedOSL
+        if (layout ^ oLayout) & C.MASK_SCREENLONG and \
+                reqLayout & C.MASK_SCREENLONG:
+            return bool(layout & C.MASK_SCREENLONG)
+
+        layout2 = self.screenConfig2.screenLayout2.integer
+        oLayout2 = o.screenConfig2.screenLayout2.integer
+        if (layout2 ^ oLayout2) & C.MASK_SCREENROUND and \
+                requested.screenConfig2.screenLayout2.integer & \
+                C.MASK_SCREENROUND:
+            return bool(layout2 & C.MASK_SCREENROUND)
+
+        colorMode = self.screenConfig2.colorMode.integer
+        oColorMode = o.screenConfig2.colorMode.integer
+        reqColorMode = requested.screenConfig2.colorMode.integer
+        if (colorMode ^ oColorMode) & C.MASK_HDR and reqColorMode & C.MASK_HDR:
+            return bool(colorMode & C.MASK_HDR)
+        if (colorMode ^ oColorMode) & C.MASK_WIDE_COLOR_GAMUT and \
+                reqColorMode & C.MASK_WIDE_COLOR_GAMUT:
+            return bool(colorMode & C.MASK_WIDE_COLOR_GAMUT)
+
+        orientation = self.screenType.orientation.integer
+        if orientation != o.screenType.orientation.integer and \
+                requested.screenType.orientation.integer:
+            return bool(orientation)
+
+        uiMode = self.screenConfig.uiMode.integer
+        oUiMode = o.screenConfig.uiMode.integer
+        reqUiMode = requested.screenConfig.uiMode.integer
+        if (uiMode ^ oUiMode) & C.MASK_UI_MODE_TYPE and \
+                reqUiMode & C.MASK_UI_MODE_TYPE:
+            return bool(uiMode & C.MASK_UI_MODE_TYPE)
+        if (uiMode ^ oUiMode) & C.MASK_UI_MODE_NIGHT and \
+                reqUiMode & C.MASK_UI_MODE_NIGHT:
+            return bool(uiMode & C.MASK_UI_MODE_NIGHT)
+
+        density = self.screenType.density.integer
+        oDensity = o.screenType.density.integer
+        if density != oDensity:
+            h = density or C.DENSITY_MEDIUM
+            l = oDensity or C.DENSITY_MEDIUM
+            # DENSITY_ANY is always preferred over scaling a density bucket
+            if h == C.DENSITY_ANY:
+                return True
+            if l == C.DENSITY_ANY:
+                return False
+            reqDensity = requested.screenType.density.integer
+            if reqDensity in (0, C.DENSITY_ANY):
+                reqDensity = C.DENSITY_MEDIUM
+            imBigger = True
+            if l > h:
+                h, l = l, h
+                imBigger = False
+            if reqDensity >= h:
+                return imBigger
+            if l >= reqDensity:
+                return not imBigger
+            # scaling down is considered 2x better than up
+            if ((2 * l) - reqDensity) * h > reqDensity * reqDensity:
+                return not imBigger
+            return imBigger
+
+        touchscreen = self.screenType.touchscreen.integer
+        if touchscreen != o.screenType.touchscreen.integer and \
+                requested.screenType.touchscreen.integer:
+            return bool(touchscreen)
+
+        flags = self.input.inputFlags.integer
+        oFlags = o.input.inputFlags.integer
+        reqFlags = requested.input.inputFlags.integer
+        keysHidden = flags & C.MASK_KEYSHIDDEN
+        oKeysHidden = oFlags & C.MASK_KEYSHIDDEN
+        reqKeysHidden = reqFlags & C.MASK_KEYSHIDDEN
+        if keysHidden != oKeysHidden and reqKeysHidden:
+            if not keysHidden:
+                return False
+            if not oKeysHidden:
+                return True
+            # exact match disambiguates KEYSHIDDEN_NO and KEYSHIDDEN_SOFT
+            if reqKeysHidden == keysHidden:
+                return True
+            if reqKeysHidden == oKeysHidden:
+                return False
+        navHidden = flags & C.MASK_NAVHIDDEN
+        oNavHidden = oFlags & C.MASK_NAVHIDDEN
+        if navHidden != oNavHidden and reqFlags & C.MASK_NAVHIDDEN:
+            if not navHidden:
+                return False
+            if not oNavHidden:
+                return True
+        keyboard = self.input.keyboard.integer
+        if keyboard != o.input.keyboard.integer and \
+                requested.input.keyboard.integer:
+            return bool(keyboard)
+        navigation = self.input.navigation.integer
+        if navigation != o.input.navigation.integer and \
+                requested.input.navigation.integer:
+            return bool(navigation)
+
+        mine, other = delta(
+                (self.screenSize.screenWidth.integer,
+                    self.screenSize.screenHeight.integer),
+                (o.screenSize.screenWidth.integer,
+                    o.screenSize.screenHeight.integer),
+                (requested.screenSize.screenWidth.integer,
+                    requested.screenSize.screenHeight.integer))
+        if mine != other:
+            return mine < other
+
+        sdkVersion = self.version.sdkVersion.integer
+        oSdkVersion = o.version.sdkVersion.integer
+        if sdkVersion != oSdkVersion and requested.version.sdkVersion.integer:
+            return sdkVersion > oSdkVersion
+        minorVersion = self.version.minorVersion.integer
+        if minorVersion != o.version.minorVersion.integer and \
+                requested.version.minorVersion.integer:
+            return bool(minorVersion)
+
+        return False
+
+    ## Decodes two-byte language or country code, possibly packed into three
+    #  letters, into string
+    def _unpack_code(b, base):
+        if b[0] & 0x80:
+            first = b[1] & 0x1f
+            second = ((b[1] & 0xe0) >> 5) | ((b[0] & 0x03) << 3)
+            third = (b[0] & 0x7c) >> 2
+            return ''.join(chr(base + c) for c in (first, second, third))
+        return b.rstrip(b'\0').decode('ascii')
+
+    ## Returns locale as BCP-47 tag (eg. 'de', 'de-AT', 'sr-Latn-RS')
+    # \details Empty string means no locale qualifier.
+    def locale_tag(self):
+        language = self.locale.language
+        country = self.locale.country
+        parts = []
+        if language[0]:
+            parts.append(ResTable_config._unpack_code(language, ord('a')))
+        if self.localeScript[0] and not self.localeScriptWasComputed:
+            parts.append(self.localeScript.rstrip(b'\0').decode('ascii'))
+        if country[0]:
+            parts.append(ResTable_config._unpack_code(country, ord('0')))
+        if self.localeVariant[0]:
+            parts.append(self.localeVariant.rstrip(b'\0').decode('ascii'))
+        return '-'.join(parts)
+
+    ## Checks whether RHS selects the same resources as this configuration
+    # \details Unlike __eq__(), size of the structures is not compared, so
+    # configuration created here (0x30 bytes by default) matches the same
+    # one read from table written by aapt2 (0x40 bytes). Unknown trailing
+    # bytes have to be equal.
+    def same_qualifiers(self, rhs):
+        return self.key == rhs.key and self.extra == rhs.extra
+
+    ## Returns dictionary of qualifiers set in this configuration
+    # \details Keys are qualifier names, values are integers as stored in the
+    # structure, except 'locale', which is a BCP-47 tag. Qualifiers left at
+    # their 'any' value are omitted, so default configuration yields empty
+    # dictionary.
+    def qualifiers(self):
+        C = ResTable_config
+        layout = self.screenConfig.screenLayout.integer
+        layout2 = self.screenConfig2.screenLayout2.integer
+        colorMode = self.screenConfig2.colorMode.integer
+        uiMode = self.screenConfig.uiMode.integer
+        flags = self.input.inputFlags.integer
+        qualifiers = (
+                ('mcc', self.imsi.mcc.integer),
+                ('mnc', self.imsi.mnc.integer),
+                ('locale', self.locale_tag()),
+                ('layoutDir', layout & C.MASK_LAYOUTDIR),
+                ('smallestScreenWidthDp',
+                    self.screenConfig.smallestScreenWidthDp.integer),
+                ('screenWidthDp', self.screenSizeDp.screenWidthDp.integer),
+                ('screenHeightDp', self.screenSizeDp.screenHeightDp.integer),
+                ('screenSize', layout & C.MASK_SCREENSIZE),
+                ('screenLong', layout & C.MASK_SCREENLONG),
+                ('screenRound', layout2 & C.MASK_SCREENROUND),
+                ('wideColorGamut', colorMode & C.MASK_WIDE_COLOR_GAMUT),
+                ('hdr', colorMode & C.MASK_HDR),
+                ('orientation', self.screenType.orientation.integer),
+                ('uiModeType', uiMode & C.MASK_UI_MODE_TYPE),
+                ('uiModeNight', uiMode & C.MASK_UI_MODE_NIGHT),
+                ('density', self.screenType.density.integer),
+                ('touchscreen', self.screenType.touchscreen.integer),
+                ('keysHidden', flags & C.MASK_KEYSHIDDEN),
+                ('keyboard', self.input.keyboard.integer),
+                ('navHidden', flags & C.MASK_NAVHIDDEN),
+                ('navigation', self.input.navigation.integer),
+                ('screenWidth', self.screenSize.screenWidth.integer),
+                ('screenHeight', self.screenSize.screenHeight.integer),
+                ('sdkVersion', self.version.sdkVersion.integer),
+                ('minorVersion', self.version.minorVersion.integer))
+        return {name: value for name, value in qualifiers if value}
+
+    def _astuple(self):
+        return (self.size, self.imsi, self.locale, self.screenType, self.input,
+                self.screenSize, self.version, self.screenConfig,
+                self.screenSizeDp, self.localeScript, self.localeVariant,
+                self.screenConfig2, self.localeScriptWasComputed,
+                self.localeNumberingSystem, self.pad, self.extra)
 
     def __eq__(self, rhs):
-        return type(self) == type(rhs) and self.size == rhs.size
+        return type(self) == type(rhs) and self.key == rhs.key and \
+                self.size == rhs.size and self.extra == rhs.extra
+
+    def __ne__(self, rhs):
+        return not self == rhs
+
+    ## Orders configurations by key, then by size and unknown trailing bytes
+    # \details Tie-breakers make ordering agree with __eq__(), so configs
+    # that differ only in size or extra bytes still sort deterministically.
+    def __lt__(self, rhs):
+        return (self.key, self.size.integer, self.extra) < \
+                (rhs.key, rhs.size.integer, rhs.extra)
+
+    def __hash__(self):
+        return hash(self.key)
 
     def __str__(self):
-        # TODO: implement
-        return '{size}'.\
-                format(size=bytes(self.size)+self.notimpl)
+        return '{{size={size}, imsi={imsi}, locale={locale}, '\
+                'screenType={screenType}, input={input}, '\
+                'screenSize={screenSize}, version={version}, '\
+                'screenConfig={screenConfig}, screenSizeDp={screenSizeDp}, '\
+                'localeScript={localeScript}, localeVariant={localeVariant}, '\
+                'screenConfig2={screenConfig2}}}'.format(size=str(self.size),
+                        imsi=str(self.imsi), locale=str(self.locale),
+                        screenType=str(self.screenType), input=str(self.input),
+                        screenSize=str(self.screenSize),
+                        version=str(self.version),
+                        screenConfig=str(self.screenConfig),
+                        screenSizeDp=str(self.screenSizeDp),
+                        localeScript=repr(self.localeScript),
+                        localeVariant=repr(self.localeVariant),
+                        screenConfig2=str(self.screenConfig2))
 
     def __repr__(self):
-        return '{size}'.format(size=bytes(self.size)+self.notimpl)
+        return '{c}({size}, {imsi}, {locale}, {screenType}, {input}, '\
+                '{screenSize}, {version}, {screenConfig}, {screenSizeDp}, '\
+                '{localeScript}, {localeVariant}, {screenConfig2})'.format(
+                        c=type(self).__name__, size=self.size,
+                        imsi=repr(self.imsi), locale=repr(self.locale),
+                        screenType=repr(self.screenType),
+                        input=repr(self.input),
+                        screenSize=repr(self.screenSize),
+                        version=repr(self.version),
+                        screenConfig=repr(self.screenConfig),
+                        screenSizeDp=repr(self.screenSizeDp),
+                        localeScript=repr(self.localeScript),
+                        localeVariant=repr(self.localeVariant),
+                        screenConfig2=repr(self.screenConfig2))
+
+    def __len__(self):
+        return self.size.integer
 
     def __bytes__(self):
         size = bytes(self.size)
+        imsi = self.imsi
+        locale = self.locale
+        st = self.screenType
+        inp = self.input
+        ss = self.screenSize
+        ver = self.version
+        sc = self.screenConfig
+        sdp = self.screenSizeDp
+        sc2 = self.screenConfig2
+        fields = struct.pack(ResTable_config._format,
+                imsi.mcc.integer, imsi.mnc.integer,
+                locale.language, locale.country,
+                st.orientation.integer, st.touchscreen.integer,
+                st.density.integer, inp.keyboard.integer,
+                inp.navigation.integer, inp.inputFlags.integer,
+                inp.inputPad0.integer, ss.screenWidth.integer,
+                ss.screenHeight.integer, ver.sdkVersion.integer,
+                ver.minorVersion.integer, sc.screenLayout.integer,
+                sc.uiMode.integer, sc.smallestScreenWidthDp.integer,
+                sdp.screenWidthDp.integer, sdp.screenHeightDp.integer,
+                self.localeScript, self.localeVariant,
+                sc2.screenLayout2.integer, sc2.colorMode.integer,
+                sc2.screenConfigPad2.integer, self.localeScriptWasComputed,
+                self.localeNumberingSystem, self.pad)
+        # older files store only part of the structure
+        fields = fields[:self.size.integer - len(size)]
 
-        return size + self.notimpl
+        return size + fields + self.extra
 
     def from_bytes(b):
-        size, b = uint32.from_bytes(b, little=True)
-        restlen = size.integer - len(size)
-        notimpl, b = b[:restlen], b[restlen:] # TODO: implement
+        size, = struct.unpack('<I', b[:4])
+        if size < 4:
+            raise ConfigSizeException(size)
+        known = min(size, ResTable_config.len)
+        # fields missing in older, shorter structures are zero
+        fields = b[4:known].ljust(ResTable_config.len - 4, b'\0')
+        extra, b = b[known:size], b[size:]
 
-        obj = ResTable_config(size)
-        obj.notimpl = notimpl
+        mcc, mnc, language, country, orientation, touchscreen, density, \
+                keyboard, navigation, inputFlags, inputPad0, screenWidth, \
+                screenHeight, sdkVersion, minorVersion, screenLayout, \
+                uiMode, smallestScreenWidthDp, screenWidthDp, \
+                screenHeightDp, localeScript, localeVariant, screenLayout2, \
+                colorMode, screenConfigPad2, localeScriptWasComputed, \
+                localeNumberingSystem, pad = \
+                struct.unpack(ResTable_config._format, fields)
+
+        obj = ResTable_config(size,
+                ResTable_config.Imsi(mcc, mnc),
+                ResTable_config.Locale(language, country),
+                ResTable_config.ScreenType(orientation, touchscreen, density),
+                ResTable_config.Input(keyboard, navigation, inputFlags,
+                    inputPad0),
+                ResTable_config.ScreenSize(screenWidth, screenHeight),
+                ResTable_config.Version(sdkVersion, minorVersion),
+                ResTable_config.ScreenConfig(screenLayout, uiMode,
+                    smallestScreenWidthDp),
+                ResTable_config.ScreenSizeDp(screenWidthDp, screenHeightDp),
+                localeScript, localeVariant,
+                ResTable_config.ScreenConfig2(screenLayout2, colorMode,
+                    screenConfigPad2),
+                localeScriptWasComputed, localeNumberingSystem, pad, extra)
 
         return obj, b
 
-    ## \class Imsi
-    # \brief Filter based on MCC and MNC
-    class Imsi:
+    ## \class _Union
+    # \brief Common implementation of qualifier groups
+    # \details Every group corresponds to one of the unions in
+    # ResTable_config. Subclasses define _fields as a sequence of (name, type)
+    # pairs, where type is one of uint types or bytes of given length.
+    class _Union:
+
+        _fields = ()
+
+        def __init__(self, *args, **kwargs):
+            names = [name for name, _ in type(self)._fields]
+            values = dict(zip(names, args))
+            for name, value in kwargs.items():
+                if name not in names:
+                    raise TypeError('unexpected field {}'.format(name))
+                values[name] = value
+            for name, ftype in type(self)._fields:
+                value = values.get(name, 0)
+                if isinstance(ftype, int):
+                    if value == 0:
+                        value = bytes(ftype)
+                    elif isinstance(value, str):
+                        value = value.encode('ascii')
+                    if not isinstance(value, bytes):
+                        raise WrongTypeException(name, bytes)
+                    value = value.ljust(ftype, b'\0')
+                elif not isinstance(value, ftype):
+                    value = ftype(value, little=True)
+                setattr(self, name, value)
 
-        def __init__(self, mcc=0, mnc=0):
-            if isinstance(mcc, uint16):
-                ## Mobile Country Code
-                self.mcc = mcc
+        def _values(self):
+            return tuple(getattr(self, name) for name, _ in type(self)._fields)
 
-            if isinstance(mnc, uint16):
-                ## Mobile Network Code
-                self.mnc = mnc
+        def __eq__(self, rhs):
+            return type(self) == type(rhs) and \
+                    self._values() == rhs._values()
+
+        def __str__(self):
+            return '{{{}}}'.format(', '.join('{}={}'.format(name,
+                repr(value) if isinstance(value, bytes) else str(value))
+                for name, value in zip((n for n, _ in type(self)._fields),
+                    self._values())))
+
+        def __repr__(self):
+            return '{c}({args})'.format(c=type(self).__name__,
+                    args=', '.join(repr(v) if isinstance(v, bytes) else str(v)
+                        for v in self._values()))
+
+    ## \class Imsi
+    # \brief Filter based on MCC and MNC
+    class Imsi(_Union):
+        ## Mobile Country Code and Mobile Network Code
+        _fields = (('mcc', uint16), ('mnc', uint16))
 
     ## \class Locale
     # \brief Filter based on language and country
-    class Locale:
+    # \details Both are either two ASCII letters or packed three-letter
+    # codes, as defined by ISO-639-2 and ISO-3166-1 respectively.
+    class Locale(_Union):
+        _fields = (('language', 2), ('country', 2))
 
-        def __init__(self, language=b'\0\0', country=b'\0\0'):
-            pass
+    ## \class ScreenType
+    # \brief Filter based on orientation, touchscreen and density
+    class ScreenType(_Union):
+        _fields = (('orientation', uint8), ('touchscreen', uint8),
+                ('density', uint16))
 
-    class ScreenType:
-        pass
+    ## \class Input
+    # \brief Filter based on keyboard, navigation and their visibility
+    class Input(_Union):
+        _fields = (('keyboard', uint8), ('navigation', uint8),
+                ('inputFlags', uint8), ('inputPad0', uint8))
 
-    class Input:
-        pass
+    ## \class ScreenSize
+    # \brief Filter based on screen dimensions in pixels
+    class ScreenSize(_Union):
+        _fields = (('screenWidth', uint16), ('screenHeight', uint16))
 
-    class ScreenSize:
-        pass
+    ## \class Version
+    # \brief Filter based on platform version
+    class Version(_Union):
+        ## minorVersion must always be 0
+        _fields = (('sdkVersion', uint16), ('minorVersion', uint16))
 
-    class Version:
-        pass
+    ## \class ScreenConfig
+    # \brief Filter based on screen layout, UI mode and smallest width
+    class ScreenConfig(_Union):
+        _fields = (('screenLayout', uint8), ('uiMode', uint8),
+                ('smallestScreenWidthDp', uint16))
 
-    class ScreenConfig:
-        pass
+    ## \class ScreenSizeDp
+    # \brief Filter based on screen dimensions in dp
+    class ScreenSizeDp(_Union):
+        _fields = (('screenWidthDp', uint16), ('screenHeightDp', uint16))
 
-    class ScreenSizeDp:
-        pass
+    ## \class ScreenConfig2
+    # \brief Filter based on round screen and color mode
+    class ScreenConfig2(_Union):
+        _fields = (('screenLayout2', uint8), ('colorMode', uint8),
+                ('screenConfigPad2', uint16))
 
     ## \enum Config
     # \brief Flag bits for ResTable_typeSpec entries
@@ -119,6 +1007,74 @@ class ResTable_config:
 #           return Flag.from_bytes(b, True)
 
 
+## \class ResTable_configPool
+# \brief Table-wide pool of unique ResTable_config objects
+# \details Every distinct configuration is stored once and identified by
+# small integer id, being its index in the pool. Configurations are looked up
+# by their raw bytes first, so repeated configurations are not even decoded.
+# Interned configurations are shared between all ResTable_type chunks using
+# them, so they should be replaced, not modified in place.
+class ResTable_configPool:
+
+    def __init__(self, configs=None):
+        if configs is None:
+            configs = []
+
+        if not isinstance(configs, list):
+            raise WrongTypeException('configs', list)
+
+        ## List of unique ResTable_config objects, indexed by id
+        self.configs = []
+        # ids of known configs, keyed by config and by its raw bytes
+        self._ids = {}
+        self._raw = {}
+
+        for config in configs:
+            self.intern(config)
+
+    def __str__(self):
+        return '[{}]'.format(', '.join(str(c) for c in self.configs))
+
+    def __repr__(self):
+        return '{c}({configs})'.format(c=type(self).__name__,
+                configs=repr(self.configs))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and self.configs == rhs.configs
+
+    def __len__(self):
+        return len(self.configs)
+
+    def __iter__(self):
+        return iter(self.configs)
+
+    def __getitem__(self, id):
+        return self.configs[id]
+
+    ## Returns id of CONFIG, adding it to the pool if not present yet
+    def intern(self, config):
+        if not isinstance(config, ResTable_config):
+            raise WrongTypeException('config', ResTable_config)
+
+        id = self._ids.get(config)
+        if id is None:
+            id = len(self.configs)
+            self.configs.append(config)
+            self._ids[config] = id
+        return id
+
+    ## Returns id of config, which is first in buffer B, and rest of B
+    def intern_bytes(self, b):
+        size, = struct.unpack('<I', b[:4])
+        raw, b = bytes(b[:size]), b[size:]
+        id = self._raw.get(raw)
+        if id is None:
+            config, _ = ResTable_config.from_bytes(raw)
+            id = self.intern(config)
+            self._raw[raw] = id
+        return id, b
+
+
 class ResTable_configTests(unittest.TestCase):
 
     def test_serial_deserial(self):
@@ -130,7 +1086,6 @@ class ResTable_configTests(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
-    @unittest.skip('Not ready yet')
     def test_from_bytes(self):
         invector = b'\x30' + bytes(7) + b'de' + bytes(38) + b'\x13\x37'
         expected = ResTable_config(size=0x30,
@@ -139,6 +1094,193 @@ class ResTable_configTests(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
+    def test_from_bytes_all_fields(self):
+        invector = b'\x40\0\0\0\x06\1\x0a\0enUS\2\3\xf0\0\2\1\0\0' + \
+                b'\0\0\0\0\x15\0\0\0\x12\x20\x58\2\0\0\0\0Latn' + \
+                bytes(8) + b'\2\0\0\0' + bytes(12) + b'\x13\x37'
+        obj, b = ResTable_config.from_bytes(invector)
+        expected = (262, 10, b'en', b'US', b'Latn', 2, 3, 240, 2, 1, 21,
+                0x12, 0x20, 600, 2, b'\x13\x37')
+        actual = (obj.imsi.mcc.integer, obj.imsi.mnc.integer,
+                obj.locale.language, obj.locale.country, obj.localeScript,
+                obj.screenType.orientation.integer,
+                obj.screenType.touchscreen.integer,
+                obj.screenType.density.integer, obj.input.keyboard.integer,
+                obj.input.navigation.integer, obj.version.sdkVersion.integer,
+                obj.screenConfig.screenLayout.integer,
+                obj.screenConfig.uiMode.integer,
+                obj.screenConfig.smallestScreenWidthDp.integer,
+                obj.screenConfig2.screenLayout2.integer, b)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(invector[:-2], bytes(obj))
+
+    def test_short_config_round_trip(self):
+        invector = b'\x1c\0\0\0' + bytes(4) + b'fr' + bytes(18) + b'\x13\x37'
+        obj, b = ResTable_config.from_bytes(invector)
+        expected = invector
+        actual = bytes(obj) + b
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(b'fr', obj.locale.language)
+
+    def test_long_config_keeps_extra(self):
+        invector = b'\x44\0\0\0' + bytes(60) + b'\1\2\3\4'
+        obj, b = ResTable_config.from_bytes(invector)
+        expected = invector
+        actual = bytes(obj)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(b'\1\2\3\4', obj.extra)
+
+    def test_different_locales_are_neq(self):
+        lhs = ResTable_config(locale=ResTable_config.Locale('de'))
+        rhs = ResTable_config(locale=ResTable_config.Locale('fr'))
+
+        self.assertNotEqual(lhs, rhs)
+        self.assertNotEqual(lhs.key, rhs.key)
+
+    def test_equal_configs_hash_equal(self):
+        lhs = ResTable_config(screenType=ResTable_config.ScreenType(
+            density=240))
+        rhs, _ = ResTable_config.from_bytes(bytes(lhs))
+
+        self.assertEqual(lhs, rhs)
+        self.assertEqual(hash(lhs), hash(rhs))
+        self.assertEqual(1, len({lhs, rhs}))
+
+    def test_default_sorts_first(self):
+        default = ResTable_config()
+        de = ResTable_config(locale=ResTable_config.Locale('de'))
+        hdpi = ResTable_config(screenType=ResTable_config.ScreenType(
+            density=240))
+        expected = [default, hdpi, de]
+        actual = sorted([hdpi, de, default])
+
+        self.assertEqual(expected, actual)
+
+    def test_order_agrees_with_eq(self):
+        short = ResTable_config()
+        full = ResTable_config(ResTable_config.len)
+        extra = ResTable_config(0x44, extra=b'\1\0\0\0')
+        expected = (True, False, False, [short, full, extra])
+        actual = (short < full, full < short, full < full,
+                sorted([extra, full, short]))
+
+        self.assertEqual(expected, actual)
+
+    def test_same_qualifiers(self):
+        de = ResTable_config.Locale('de')
+        invector = ResTable_config(ResTable_config.len, locale=de)
+        expected = (False, True, False)
+        actual = (invector == ResTable_config(locale=de),
+                invector.same_qualifiers(ResTable_config(locale=de)),
+                invector.same_qualifiers(ResTable_config()))
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_too_small(self):
+        with self.assertRaises(ConfigSizeException) as cm:
+            ResTable_config.from_bytes(b'\2\0\0\0')
+
+        expected = 'config size too small (2)'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_key_follows_assignment(self):
+        invector = ResTable_config()
+        before = invector.key
+        invector.version = ResTable_config.Version(21)
+        expected = ResTable_config(version=ResTable_config.Version(21)).key
+        actual = invector.key
+
+        self.assertNotEqual(before, actual)
+        self.assertEqual(expected, actual)
+
+    def test_len(self):
+        invector = ResTable_config(0x38)
+        expected = 0x38
+        actual = len(invector)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(expected, len(bytes(invector)))
+
+    def test_match_locale(self):
+        invector = ResTable_config(locale=ResTable_config.Locale('de'))
+        settings = ResTable_config(locale=ResTable_config.Locale('de', 'AT'))
+
+        self.assertTrue(invector.match(settings))
+        self.assertTrue(ResTable_config().match(settings))
+        self.assertFalse(invector.match(ResTable_config(
+            locale=ResTable_config.Locale('fr'))))
+
+    def test_match_version(self):
+        invector = ResTable_config(version=ResTable_config.Version(21))
+
+        self.assertFalse(invector.match(ResTable_config(
+            version=ResTable_config.Version(19))))
+        self.assertTrue(invector.match(ResTable_config(
+            version=ResTable_config.Version(28))))
+
+    def test_better_locale(self):
+        settings = ResTable_config(locale=ResTable_config.Locale('de', 'AT'))
+        de = ResTable_config(locale=ResTable_config.Locale('de'))
+        deAT = ResTable_config(locale=ResTable_config.Locale('de', 'AT'))
+
+        self.assertTrue(de.isBetterThan(ResTable_config(), settings))
+        self.assertTrue(deAT.isBetterThan(de, settings))
+        self.assertFalse(de.isBetterThan(deAT, settings))
+
+    def test_better_density_prefers_scaling_down(self):
+        settings = ResTable_config(screenType=ResTable_config.ScreenType(
+            density=320))
+        hdpi = ResTable_config(screenType=ResTable_config.ScreenType(
+            density=240))
+        xxhdpi = ResTable_config(screenType=ResTable_config.ScreenType(
+            density=480))
+
+        self.assertTrue(xxhdpi.isBetterThan(hdpi, settings))
+        self.assertFalse(hdpi.isBetterThan(xxhdpi, settings))
+
+    def test_more_specific_without_request(self):
+        de = ResTable_config(locale=ResTable_config.Locale('de'))
+        v21 = ResTable_config(version=ResTable_config.Version(21))
+
+        self.assertTrue(de.isBetterThan(v21))
+        self.assertFalse(v21.isBetterThan(de))
+
+    def test_locale_tag(self):
+        invector = ResTable_config(locale=ResTable_config.Locale('sr', 'RS'),
+                localeScript='Latn')
+        expected = 'sr-Latn-RS'
+        actual = invector.locale_tag()
+
+        self.assertEqual(expected, actual)
+
+    def test_locale_tag_packed_language(self):
+        invector = ResTable_config(locale=ResTable_config.Locale(b'\xad\x05'))
+        expected = 'fil'
+        actual = invector.locale_tag()
+
+        self.assertEqual(expected, actual)
+
+    def test_qualifiers(self):
+        invector = ResTable_config(locale=ResTable_config.Locale('de'),
+                screenType=ResTable_config.ScreenType(density=480),
+                version=ResTable_config.Version(21))
+        expected = {'locale': 'de', 'density': 480, 'sdkVersion': 21}
+        actual = invector.qualifiers()
+
+        self.assertEqual(expected, actual)
+
+    def test_default_has_no_qualifiers(self):
+        invector = ResTable_config()
+        expected = {}
+        actual = invector.qualifiers()
+
+        self.assertEqual(expected, actual)
+
     def test_config_to_int(self):
         invector = ResTable_config.Config.CONFIG_MCC
         expected = 0x1
@@ -169,3 +1311,46 @@ class ResTable_configTests(unittest.TestCase):
         actual = bytes(reversed(bytes(invector)))
 
         self.assertEqual(expected, actual)
+
+
+class ResTable_configPoolTests(unittest.TestCase):
+
+    def test_configs_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = ResTable_configPool(b'\x13\x37')
+
+        expected = 'configs must be of type list'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_intern_shares_equal_configs(self):
+        invector = ResTable_configPool()
+        first = invector.intern(ResTable_config(
+            locale=ResTable_config.Locale('de')))
+        second = invector.intern(ResTable_config(
+            locale=ResTable_config.Locale('de')))
+        other = invector.intern(ResTable_config())
+        expected = (0, 0, 1, 2)
+        actual = (first, second, other, len(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_intern_bytes(self):
+        invector = ResTable_configPool([ResTable_config()])
+        b = b'\x30' + bytes(7) + b'de' + bytes(38) + b'\x13\x37'
+        first, rest = invector.intern_bytes(b)
+        second, _ = invector.intern_bytes(b)
+        expected = (1, 1, b'\x13\x37', b'de')
+        actual = (first, second, rest, invector[first].locale.language)
+
+        self.assertEqual(expected, actual)
+        self.assertIs(invector[first], invector[second])
+
+    def test_intern_bytes_of_known_config(self):
+        config = ResTable_config(locale=ResTable_config.Locale('de'))
+        invector = ResTable_configPool([config])
+        id, _ = invector.intern_bytes(bytes(config))
+
+        self.assertEqual(0, id)
+        self.assertIs(config, invector[id])
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+## \file entry.py
+# \brief ResTable_entry, Res_value and related
+import unittest
+from arsc.type.uint8 import uint8
+from arsc.type.uint16 import uint16
+from arsc.type.uint32 import uint32
+from arsc.exceptions import WrongTypeException
+
+## \class Res_value
+# \brief Representation of a value in a resource, supplying type information.
+class Res_value:
+
+    len = 8
+
+    ## The 'data' is either 0 or 1, specifying this resource is either
+    #  undefined or empty, respectively.
+    TYPE_NULL = 0x00
+    ## The 'data' holds a ResTable_ref, a reference to another resource table
+    #  entry.
+    TYPE_REFERENCE = 0x01
+    ## The 'data' holds an attribute resource identifier.
+    TYPE_ATTRIBUTE = 0x02
+    ## The 'data' holds an index into the containing resource table's global
+    #  value string pool.
+    TYPE_STRING = 0x03
+    ## The 'data' holds a single-precision floating point number.
+    TYPE_FLOAT = 0x04
+    ## The 'data' holds a complex number encoding a dimension value, such as
+    #  "100in".
+    TYPE_DIMENSION = 0x05
+    ## The 'data' holds a complex number encoding a fraction of a container.
+    TYPE_FRACTION = 0x06
+    ## The 'data' holds a dynamic ResTable_ref, which needs to be resolved
+    #  before it can be used like a TYPE_REFERENCE.
+    TYPE_DYNAMIC_REFERENCE = 0x07
+    ## The 'data' holds an attribute resource identifier, which needs to be
+    #  resolved before it can be used like a TYPE_ATTRIBUTE.
+    TYPE_DYNAMIC_ATTRIBUTE = 0x08
+    ## The 'data' is a raw integer value of the form n..n.
+    TYPE_INT_DEC = 0x10
+    ## The 'data' is a raw integer value of the form 0xn..n.
+    TYPE_INT_HEX = 0x11
+    ## The 'data' is either 0 or 1, for input "false" or "true" respectively.
+    TYPE_INT_BOOLEAN = 0x12
+    ## The 'data' is a raw integer value of the form #aarrggbb.
+    TYPE_INT_COLOR_ARGB8 = 0x1c
+    ## The 'data' is a raw integer value of the form #rrggbb.
+    TYPE_INT_COLOR_RGB8 = 0x1d
+    ## The 'data' is a raw integer value of the form #argb.
+    TYPE_INT_COLOR_ARGB4 = 0x1e
+    ## The 'data' is a raw integer value of the form #rgb.
+    TYPE_INT_COLOR_RGB4 = 0x1f
+
+    def __init__(self, size=len, res0=0, dataType=TYPE_NULL, data=0):
+        if not isinstance(size, uint16):
+            size = uint16(size, little=True)
+
+        if not isinstance(res0, uint8):
+            res0 = uint8(res0, little=True)
+
+        if not isinstance(dataType, uint8):
+            dataType = uint8(dataType, little=True)
+
+        if not isinstance(data, uint32):
+            data = uint32(data, little=True)
+
+        ## Number of bytes in this structure.
+        self.size = size
+        ## Always set to 0.
+        self.res0 = res0
+        ## Type of the data value.
+        self.dataType = dataType
+        ## The data for this item, as interpreted according to dataType.
+        self.data = data
+
+    def __str__(self):
+        return '{{size={size}, res0={res0}, dataType={dataType}, '\
+                'data={data}}}'.format(size=str(self.size),
+                        res0=str(self.res0), dataType=str(self.dataType),
+                        data=str(self.data))
+
+    def __repr__(self):
+        return '{c}({size}, {res0}, {dataType}, {data})'.format(
+                c=type(self).__name__, size=self.size, res0=self.res0,
+                dataType=self.dataType, data=self.data)
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.size == rhs.size and \
+                self.res0 == rhs.res0 and \
+                self.dataType == rhs.dataType and \
+                self.data == rhs.data
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def __bytes__(self):
+        size = bytes(self.size)
+        res0 = bytes(self.res0)
+        dataType = bytes(self.dataType)
+        data = bytes(self.data)
+
+        return size + res0 + dataType + data
+
+    def from_bytes(b, little=True):
+        size, b = uint16.from_bytes(b, little=True)
+        res0, b = uint8.from_bytes(b)
+        dataType, b = uint8.from_bytes(b)
+        data, b = uint32.from_bytes(b, little=True)
+
+        return Res_value(size, res0, dataType, data), b
+
+
+## \class ResTable_map
+# \brief A single name/value mapping that is part of a complex resource entry.
+class ResTable_map:
+
+    len = 12
+
+    def __init__(self, name=0, value=None):
+        if value is None:
+            value = Res_value()
+
+        if not isinstance(name, uint32):
+            name = uint32(name, little=True)
+
+        if not isinstance(value, Res_value):
+            raise WrongTypeException('value', Res_value)
+
+        ## The resource identifier defining this mapping's name.
+        self.name = name
+        ## This mapping's value.
+        self.value = value
+
+    def __str__(self):
+        return '{{name={name}, value={value}}}'.format(name=str(self.name),
+                value=str(self.value))
+
+    def __repr__(self):
+        return '{c}({name}, {value})'.format(c=type(self).__name__,
+                name=self.name, value=repr(self.value))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.name == rhs.name and \
+                self.value == rhs.value
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def __bytes__(self):
+        return bytes(self.name) + bytes(self.value)
+
+    def from_bytes(b, little=True):
+        name, b = uint32.from_bytes(b, little=True)
+        value, b = Res_value.from_bytes(b)
+
+        return ResTable_map(name, value), b
+
+
+## \class ResTable_entry
+# \brief This is the beginning of information about an entry in the resource
+# table.
+# \details It holds the reference to the name of this entry, and is
+# immediately followed by one of:
+#   * A Res_value structure, if FLAG_COMPLEX is -not- set.
+#   * An array of ResTable_map structures, if FLAG_COMPLEX is set.
+#     These supply a set of name/value mappings of data.
+#
+# For complex entries object of ResTable_map_entry is used instead.
+class ResTable_entry:
+
+    len = 8
+
+    ## If set, this is a complex entry, holding a set of name/value
+    #  mappings.  It is followed by an array of ResTable_map structures.
+    FLAG_COMPLEX = 0x0001
+    ## If set, this resource has been declared public, so libraries
+    #  are allowed to reference it.
+    FLAG_PUBLIC = 0x0002
+    ## If set, this is a weak resource and may be overriden by strong
+    #  resources of the same name/type.
+    FLAG_WEAK = 0x0004
+
+    def __init__(self, size=len, flags=0, key=0, value=None):
+        if value is None:
+            value = Res_value()
+
+        if not isinstance(size, uint16):
+            size = uint16(size, little=True)
+
+        if not isinstance(flags, uint16):
+            flags = uint16(flags, little=True)
+
+        if not isinstance(key, uint32):
+            key = uint32(key, little=True)
+
+        if not isinstance(value, Res_value):
+            raise WrongTypeException('value', Res_value)
+
+        ## Number of bytes in this structure.
+        self.size = size
+        self.flags = flags
+        ## Reference into ResTable_package::keyStrings identifying this entry.
+        self.key = key
+        ## Value of the entry
+        self.value = value
+
+    def __str__(self):
+        return '{{size={size}, flags={flags}, key={key}, value={value}}}'.\
+                format(size=str(self.size), flags=str(self.flags),
+                        key=str(self.key), value=str(self.value))
+
+    def __repr__(self):
+        return '{c}({size}, {flags}, {key}, {value})'.format(
+                c=type(self).__name__, size=self.size, flags=self.flags,
+                key=self.key, value=repr(self.value))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.size == rhs.size and \
+                self.flags == rhs.flags and \
+                self.key == rhs.key and \
+                self.value == rhs.value
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def __bytes__(self):
+        size = bytes(self.size)
+        flags = bytes(self.flags)
+        key = bytes(self.key)
+        value = bytes(self.value)
+
+        return size + flags + key + value
+
+    ## Checks whether entry holds set of ResTable_map instead of single value
+    def is_complex(self):
+        return bool(self.flags.integer & ResTable_entry.FLAG_COMPLEX)
+
+    ## Returns list of all Res_value objects of the entry
+    def values(self):
+        return [self.value]
+
+    ## Deserializes entry from B
+    # \details Returns ResTable_map_entry if entry is complex.
+    def from_bytes(b, little=True):
+        size, rest = uint16.from_bytes(b, little=True)
+        flags, rest = uint16.from_bytes(rest, little=True)
+        if flags.integer & ResTable_entry.FLAG_COMPLEX:
+            return ResTable_map_entry.from_bytes(b)
+        key, rest = uint32.from_bytes(rest, little=True)
+        # skip fields of newer header versions
+        rest = b[size.integer:]
+        value, rest = Res_value.from_bytes(rest)
+
+        return ResTable_entry(size, flags, key, value), rest
+
+
+## \class ResTable_map_entry
+# \brief Extended form of a ResTable_entry for map entries, defining a parent
+# map resource from which to inherit values.
+class ResTable_map_entry(ResTable_entry):
+
+    len = 16
+
+    def __init__(self, size=len, flags=ResTable_entry.FLAG_COMPLEX, key=0,
+            parent=0, count=None, maps=None):
+        if maps is None:
+            maps = []
+
+        if count is None:
+            count = len(maps)
+
+        if not isinstance(parent, uint32):
+            parent = uint32(parent, little=True)
+
+        if not isinstance(count, uint32):
+            count = uint32(count, little=True)
+
+        if not isinstance(maps, list):
+            raise WrongTypeException('maps', list)
+
+        super().__init__(size, flags, key)
+        del self.value
+        ## Resource identifier of the parent mapping, or 0 if there is none.
+        self.parent = parent
+        ## Number of name/value pairs that follow for FLAG_COMPLEX.
+        self.count = count
+        ## List of ResTable_map
+        self.maps = maps
+
+    def __str__(self):
+        return '{{size={size}, flags={flags}, key={key}, parent={parent}, '\
+                'count={count}, maps=[{maps}]}}'.format(size=str(self.size),
+                        flags=str(self.flags), key=str(self.key),
+                        parent=str(self.parent), count=str(self.count),
+                        maps=', '.join(str(m) for m in self.maps))
+
+    def __repr__(self):
+        return '{c}({size}, {flags}, {key}, {parent}, {count}, {maps})'.format(
+                c=type(self).__name__, size=self.size, flags=self.flags,
+                key=self.key, parent=self.parent, count=self.count,
+                maps=repr(self.maps))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.size == rhs.size and \
+                self.flags == rhs.flags and \
+                self.key == rhs.key and \
+                self.parent == rhs.parent and \
+                self.count == rhs.count and \
+                self.maps == rhs.maps
+
+    def __bytes__(self):
+        size = bytes(self.size)
+        flags = bytes(self.flags)
+        key = bytes(self.key)
+        parent = bytes(self.parent)
+        count = bytes(self.count)
+        maps = bytes()
+        for m in self.maps:
+            maps += bytes(m)
+
+        return size + flags + key + parent + count + maps
+
+    def values(self):
+        return [m.value for m in self.maps]
+
+    def from_bytes(b, little=True):
+        size, rest = uint16.from_bytes(b, little=True)
+        flags, rest = uint16.from_bytes(rest, little=True)
+        key, rest = uint32.from_bytes(rest, little=True)
+        parent, rest = uint32.from_bytes(rest, little=True)
+        count, rest = uint32.from_bytes(rest, little=True)
+        rest = b[size.integer:]
+        maps = []
+        for i in range(count.integer):
+            m, rest = ResTable_map.from_bytes(rest)
+            maps.append(m)
+
+        return ResTable_map_entry(size, flags, key, parent, count, maps), rest
+
+
+class Res_valueTests(unittest.TestCase):
+
+    tv1_bytes = b'\x08\0\0\x03\x2a\0\0\0'
+
+    tv1_obj = Res_value(8, 0, Res_value.TYPE_STRING, 42)
+
+    def test_str(self):
+        invector = Res_valueTests.tv1_obj
+        expected = '{size=8, res0=0, dataType=3, data=42}'
+        actual = str(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_repr(self):
+        invector = Res_valueTests.tv1_obj
+        expected = 'Res_value(8, 0, 3, 42)'
+        actual = repr(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes(self):
+        invector = Res_valueTests.tv1_obj
+        expected = Res_valueTests.tv1_bytes
+        actual = bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        invector = Res_valueTests.tv1_bytes + b'\x13\x37'
+        expected = Res_valueTests.tv1_obj, b'\x13\x37'
+        actual = Res_value.from_bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+
+class ResTable_entryTests(unittest.TestCase):
+
+    tv1_bytes = b'\x08\0\0\0\x01\0\0\0' + Res_valueTests.tv1_bytes
+
+    tv1_obj = ResTable_entry(8, 0, 1, Res_valueTests.tv1_obj)
+
+    tv2_bytes = b'\x10\0\x01\0\x02\0\0\0\0\0\0\0\x01\0\0\0' + \
+            b'\x04\0\x01\x01' + b'\x08\0\0\x12\x01\0\0\0'
+
+    tv2_obj = ResTable_map_entry(16, ResTable_entry.FLAG_COMPLEX, 2, 0, 1,
+            [ResTable_map(0x01010004, Res_value(8, 0,
+                Res_value.TYPE_INT_BOOLEAN, 1))])
+
+    def test_value_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = ResTable_entry(value=b'\x13\x37')
+
+        expected = 'value must be of type Res_value'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_len(self):
+        invector = ResTable_entryTests.tv1_obj
+        expected = 16
+        actual = len(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes(self):
+        invector = ResTable_entryTests.tv1_obj
+        expected = ResTable_entryTests.tv1_bytes
+        actual = bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        invector = ResTable_entryTests.tv1_bytes + b'\x13\x37'
+        expected = ResTable_entryTests.tv1_obj, b'\x13\x37'
+        actual = ResTable_entry.from_bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes_complex(self):
+        invector = ResTable_entryTests.tv2_obj
+        expected = ResTable_entryTests.tv2_bytes
+        actual = bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_complex(self):
+        invector = ResTable_entryTests.tv2_bytes + b'\x13\x37'
+        expected = ResTable_entryTests.tv2_obj, b'\x13\x37'
+        actual = ResTable_entry.from_bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_values_complex(self):
+        invector = ResTable_entryTests.tv2_obj
+        expected = [ResTable_entryTests.tv2_obj.maps[0].value]
+        actual = invector.values()
+
+        self.assertEqual(expected, actual)
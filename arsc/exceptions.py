@@ -14,3 +14,42 @@ class ChunkHeaderWrongTypeException(Exception):
                 '{expects}{got}'.format(expects=str(expectedType),
                     got=' (got {})'.format(str(chunkType)) if \
                     chunkType else ''))
+
+class UnknownPackageException(Exception):
+
+    def __init__(self, packageId):
+        super().__init__(self, 'no runtime id for package {}'.format(
+            packageId))
+
+class ChunkOutOfBoundsException(Exception):
+
+    def __init__(self, offset):
+        super().__init__(self, 'chunk at offset {} does not fit in its '
+            'parent'.format(offset))
+
+class SizeChangeException(Exception):
+
+    def __init__(self, expected, got):
+        super().__init__(self, 'edit changes size of field from {} to {} '
+            'bytes'.format(expected, got))
+
+class IndexFormatException(Exception):
+
+    def __init__(self, reason):
+        super().__init__(self, 'wrong index format: {}'.format(reason))
+
+class ProfilerActiveException(Exception):
+
+    def __init__(self):
+        super().__init__(self, 'another parse profiler is already active')
+
+class StringTooLongException(Exception):
+
+    def __init__(self, length, limit):
+        super().__init__(self, 'length {} of string does not fit in its '
+            'prefix (at most {})'.format(length, limit))
+
+class ConfigSizeException(Exception):
+
+    def __init__(self, size):
+        super().__init__(self, 'config size too small ({})'.format(size))
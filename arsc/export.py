@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+## \file export.py
+# \brief Streaming export of tables as JSON Lines
+import io
+import json
+import struct
+import unittest
+from arsc.entry import Res_value
+
+## Names of Res_value data types, as used in exported records
+TYPE_NAMES = {
+        Res_value.TYPE_NULL: 'null',
+        Res_value.TYPE_REFERENCE: 'reference',
+        Res_value.TYPE_ATTRIBUTE: 'attribute',
+        Res_value.TYPE_STRING: 'string',
+        Res_value.TYPE_FLOAT: 'float',
+        Res_value.TYPE_DIMENSION: 'dimension',
+        Res_value.TYPE_FRACTION: 'fraction',
+        Res_value.TYPE_DYNAMIC_REFERENCE: 'dynamic_reference',
+        Res_value.TYPE_DYNAMIC_ATTRIBUTE: 'dynamic_attribute',
+        Res_value.TYPE_INT_DEC: 'int_dec',
+        Res_value.TYPE_INT_HEX: 'int_hex',
+        Res_value.TYPE_INT_BOOLEAN: 'boolean',
+        Res_value.TYPE_INT_COLOR_ARGB8: 'color_argb8',
+        Res_value.TYPE_INT_COLOR_RGB8: 'color_rgb8',
+        Res_value.TYPE_INT_COLOR_ARGB4: 'color_argb4',
+        Res_value.TYPE_INT_COLOR_RGB4: 'color_rgb4',
+        }
+
+## Returns Res_value VALUE as JSON-compatible dictionary
+# \details Dictionary has name of data type under 'type' and value decoded
+# according to it under 'data': strings are looked up in value pool of
+# TABLE, integers are signed, booleans are bool, floats are float, colors are
+# '#aarrggbb' strings and references are resource ids. Other types keep their
+# raw data.
+def value(v, table):
+    dataType = v.dataType.integer
+    data = v.data.integer
+    if dataType == Res_value.TYPE_STRING:
+        data = table.values.string(data)
+    elif dataType in (Res_value.TYPE_INT_DEC, Res_value.TYPE_INT_HEX):
+        data = data - (1 << 32) if data & 0x80000000 else data
+    elif dataType == Res_value.TYPE_INT_BOOLEAN:
+        data = data != 0
+    elif dataType == Res_value.TYPE_FLOAT:
+        data, = struct.unpack('<f', struct.pack('<I', data))
+    elif Res_value.TYPE_INT_COLOR_ARGB8 <= dataType <= \
+            Res_value.TYPE_INT_COLOR_RGB4:
+        data = '#{:08x}'.format(data)
+    return {'type': TYPE_NAMES.get(dataType, dataType), 'data': data}
+
+## Returns dictionary describing ENTRY of ResTable_type TYP of package PKG
+# \details Dictionary has resource 'id', 'package' id, 'type' and 'name'
+# strings, 'config' qualifiers (see ResTable_config.qualifiers()) and either
+# 'value' (see value()) or, for complex entries, 'parent' and 'map', list of
+# dictionaries with 'name' (attribute resource id) and 'value'. INDEX is index
+# of the entry within its type. QUALIFIERS may be passed, if they are already
+# known.
+def record(table, pkg, typ, index, entry, qualifiers=None):
+    pkgid = pkg.header.id.integer
+    typeId = typ.header.id.integer
+    if qualifiers is None:
+        qualifiers = typ.header.config.qualifiers()
+    ret = {
+            'id': (pkgid << 24) | (typeId << 16) | index,
+            'package': pkgid,
+            'type': pkg.typeStrings.string(typeId - 1),
+            'name': pkg.keyStrings.string(entry.key.integer),
+            'config': qualifiers,
+            }
+    if entry.is_complex():
+        ret['parent'] = entry.parent.integer
+        ret['map'] = [{'name': m.name.integer, 'value': value(m.value, table)}
+                for m in entry.maps]
+    else:
+        ret['value'] = value(entry.value, table)
+    return ret
+
+## Generates dictionary for every defined entry of TABLE
+# \details Records are produced one type chunk at a time, so only entries of
+# a single chunk are decoded at once. See record() for their contents.
+def records(table):
+    for pkg in table.packages:
+        for spec in pkg.types or []:
+            for typ in (spec or [])[1:]:
+                qualifiers = typ.header.config.qualifiers()
+                for i, entry in enumerate(typ.entries()):
+                    if entry is None:
+                        continue
+                    yield record(table, pkg, typ, i, entry, qualifiers)
+
+## Writes every record of TABLE to text file F as one line of JSON
+# \details Returns number of written records.
+def write_jsonl(table, f):
+    count = 0
+    for record in records(table):
+        f.write(json.dumps(record, ensure_ascii=False))
+        f.write('\n')
+        count += 1
+    return count
+
+
+class ExportTests(unittest.TestCase):
+
+    def tv1_obj():
+        from arsc.arsc import ResTable
+        from arsc.merge import MergeTests
+        table, _ = ResTable.from_bytes(MergeTests.sample())
+        return table
+
+    def test_value(self):
+        table = ExportTests.tv1_obj()
+        invector = [Res_value(dataType=Res_value.TYPE_STRING, data=1),
+                Res_value(dataType=Res_value.TYPE_INT_DEC, data=0xffffffff),
+                Res_value(dataType=Res_value.TYPE_INT_BOOLEAN, data=1),
+                Res_value(dataType=Res_value.TYPE_FLOAT, data=0x3fc00000),
+                Res_value(dataType=Res_value.TYPE_INT_COLOR_RGB8,
+                    data=0xff00ff00),
+                Res_value(dataType=Res_value.TYPE_REFERENCE,
+                    data=0x7f010000)]
+        expected = [{'type': 'string', 'data': 'y'},
+                {'type': 'int_dec', 'data': -1},
+                {'type': 'boolean', 'data': True},
+                {'type': 'float', 'data': 1.5},
+                {'type': 'color_rgb8', 'data': '#ff00ff00'},
+                {'type': 'reference', 'data': 0x7f010000}]
+        actual = [value(v, table) for v in invector]
+
+        self.assertEqual(expected, actual)
+
+    def test_records(self):
+        invector = ExportTests.tv1_obj()
+        expected = [
+                (0x7f010000, 'string', 'a', {}, 'x'),
+                (0x7f010001, 'string', 'b', {}, 'y'),
+                (0x7f010000, 'string', 'a', {'locale': 'de'}, 'z')]
+        actual = [(r['id'], r['type'], r['name'], r['config'],
+            r['value']['data']) for r in records(invector)]
+
+        self.assertEqual(expected, actual)
+
+    def test_records_is_generator(self):
+        invector = records(ExportTests.tv1_obj())
+        expected = 0x7f010000
+        actual = next(invector)['id']
+
+        self.assertEqual(expected, actual)
+
+    def test_write_jsonl(self):
+        f = io.StringIO()
+        count = write_jsonl(ExportTests.tv1_obj(), f)
+        lines = f.getvalue().splitlines()
+        expected = (3, 3, {'id': 0x7f010000, 'package': 0x7f,
+            'type': 'string', 'name': 'a', 'config': {'locale': 'de'},
+            'value': {'type': 'string', 'data': 'z'}})
+        actual = (count, len(lines), json.loads(lines[2]))
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+## \file index.py
+# \brief Precomputed indexes over whole ResTable
+import unittest
+from arsc.arsc import ResTable
+from arsc.arsc import ResTableTests
+from arsc.exceptions import WrongTypeException
+
+## \class QualifierIndex
+# \brief Maps every qualifier value to ResTable_type chunks carrying it
+# \details Qualifiers are decoded once per unique configuration of
+# table.configs pool (see ResTable_config.qualifiers() for names and values),
+# then every chunk is filed under each qualifier of its configuration. Chunks
+# of default configuration are kept separately in self.default.
+class QualifierIndex:
+
+    def __init__(self, table):
+        if not isinstance(table, ResTable):
+            raise WrongTypeException('table', ResTable)
+
+        table.intern_configs()
+
+        ## Indexed ResTable
+        self.table = table
+        ## Number of changes of the table the index was built at, see
+        #  ResTable.changes()
+        self.changes = table.changes()
+        ## Qualifiers of every configuration, indexed by config id
+        self.qualifiers = [c.qualifiers() for c in table.configs]
+        ## ResTable_type chunks of default configuration
+        self.default = []
+        ## Dictionary of qualifier name to dictionary of qualifier value to
+        #  list of ResTable_type chunks, in table order
+        self.index = {}
+
+        for pkg in table.packages:
+            for spec in pkg.types or []:
+                for typ in (spec or [])[1:]:
+                    qualifiers = self.qualifiers[typ.header.configId]
+                    if not qualifiers:
+                        self.default.append(typ)
+                    for name, value in qualifiers.items():
+                        self.index.setdefault(name, {}).setdefault(value,
+                                []).append(typ)
+
+    ## Checks whether index still describes its table
+    # \details Only change counter of the table is compared, so chunks are
+    # not visited. Chunks edited in place are noticed once the table is
+    # touched, see ResTable.touch().
+    def is_current(self):
+        return self.changes == self.table.changes()
+
+    ## Returns names of qualifiers used anywhere in the table
+    def names(self):
+        return sorted(self.index)
+
+    ## Returns sorted list of values of qualifier NAME used in the table
+    # \details Eg. values('locale') lists all locales the table ships.
+    def values(self, name):
+        return sorted(self.index.get(name, {}))
+
+    ## Returns list of ResTable_type chunks with qualifier NAME set to VALUE
+    def get(self, name, value):
+        return self.index.get(name, {}).get(value, [])
+
+    ## Returns ids of configurations with qualifier NAME set to VALUE
+    def configs(self, name, value):
+        return [i for i, q in enumerate(self.qualifiers)
+                if name in q and q[name] == value]
+
+
+class QualifierIndexTests(unittest.TestCase):
+
+    tv1_obj, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+
+    default, de = tv1_obj.packages[0].types[0][1:]
+
+    def test_table_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = QualifierIndex(b'\x13\x37')
+
+        expected = 'table must be of type ResTable'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_names(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = ['locale']
+        actual = invector.names()
+
+        self.assertEqual(expected, actual)
+
+    def test_values(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = ['de']
+        actual = invector.values('locale')
+
+        self.assertEqual(expected, actual)
+
+    def test_values_of_unused_qualifier(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = []
+        actual = invector.values('density')
+
+        self.assertEqual(expected, actual)
+
+    def test_get(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = [QualifierIndexTests.de]
+        actual = invector.get('locale', 'de')
+
+        self.assertEqual(len(expected), len(actual))
+        self.assertIs(expected[0], actual[0])
+
+    def test_default(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = [QualifierIndexTests.default]
+        actual = invector.default
+
+        self.assertEqual(len(expected), len(actual))
+        self.assertIs(expected[0], actual[0])
+
+    def test_configs(self):
+        invector = QualifierIndex(QualifierIndexTests.tv1_obj)
+        expected = [1]
+        actual = invector.configs('locale', 'de')
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+## \file library.py
+# \brief ResTable_lib and DynamicRefTable
+import unittest
+from arsc.type.uint32 import uint32
+from arsc.chunk import ResChunk_header
+from arsc.types import ResourceType
+from arsc.tracked import Tracked
+from arsc.exceptions import WrongTypeException
+from arsc.exceptions import ChunkHeaderWrongTypeException
+from arsc.exceptions import UnknownPackageException
+
+## \class ResTable_lib_header
+# \brief A shared library package-id to package name entry.
+# \details Followed by count ResTable_lib_entry structures, one for every
+# shared library the package references.
+class ResTable_lib_header:
+
+    len = 0xc
+
+    def __init__(self, header=None, count=0):
+        if header is None:
+            header = ResChunk_header(ResourceType.RES_TABLE_LIBRARY_TYPE,
+                    headerSize=ResTable_lib_header.len,
+                    size=ResTable_lib_header.len)
+        if not isinstance(header, ResChunk_header):
+            raise WrongTypeException('header', ResChunk_header)
+        if header.type is not ResourceType.RES_TABLE_LIBRARY_TYPE:
+            raise ChunkHeaderWrongTypeException(
+                    ResourceType.RES_TABLE_LIBRARY_TYPE, header.type)
+        self.header = header
+
+        if isinstance(count, uint32):
+            ## The number of shared libraries linked in this resource table.
+            self.count = count
+        else:
+            self.count = uint32(count, little=True)
+
+    def __str__(self):
+        return '{{header={header}, count={count}}}'.format(
+                header=str(self.header), count=str(self.count))
+
+    def __repr__(self):
+        return '{c}({header}, {count})'.format(c=type(self).__name__,
+                header=repr(self.header), count=self.count)
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and self.header == rhs.header and \
+                self.count == rhs.count
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def __bytes__(self):
+        header = bytes(self.header)
+        count = bytes(self.count)
+
+        return header + count
+
+    def from_bytes(b, little=True):
+        header, b = ResChunk_header.from_bytes(b)
+        count, b = uint32.from_bytes(b, little=True)
+
+        return ResTable_lib_header(header, count), b
+
+
+## \class ResTable_lib_entry
+# \brief A shared library package-id to package name entry.
+class ResTable_lib_entry:
+
+    MAX_NAME_LEN = 128
+    len = 0x104
+
+    def __init__(self, packageId=0, packageName=b'\0\0'):
+        if isinstance(packageId, uint32):
+            ## The package-id this shared library was assigned at build time.
+            # \details We use a uint32 to keep the structure aligned on a
+            # uint32 boundary.
+            self.packageId = packageId
+        else:
+            self.packageId = uint32(packageId, little=True)
+
+        if isinstance(packageName, str):
+            packageName = (packageName + '\0').encode('utf-16-le')
+        if isinstance(packageName, bytes):
+            name_length = len(packageName)
+            if name_length > ResTable_lib_entry.MAX_NAME_LEN * 2:
+                raise Exception('name is longer than maximum ({l}>{m})'.format(
+                    l=name_length, m=ResTable_lib_entry.MAX_NAME_LEN))
+            ## The package name of the shared library.
+            # \details NULL-terminated, UTF-16 string.
+            self.packageName = packageName + bytes(
+                    (ResTable_lib_entry.MAX_NAME_LEN * 2) - name_length)
+        else:
+            raise Exception('name must be of type bytes')
+
+    ## Returns package name as str
+    def name(self):
+        name = self.packageName.decode('utf-16-le')
+        return name.split('\0', 1)[0]
+
+    def __str__(self):
+        return '{{packageId={packageId}, packageName={packageName}}}'.format(
+                packageId=str(self.packageId), packageName=repr(self.name()))
+
+    def __repr__(self):
+        return '{c}({packageId}, {packageName})'.format(c=type(self).__name__,
+                packageId=self.packageId, packageName=repr(self.name()))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.packageId == rhs.packageId and \
+                self.packageName == rhs.packageName
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def __bytes__(self):
+        return bytes(self.packageId) + self.packageName
+
+    def from_bytes(b, little=True):
+        packageId, b = uint32.from_bytes(b, little=True)
+        packageName, b = b[:256], b[256:]
+
+        return ResTable_lib_entry(packageId, bytes(packageName)), b
+
+
+## \class ResTable_lib
+# \brief Chunk listing shared libraries referenced by a package
+class ResTable_lib(Tracked):
+
+    def __init__(self, header=None, entries=None):
+        if header is None:
+            header = ResTable_lib_header()
+
+        if entries is None:
+            entries = []
+
+        if not isinstance(header, ResTable_lib_header):
+            raise WrongTypeException('header', ResTable_lib_header)
+
+        if not isinstance(entries, list):
+            raise WrongTypeException('entries', list)
+
+        ## Instance of ResTable_lib_header
+        self.header = header
+        ## List of ResTable_lib_entry
+        self.entries = entries
+
+    def __str__(self):
+        return '{{header={header}, entries=[{entries}]}}'.format(
+                header=str(self.header),
+                entries=', '.join(str(e) for e in self.entries))
+
+    def __repr__(self):
+        return '{c}({header}, {entries})'.format(c=type(self).__name__,
+                header=repr(self.header), entries=repr(self.entries))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.header == rhs.header and \
+                self.entries == rhs.entries
+
+    def __len__(self):
+        return len(bytes(self))
+
+    def snapshot(self):
+        return (bytes(self.header), b''.join(bytes(e) for e in self.entries))
+
+    def __bytes__(self):
+        if not self.is_dirty():
+            return bytes(self.source())
+        header = bytes(self.header)
+        entries = bytes()
+        for entry in self.entries:
+            entries += bytes(entry)
+
+        return header + entries
+
+    def from_bytes(b, little=True):
+        content = b
+        header, _ = ResTable_lib_header.from_bytes(b)
+        size = header.header.size.integer
+        content, b = content[header.header.headerSize.integer:size], b[size:]
+
+        entries = []
+        for i in range(header.count.integer):
+            entry, content = ResTable_lib_entry.from_bytes(content)
+            entries.append(entry)
+
+        return ResTable_lib(header, entries), b
+
+
+## \class DynamicRefTable
+# \brief Maps package ids assigned at build time to ones assigned at runtime
+# \details Shared libraries and split packages are compiled against package
+# ids, which may change when all packages are loaded together. Remapping is
+# done with a lookup table of 256 ids, so every reference is translated in
+# constant time.
+class DynamicRefTable:
+
+    APP_PACKAGE_ID = 0x7f
+    SYS_PACKAGE_ID = 0x01
+
+    def __init__(self, packageId=APP_PACKAGE_ID, appAsLib=False):
+        ## Runtime id of package this table belongs to
+        self.packageId = packageId
+        ## Whether application package (0x7f) is loaded as shared library
+        self.appAsLib = appAsLib
+        ## Build time ids of libraries referenced by the package, keyed by
+        #  package name
+        self.entries = {}
+        ## Runtime id for every build time id, 0 if not known
+        self.lookup = bytearray(256)
+        self.lookup[DynamicRefTable.APP_PACKAGE_ID] = \
+                DynamicRefTable.APP_PACKAGE_ID
+        self.lookup[DynamicRefTable.SYS_PACKAGE_ID] = \
+                DynamicRefTable.SYS_PACKAGE_ID
+
+    def __repr__(self):
+        return '{c}({packageId}, {appAsLib})'.format(c=type(self).__name__,
+                packageId=self.packageId, appAsLib=self.appAsLib)
+
+    ## Loads build time ids of libraries from ResTable_lib chunk
+    def load(self, lib):
+        if not isinstance(lib, ResTable_lib):
+            raise WrongTypeException('lib', ResTable_lib)
+
+        for entry in lib.entries:
+            self.entries[entry.name()] = entry.packageId.integer
+
+    ## Makes references to library PACKAGENAME point to PACKAGEID
+    # \details Libraries not referenced by the package are ignored.
+    def add_mapping(self, packageName, packageId):
+        buildId = self.entries.get(packageName)
+        if buildId is not None:
+            self.lookup[buildId] = packageId
+
+    ## Translates RESID from build time to runtime package id
+    def lookup_resource_id(self, resid):
+        if resid == 0:
+            return resid
+
+        packageId = resid >> 24
+        if packageId == DynamicRefTable.APP_PACKAGE_ID and not self.appAsLib:
+            # app package ids are absolute
+            return resid
+
+        if packageId == 0 or (packageId == DynamicRefTable.APP_PACKAGE_ID \
+                and self.appAsLib):
+            # shared library accessing its own local resource
+            return (resid & 0xffffff) | (self.packageId << 24)
+
+        translated = self.lookup[packageId]
+        if translated == 0:
+            raise UnknownPackageException(packageId)
+        return (resid & 0xffffff) | (translated << 24)
+
+
+class ResTable_lib_headerTests(unittest.TestCase):
+
+    tv1_bytes = b'\3\2\x0c\0\x10\1\0\0\1\0\0\0'
+
+    tv1_obj = ResTable_lib_header(ResChunk_header(
+        ResourceType.RES_TABLE_LIBRARY_TYPE, 12, 272), 1)
+
+    def test_header_type_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = ResTable_lib_header(ResChunk_header(
+                ResourceType.RES_TABLE_TYPE))
+
+        expected = 'header must describe resource of type '\
+                'ResourceType.RES_TABLE_LIBRARY_TYPE (got '\
+                'ResourceType.RES_TABLE_TYPE)'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_len(self):
+        invector = ResTable_lib_header()
+        expected = 12
+        actual = len(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes(self):
+        invector = ResTable_lib_headerTests.tv1_obj
+        expected = ResTable_lib_headerTests.tv1_bytes
+        actual = bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        invector = ResTable_lib_headerTests.tv1_bytes + b'\x13\x37'
+        expected = ResTable_lib_headerTests.tv1_obj, b'\x13\x37'
+        actual = ResTable_lib_header.from_bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+
+class ResTable_libTests(unittest.TestCase):
+
+    tv1_bytes = b'\3\2\x0c\0\x10\1\0\0\1\0\0\0' + b'\2\0\0\0' + \
+            'com.lib\0'.encode('utf-16-le') + bytes(240)
+
+    tv1_obj = ResTable_lib(ResTable_lib_header(ResChunk_header(
+        ResourceType.RES_TABLE_LIBRARY_TYPE, 12, 272), 1),
+        [ResTable_lib_entry(2, 'com.lib')])
+
+    def test_len(self):
+        invector = ResTable_libTests.tv1_obj
+        expected = 272
+        actual = len(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes(self):
+        invector = ResTable_libTests.tv1_obj
+        expected = ResTable_libTests.tv1_bytes
+        actual = bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        invector = ResTable_libTests.tv1_bytes + b'\x13\x37'
+        expected = ResTable_libTests.tv1_obj, b'\x13\x37'
+        actual = ResTable_lib.from_bytes(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_entry_name(self):
+        invector = ResTable_libTests.tv1_obj.entries[0]
+        expected = 'com.lib'
+        actual = invector.name()
+
+        self.assertEqual(expected, actual)
+
+
+class DynamicRefTableTests(unittest.TestCase):
+
+    def table():
+        table = DynamicRefTable(0x7f)
+        table.load(ResTable_libTests.tv1_obj)
+        table.add_mapping('com.lib', 0x05)
+        return table
+
+    def test_app_ids_are_absolute(self):
+        invector = DynamicRefTableTests.table()
+        expected = 0x7f010002
+        actual = invector.lookup_resource_id(0x7f010002)
+
+        self.assertEqual(expected, actual)
+
+    def test_library_id_is_remapped(self):
+        invector = DynamicRefTableTests.table()
+        expected = 0x05010002
+        actual = invector.lookup_resource_id(0x02010002)
+
+        self.assertEqual(expected, actual)
+
+    def test_local_reference_gets_own_id(self):
+        invector = DynamicRefTable(0x30)
+        expected = 0x30010002
+        actual = invector.lookup_resource_id(0x00010002)
+
+        self.assertEqual(expected, actual)
+
+    def test_app_as_lib(self):
+        invector = DynamicRefTable(0x30, appAsLib=True)
+        expected = 0x30010002
+        actual = invector.lookup_resource_id(0x7f010002)
+
+        self.assertEqual(expected, actual)
+
+    def test_unknown_package(self):
+        invector = DynamicRefTableTests.table()
+        with self.assertRaises(UnknownPackageException) as cm:
+            invector.lookup_resource_id(0x03010002)
+
+        expected = 'no runtime id for package 3'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
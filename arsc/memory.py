@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+## \file memory.py
+# \brief Estimating memory retained by parts of a table
+# \details Sizes are structural estimates: sys.getsizeof() of every object
+# reachable from a part, each object counted once, in the part that reaches
+# it first. Classes, functions, modules and enum members are shared by all
+# tables and are not counted.
+import array
+import enum
+import sys
+import types
+import unittest
+
+# objects not owned by any table
+_SHARED = (type, types.ModuleType, types.FunctionType,
+        types.BuiltinFunctionType, types.MethodType, enum.Enum)
+
+# private attributes, that are not caches: those of Tracked, owner of lists
+# of string pool and change counter of table
+_TRACKING = ('_source', '_dirty', '_snapshot', '_owner', '_changes')
+
+## Returns estimated size of objects reachable from ROOTS, in bytes
+# \details Objects with id in SEEN are skipped and ids of visited ones are
+# added to it. Underlying objects of met memoryviews are put to BUFFERS,
+# keyed by id, instead of being visited.
+def _sizeof(roots, seen, buffers):
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, _SHARED):
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, array.array)):
+            continue
+        if isinstance(obj, memoryview):
+            if obj.obj is not None:
+                buffers[id(obj.obj)] = obj.obj
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+            continue
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+            continue
+        attributes = getattr(obj, '__dict__', None)
+        if attributes is not None:
+            stack.append(attributes)
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return total
+
+## Returns dictionary of private attributes of OBJ, that are caches
+def _caches(obj):
+    return {name: value for name, value in vars(obj).items()
+            if name.startswith('_') and name not in _TRACKING}
+
+## Returns memory retained by TABLE, attributed to its parts
+# \details Result is dictionary with estimated sizes in bytes:
+#
+#   * 'header' - the table object and its header
+#   * 'values' - value string pool
+#   * 'configs' - pool of interned configurations
+#   * 'packages' - list with dictionary for every package: its 'id', 'name',
+#     'header' (package object and header), 'typeStrings', 'keyStrings',
+#     'typeSpecs' and 'types' (all such chunks together) and 'library'
+#   * 'caches' - dictionary of indexes and caches kept by the table and its
+#     chunks (eg. resolver, qualifier index or string index of a pool), keyed
+#     by path of their attribute, like '_resolver' or 'values._index'
+#   * 'source' - buffers, that parsed chunks keep views of, ie. the
+#     serialized table (mapped files count with their length)
+#   * 'total' - sum of all the above
+#
+# Structure is measured before caches, so chunks and strings that caches
+# refer to are attributed to the structure.
+def memory_report(table):
+    seen = set()
+    buffers = {}
+    caches = {}
+
+    def chunk(obj, path):
+        # caches are measured last, hide them from the structure
+        for name, value in _caches(obj).items():
+            caches['{}{}'.format(path, name)] = value
+            seen.add(id(value))
+        seen.add(id(obj))
+        return sys.getsizeof(obj) + _sizeof([vars(obj)], seen, buffers)
+
+    def chunks(objs, path):
+        return sum(chunk(obj, path) for obj in objs)
+
+    # packages are measured one by one below, the list itself belongs to
+    # the table
+    seen.add(id(table.packages))
+    report = {'header': sys.getsizeof(table.packages)}
+    report['values'] = chunk(table.values, 'values.')
+    report['configs'] = _sizeof([table.configs], seen, buffers)
+    report['packages'] = []
+    for i, pkg in enumerate(table.packages):
+        path = 'packages[{}].'.format(i)
+        specs = pkg.types or []
+        seen.add(id(pkg.types))
+        seen.update(id(spec) for spec in specs)
+        typeSpecs = [spec[0] for spec in specs if spec]
+        typeChunks = [typ for spec in specs if spec for typ in spec[1:]]
+        stats = {
+                'id': pkg.header.id.integer,
+                'name': pkg.header.name.decode('utf-16-le').split('\0', 1)[0],
+                'typeStrings': chunk(pkg.typeStrings, path + 'typeStrings.'),
+                'keyStrings': chunk(pkg.keyStrings, path + 'keyStrings.'),
+                'typeSpecs': chunks(typeSpecs, path + 'types.') +
+                    (0 if pkg.types is None else sys.getsizeof(pkg.types)) +
+                    sum(sys.getsizeof(spec) for spec in specs),
+                'types': chunks(typeChunks, path + 'types.'),
+                'library': 0 if pkg.library is None else
+                    chunk(pkg.library, path + 'library.'),
+                }
+        # what is left is the package object with its header
+        stats['header'] = chunk(pkg, path)
+        report['packages'].append(stats)
+    report['header'] += chunk(table, '')
+
+    for name in caches:
+        seen.discard(id(caches[name]))
+    report['caches'] = {name: _sizeof([value], seen, buffers)
+            for name, value in caches.items()}
+
+    report['source'] = 0
+    for buffer in buffers.values():
+        if id(buffer) in seen:
+            continue
+        seen.add(id(buffer))
+        try:
+            size = memoryview(buffer).nbytes
+        except (TypeError, ValueError):
+            continue
+        if isinstance(buffer, (bytes, bytearray)):
+            size = sys.getsizeof(buffer)
+        report['source'] += size
+
+    report['total'] = report['header'] + report['values'] + \
+            report['configs'] + report['source'] + \
+            sum(report['caches'].values()) + \
+            sum(sum(v for k, v in stats.items() if k not in ('id', 'name'))
+                for stats in report['packages'])
+    return report
+
+
+class MemoryReportTests(unittest.TestCase):
+
+    def tv1_bytes(count=2):
+        from arsc.merge import MergeTests
+        return MergeTests.sample(default={'k{}'.format(i): 'v{}'.format(i)
+            for i in range(count)}, de={'k0': 'z'})
+
+    def tv1_obj(count=2):
+        from arsc.arsc import ResTable
+        table, _ = ResTable.from_bytes(MemoryReportTests.tv1_bytes(count))
+        return table
+
+    def test_report(self):
+        invector = memory_report(MemoryReportTests.tv1_obj())
+        pkg = invector['packages'][0]
+        expected = (0x7f, 't', {}, True, True)
+        actual = (pkg['id'], pkg['name'], invector['caches'],
+                all(pkg[k] > 0 for k in ('header', 'typeStrings',
+                    'keyStrings', 'typeSpecs', 'types')),
+                invector['values'] > 0 and invector['configs'] > 0)
+
+        self.assertEqual(expected, actual)
+
+    def test_total(self):
+        invector = memory_report(MemoryReportTests.tv1_obj())
+        expected = invector['total']
+        actual = invector['header'] + invector['values'] + \
+                invector['configs'] + invector['source'] + \
+                sum(invector['packages'][0][k] for k in ('header',
+                    'typeStrings', 'keyStrings', 'typeSpecs', 'types',
+                    'library'))
+
+        self.assertEqual(expected, actual)
+
+    def test_source(self):
+        b = MemoryReportTests.tv1_bytes()
+        from arsc.arsc import ResTable
+        table, _ = ResTable.from_bytes(b)
+        expected = sys.getsizeof(b)
+        actual = memory_report(table)['source']
+
+        self.assertEqual(expected, actual)
+
+    def test_types_grow_with_entries(self):
+        small = memory_report(MemoryReportTests.tv1_obj(2))['packages'][0]
+        large = memory_report(MemoryReportTests.tv1_obj(200))['packages'][0]
+        expected = (True, True)
+        actual = (large['types'] > small['types'],
+                large['keyStrings'] > small['keyStrings'])
+
+        self.assertEqual(expected, actual)
+
+    def test_caches(self):
+        table = MemoryReportTests.tv1_obj()
+        list(table.query(locale='de'))
+        table.values.index('v1')
+        invector = memory_report(table)
+        expected = (['_qualifierIndex', 'values._index'], True,
+                invector['total'])
+        actual = (sorted(invector['caches']),
+                all(v > 0 for v in invector['caches'].values()),
+                memory_report(table)['total'])
+
+        self.assertEqual(expected, actual)
+
+    def test_table_method(self):
+        table = MemoryReportTests.tv1_obj()
+        expected = memory_report(table)
+        actual = table.memory_report()
+
+        self.assertEqual(expected, actual)
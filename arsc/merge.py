@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+## \file merge.py
+# \brief Overlaying of multiple ResTables
+import copy
+import heapq
+import itertools
+import struct
+import unittest
+from arsc.type.uint32 import uint32
+from arsc.chunk import ResChunk_header
+from arsc.types import ResourceType
+from arsc.table import ResTable_header
+from arsc.arsc import ResTable
+from arsc.package import ResTable_package
+from arsc.package import ResTable_package_header
+from arsc.stringpool import ResStringPool
+from arsc.stringpool import ResStringPool_header
+from arsc.tabletype import ResTable_typeSpec
+from arsc.tabletype import ResTable_typeSpec_header
+from arsc.tabletype import ResTable_type
+from arsc.tabletype import ResTable_type_header
+from arsc.config import ResTable_config
+from arsc.entry import ResTable_entry
+from arsc.entry import Res_value
+from arsc.library import ResTable_lib
+from arsc.library import ResTable_lib_header
+from arsc.exceptions import WrongTypeException
+
+## Returns POOL extended with strings of OTHER it lacks and index map
+# \details Map translates indices of OTHER to indices of returned pool. It is
+# None, if every string keeps its index, so data referencing OTHER can be
+# used as is.
+def _merge_pool(pool, other):
+    count = len(pool.strings)
+    missing = []
+    added = {}
+    mapping = []
+    for i in range(len(other.strings)):
+        s = other.string(i)
+        index = pool.index(s)
+        if index is None:
+            index = added.get(s)
+            if index is None:
+                index = count + len(missing)
+                added[s] = index
+                missing.append(s)
+        mapping.append(index)
+
+    if len(missing) > 0:
+        pool = pool.extended(missing)
+    if all(i == m for i, m in enumerate(mapping)):
+        mapping = None
+    return pool, mapping
+
+## Returns copy of chunk, that can be put into other table
+# \details Entry data are shared with original chunk.
+def _reuse(chunk):
+    chunk = copy.copy(chunk)
+    chunk.header = copy.copy(chunk.header)
+    if isinstance(chunk, ResTable_type):
+        chunk.header.configId = None
+    return chunk
+
+## Returns serialized entry with key and string values translated
+def _remap_entry(entry, keys, values):
+    if keys is not None:
+        entry.key = uint32(keys[entry.key.integer], little=True)
+    if values is not None:
+        for value in entry.values():
+            if value.dataType.integer == Res_value.TYPE_STRING:
+                value.data = uint32(values[value.data.integer], little=True)
+    return bytes(entry)
+
+## Returns single ResTable_typeSpec for all SPECS of the same type
+def _merge_spec(specs, entryCount):
+    flags = [0] * entryCount
+    for spec in specs:
+        count = spec.header.entryCount.integer
+        for i, f in enumerate(struct.unpack_from('<{}I'.format(count),
+                bytes(spec.configs))):
+            flags[i] |= f
+
+    header = specs[-1].header
+    configs = struct.pack('<{}I'.format(entryCount), *flags)
+    headerSize = header.header.headerSize.integer
+    return ResTable_typeSpec(ResTable_typeSpec_header(ResChunk_header(
+        ResourceType.RES_TABLE_TYPE_SPEC_TYPE, headerSize,
+        headerSize + len(configs)), header.id, header.res0, header.res1,
+        entryCount), configs)
+
+## Returns single ResTable_type with entries of all CHUNKS of one config
+# \details CHUNKS is list of (source, ResTable_type) pairs, ordered from
+# lowest priority. Only entries that win are decoded.
+def _merge_type(chunks, entryCount, keyMaps, valueMaps):
+    winners = [None] * entryCount
+    for source, typ in chunks:
+        offsets = typ.entry_offsets()
+        for i, offset in enumerate(offsets[:entryCount]):
+            if offset != ResTable_type.NO_ENTRY:
+                winners[i] = (source, typ, offsets)
+
+    entries = []
+    for i, winner in enumerate(winners):
+        if winner is None:
+            entries.append(None)
+            continue
+        source, typ, offsets = winner
+        entries.append(_remap_entry(typ.entry(i, offsets), keyMaps[source],
+            valueMaps[source]))
+    while len(entries) > 0 and entries[-1] is None:
+        entries.pop()
+
+    merged = ResTable_type.from_entries(chunks[-1][1].header, entries)
+    merged.header.configId = None
+    return merged
+
+## Returns ResTable_library with libraries referenced by any of LIBRARIES
+def _merge_library(libraries):
+    libraries = [lib for lib in libraries if lib is not None]
+    if len(libraries) == 0:
+        return None
+    if len(libraries) == 1:
+        return libraries[0]
+
+    entries = {}
+    for lib in libraries:
+        for entry in lib.entries:
+            entries.setdefault(entry.packageName, entry)
+    entries = list(entries.values())
+    header = ResTable_lib_header(ResChunk_header(
+        ResourceType.RES_TABLE_LIBRARY_TYPE, ResTable_lib_header.len,
+        ResTable_lib_header.len + len(entries) * len(entries[0])),
+        len(entries))
+    return ResTable_lib(header, entries)
+
+## Returns size of chunk as stated in its header
+def _chunk_size(chunk):
+    return chunk.header.header.size.integer
+
+## Creates package from its parts, computing header offsets and size
+def package(header, typeStrings, keyStrings, types, library=None):
+    headerSize = header.header.headerSize.integer
+    keyStart = headerSize + _chunk_size(typeStrings)
+    size = keyStart + _chunk_size(keyStrings)
+    for spec in types:
+        for chunk in spec:
+            size += _chunk_size(chunk)
+    if library is not None:
+        size += _chunk_size(library)
+
+    header = ResTable_package_header(ResChunk_header(
+        ResourceType.RES_TABLE_PACKAGE_TYPE, headerSize, size), header.id,
+        header.name, headerSize, header.lastPublicType, keyStart,
+        header.lastPublicKey)
+    return ResTable_package(header, typeStrings, keyStrings, types, library)
+
+## Creates table from value string pool and list of packages
+def table(values, packages):
+    size = ResTable_header.len + _chunk_size(values)
+    for pkg in packages:
+        size += pkg.header.header.size.integer
+    header = ResTable_header(ResChunk_header(ResourceType.RES_TABLE_TYPE,
+        ResTable_header.len, size), len(packages))
+    return ResTable(header, values, packages)
+
+## Merges packages of the same id from multiple tables
+# \details SOURCES is list of (source, ResTable_package) pairs ordered from
+# lowest priority, VALUEMAPS is list of value index maps of every source.
+def _merge_package(sources, valueMaps):
+    typeStrings = sources[0][1].typeStrings
+    keyStrings = sources[0][1].keyStrings
+    keyMaps = [None] * len(valueMaps)
+    for source, pkg in sources[1:]:
+        count = len(typeStrings.strings)
+        if len(pkg.typeStrings.strings) > count:
+            # type names are indexed by type id, so only append new ids
+            typeStrings = typeStrings.extended([pkg.typeStrings.string(i)
+                for i in range(count, len(pkg.typeStrings.strings))])
+        keyStrings, keyMaps[source] = _merge_pool(keyStrings, pkg.keyStrings)
+
+    def specs(source, pkg):
+        ret = [(spec[0].header.id.integer, source, spec)
+                for spec in pkg.types or [] if spec]
+        ret.sort(key=lambda t: t[0])
+        return ret
+
+    types = []
+    for typeId, group in itertools.groupby(heapq.merge(
+            *[specs(source, pkg) for source, pkg in sources],
+            key=lambda t: t[0]), key=lambda t: t[0]):
+        group = list(group)
+        entryCount = max(spec[0].header.entryCount.integer
+                for _, _, spec in group)
+        if len(group) == 1:
+            merged = [_reuse(group[0][2][0])]
+        else:
+            merged = [_merge_spec([spec[0] for _, _, spec in group],
+                entryCount)]
+
+        def chunks(source, spec):
+            ret = [(typ.header.config.key, source, typ) for typ in spec[1:]]
+            ret.sort(key=lambda t: t[0])
+            return ret
+
+        for configKey, chunkGroup in itertools.groupby(heapq.merge(
+                *[chunks(source, spec) for _, source, spec in group],
+                key=lambda t: t[0]), key=lambda t: t[0]):
+            chunkGroup = [(source, typ) for _, source, typ in chunkGroup]
+            source, typ = chunkGroup[0]
+            if len(chunkGroup) == 1 and keyMaps[source] is None and \
+                    valueMaps[source] is None:
+                merged.append(_reuse(typ))
+            else:
+                merged.append(_merge_type(chunkGroup, entryCount, keyMaps,
+                    valueMaps))
+        types.append(merged)
+
+    return package(sources[-1][1].header, typeStrings, keyStrings, types,
+            _merge_library([pkg.library for _, pkg in sources]))
+
+## Overlays OVERLAYS over BASE table and returns the result as new ResTable
+# \details Resources are matched by resource id and configuration; value
+# from the last table defining it wins. Chunks of every type are streamed
+# ordered by configuration from all tables at once, so each configuration
+# is handled exactly once. Chunks only one table defines are reused without
+# decoding their entries, other ones are rebuilt with entries translated to
+# merged key and value string pools. Input tables are not modified.
+def merge(base, *overlays):
+    tables = [base] + list(overlays)
+    for i, tab in enumerate(tables):
+        if not isinstance(tab, ResTable):
+            raise WrongTypeException('tables[{}]'.format(i), ResTable)
+
+    values = base.values
+    valueMaps = [None]
+    for tab in overlays:
+        values, mapping = _merge_pool(values, tab.values)
+        valueMaps.append(mapping)
+
+    packages = {}
+    for source, tab in enumerate(tables):
+        for pkg in tab.packages:
+            packages.setdefault(pkg.header.id.integer, []).append(
+                    (source, pkg))
+
+    merged = [_merge_package(sources, valueMaps)
+            for sources in packages.values()]
+
+    return table(values, merged)
+
+
+class MergeTests(unittest.TestCase):
+
+    Flags = ResStringPool_header.Flags
+
+    def pool(strings):
+        return ResStringPool(ResStringPool_header(
+            flags=MergeTests.Flags.UTF8_FLAG)).extended(strings)
+
+    ## Creates table with single type 'string' of entries given as dictionary
+    # of config to dictionary of key to value string
+    def table(chunks, keys=None):
+        if keys is None:
+            keys = sorted({k for e in chunks.values() for k in e})
+        strings = sorted({v for e in chunks.values() for v in e.values()})
+        values = MergeTests.pool(strings)
+
+        types = [ResTable_typeSpec(ResTable_typeSpec_header(ResChunk_header(
+            ResourceType.RES_TABLE_TYPE_SPEC_TYPE, 16, 16 + 4 * len(keys)),
+            1, 0, 0, len(keys)), bytes(4 * len(keys)))]
+        for config, entries in chunks.items():
+            raws = []
+            for key in keys:
+                if key not in entries:
+                    raws.append(None)
+                    continue
+                raws.append(bytes(ResTable_entry(8, 0, keys.index(key),
+                    Res_value(8, 0, Res_value.TYPE_STRING,
+                        strings.index(entries[key])))))
+            types.append(ResTable_type.from_entries(ResTable_type_header(
+                id=1, config=config), raws))
+
+        pkg = package(ResTable_package_header(id=0x7f,
+            name=b't\0\0\0'), MergeTests.pool(['string']),
+            MergeTests.pool(keys), [types])
+        return table(values, [pkg])
+
+    ## Returns bytes of small table shared by tests of many modules
+    # \details DEFAULT are entries of default configuration, LOCALES are
+    # entries of configurations of given languages, by default 'de'
+    # overriding 'a'. All configurations are SIZE bytes long: this library
+    # creates 0x30 by default, while aapt2 writes ResTable_config.len (0x40).
+    def sample(size=0x30, default=None, **locales):
+        if default is None:
+            default = {'a': 'x', 'b': 'y'}
+        if not locales:
+            locales = {'de': {'a': 'z'}}
+        chunks = {ResTable_config(size): default}
+        for language, entries in locales.items():
+            chunks[ResTable_config(size,
+                locale=ResTable_config.Locale(language))] = entries
+        return bytes(MergeTests.table(chunks))
+
+    ## Returns dictionary of config to dictionary of key to value string
+    def contents(tab):
+        ret = {}
+        pkg = tab.packages[0]
+        for typ in pkg.types[0][1:]:
+            entries = {}
+            for entry in typ.entries():
+                if entry is not None:
+                    entries[pkg.keyStrings.string(entry.key.integer)] = \
+                            tab.values.string(entry.value.data.integer)
+            ret[typ.header.config.locale_tag()] = entries
+        return ret
+
+    default = ResTable_config()
+    de = ResTable_config(locale=ResTable_config.Locale('de'))
+    fr = ResTable_config(locale=ResTable_config.Locale('fr'))
+
+    def test_sample(self):
+        from arsc.scan import scan
+        for size in (0x30, ResTable_config.len):
+            b = MergeTests.sample(size)
+            invector, _ = ResTable.from_bytes(b)
+            expected = ({'': {'a': 'x', 'b': 'y'}, 'de': {'a': 'z'}},
+                    [size, size], len(b))
+            actual = (MergeTests.contents(invector),
+                    [typ.header.config.size.integer
+                        for typ in invector.packages[0].types[0][1:]],
+                    scan(b)[0].end())
+
+            self.assertEqual(expected, actual)
+
+    def test_table_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = merge(MergeTests.table({}), b'\x13\x37')
+
+        expected = 'tables[1] must be of type ResTable'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_without_overlays_is_same(self):
+        invector = MergeTests.table({MergeTests.default: {'a': 'x'}})
+        expected = bytes(invector)
+        actual = bytes(merge(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_overlay_wins(self):
+        base = MergeTests.table({
+            MergeTests.default: {'app_name': 'Base', 'title': 'Title'},
+            MergeTests.de: {'app_name': 'Basis'}})
+        overlay = MergeTests.table({
+            MergeTests.default: {'app_name': 'Overlay'},
+            MergeTests.fr: {'title': 'Titre'}}, keys=['app_name', 'title'])
+        expected = {
+                '': {'app_name': 'Overlay', 'title': 'Title'},
+                'de': {'app_name': 'Basis'},
+                'fr': {'title': 'Titre'}}
+        actual = MergeTests.contents(merge(base, overlay))
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_remaps_strings(self):
+        base = MergeTests.table({MergeTests.default: {'b': 'y', 'c': 'z'}})
+        overlay = MergeTests.table({MergeTests.default: {'a': 'new'},
+            MergeTests.de: {'a': 'neu'}}, keys=['x', 'y', 'a'])
+        expected = {
+                '': {'a': 'new', 'b': 'y', 'c': 'z'},
+                'de': {'a': 'neu'}}
+        actual = MergeTests.contents(merge(base, overlay))
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_last_overlay_wins(self):
+        base = MergeTests.table({MergeTests.default: {'a': 'x'}})
+        first = MergeTests.table({MergeTests.default: {'a': 'y'}})
+        second = MergeTests.table({MergeTests.default: {'a': 'z'}})
+        expected = {'': {'a': 'z'}}
+        actual = MergeTests.contents(merge(base, first, second))
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_reuses_unchanged_chunks(self):
+        base = MergeTests.table({MergeTests.default: {'a': 'x'},
+            MergeTests.de: {'a': 'y'}})
+        overlay = MergeTests.table({MergeTests.default: {'a': 'z'}})
+        merged = merge(base, overlay)
+        expected = base.packages[0].types[0][2].rest
+        actual = merged.packages[0].types[0][2].rest
+
+        self.assertIs(expected, actual)
+
+    def test_merge_does_not_modify_input(self):
+        base = MergeTests.table({MergeTests.default: {'a': 'x'},
+            MergeTests.de: {'a': 'y'}})
+        overlay = MergeTests.table({MergeTests.fr: {'a': 'z'}})
+        chunks = base.packages[0].types[0][1:]
+        expected = [typ.header.configId for typ in chunks]
+        merge(overlay, base)
+        actual = [typ.header.configId for typ in chunks]
+
+        self.assertEqual(expected, actual)
+
+    def test_merge_serializes(self):
+        base = MergeTests.table({MergeTests.default: {'b': 'y'}})
+        overlay = MergeTests.table({MergeTests.fr: {'a': 'x'}})
+        merged = merge(base, overlay)
+        expected = bytes(merged)
+        actual = bytes(ResTable.from_bytes(expected)[0])
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(len(expected), merged.header.header.size.integer)
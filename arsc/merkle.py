@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+## \file merkle.py
+# \brief Hash trees of chunks for quick comparison of tables
+import hashlib
+import struct
+import unittest
+from arsc.types import ResourceType
+from arsc.scan import scan
+
+## \class MerkleNode
+# \brief Hash of a chunk and of all chunks contained in it
+# \details Leaf chunks are hashed from their raw bytes. Digest of a container
+# covers its header and digests of its children, so two subtrees with equal
+# digests are equal byte for byte and never have to be compared further.
+class MerkleNode:
+
+    ## Size of digests in bytes
+    DIGEST_SIZE = 16
+
+    def __init__(self, key, digest, chunk=None, children=None):
+        if children is None:
+            children = {}
+
+        ## Identifies chunk among its siblings, eg. ('package', 0x7f) or
+        #  ('type', 7, config bytes)
+        self.key = key
+        ## Digest of the chunk, as bytes
+        self.digest = digest
+        ## scan.ChunkRange the node was computed from
+        self.chunk = chunk
+        ## Dictionary of key to MerkleNode of contained chunks, in buffer order
+        self.children = children
+
+    def __str__(self):
+        return '{{key={key}, digest={digest}, children=[{children}]}}'.format(
+                key=self.key, digest=self.digest.hex(),
+                children=', '.join(str(c) for c in self.children.values()))
+
+    def __repr__(self):
+        return '{c}({key}, {digest}, {chunk}, {children})'.format(
+                c=type(self).__name__, key=repr(self.key),
+                digest=repr(self.digest), chunk=repr(self.chunk),
+                children=repr(self.children))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and self.digest == rhs.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    ## Returns digest as hexadecimal string
+    def hexdigest(self):
+        return self.digest.hex()
+
+## Returns key identifying CHUNK of buffer B among its siblings
+# \details COUNTS holds number of already seen chunks of every key, so
+# repeated chunks (eg. two pools of a package) get distinct keys.
+def _key(b, chunk, counts):
+    if chunk.type == ResourceType.RES_TABLE_PACKAGE_TYPE:
+        key = ('package', struct.unpack_from('<I', b, chunk.offset + 8)[0])
+    elif chunk.type == ResourceType.RES_TABLE_TYPE_SPEC_TYPE:
+        key = ('typeSpec', b[chunk.offset + 8])
+    elif chunk.type == ResourceType.RES_TABLE_TYPE_TYPE:
+        key = ('type', b[chunk.offset + 8], bytes(b[chunk.offset + 20:
+            chunk.offset + chunk.headerSize]))
+    elif chunk.type == ResourceType.RES_STRING_POOL_TYPE:
+        key = ('stringPool',)
+    elif chunk.type == ResourceType.RES_TABLE_LIBRARY_TYPE:
+        key = ('library',)
+    else:
+        key = (chunk.type,)
+
+    count = counts.get(key, 0)
+    counts[key] = count + 1
+    if count > 0 or key[0] == 'stringPool':
+        key += (count,)
+    return key
+
+## Returns copy of cached NODE for CHUNK, which may have moved in buffer
+# \details Digests are kept, only keys and ranges are replaced, so nothing is
+# hashed.
+def _moved(node, chunk, key):
+    children = {}
+    for (k, child), c in zip(node.children.items(), chunk.children):
+        children[k] = _moved(child, c, k)
+    return MerkleNode(key, node.digest, chunk, children)
+
+## Returns MerkleNode of CHUNK of buffer B
+# \details If OBJ, parsed object serialized as CHUNK, is given, node is kept
+# in it while it stays clean (see tracked.Tracked) and reused by later calls,
+# so only changed chunks and their containers are hashed again. Contained
+# chunks are matched with objects returned by chunks() of OBJ.
+def _node(b, chunk, key, obj=None):
+    clean = obj is not None and not obj.is_dirty()
+    if clean and obj.__dict__.get('_merkle') is not None:
+        return _moved(obj._merkle, chunk, key)
+
+    if len(chunk.children) == 0:
+        digest = hashlib.blake2b(chunk.data(b),
+                digest_size=MerkleNode.DIGEST_SIZE).digest()
+        node = MerkleNode(key, digest, chunk)
+    else:
+        objs = getattr(obj, 'chunks', None)
+        objs = None if objs is None else objs()
+        if objs is None or len(objs) != len(chunk.children):
+            objs = [None] * len(chunk.children)
+        h = hashlib.blake2b(chunk.header(b),
+                digest_size=MerkleNode.DIGEST_SIZE)
+        counts = {}
+        children = {}
+        for child, childObj in zip(chunk.children, objs):
+            node = _node(b, child, _key(b, child, counts), childObj)
+            h.update(node.digest)
+            children[node.key] = node
+        node = MerkleNode(key, h.digest(), chunk, children)
+    if clean:
+        object.__setattr__(obj, '_merkle', node)
+    return node
+
+## Returns MerkleNode of the whole table (or other chunk) stored in B
+# \details OBJ is optional object B was serialized from, see _node().
+def tree(b, obj=None):
+    chunks = scan(b)
+    if len(chunks) == 1:
+        return _node(b, chunks[0], ('table',), obj)
+
+    # more top level chunks, hash them as one unnamed container
+    h = hashlib.blake2b(digest_size=MerkleNode.DIGEST_SIZE)
+    counts = {}
+    children = {}
+    for child in chunks:
+        node = _node(b, child, _key(b, child, counts))
+        h.update(node.digest)
+        children[node.key] = node
+    return MerkleNode((), h.digest(), None, children)
+
+## Returns list of differences between trees OLD and NEW
+# \details Every difference is a pair of path (tuple of keys from the root)
+# and one of 'added', 'removed' or 'changed'. Only subtrees with different
+# digests are visited, so cost depends on size of the change, not of the
+# table. Container itself is reported as changed only when all of its
+# children are equal, ie. when only its header differs.
+def diff(old, new, path=()):
+    if old.digest == new.digest:
+        return []
+    if len(old.children) == 0 or len(new.children) == 0:
+        return [(path, 'changed')]
+
+    ret = []
+    for key, node in old.children.items():
+        other = new.children.get(key)
+        if other is None:
+            ret.append((path + (key,), 'removed'))
+        else:
+            ret += diff(node, other, path + (key,))
+    for key in new.children:
+        if key not in old.children:
+            ret.append((path + (key,), 'added'))
+    if len(ret) == 0:
+        # all children equal, so header itself differs
+        ret.append((path, 'changed'))
+    return ret
+
+
+class MerkleTests(unittest.TestCase):
+
+    def tables():
+        from arsc.arsc import ResTableTests
+        # fixture declares 2 bytes more than it has
+        base = bytearray(ResTableTests.tv1_bytes)
+        struct.pack_into('<I', base, 4, len(base))
+        base = bytes(base)
+        # same table with last entry offset of 'de' chunk changed
+        changed = base[:-8] + b'\x09' + base[-7:]
+        return base, changed
+
+    def test_tree_is_deterministic(self):
+        base, _ = MerkleTests.tables()
+        expected = tree(base).digest
+        actual = tree(bytes(base)).digest
+
+        self.assertEqual(expected, actual)
+
+    def test_tree_keys(self):
+        base, _ = MerkleTests.tables()
+        invector = tree(base)
+        expected = [('stringPool', 0), ('package', 0x7f)]
+        actual = list(invector.children)
+
+        self.assertEqual(expected, actual)
+
+    def test_package_keys(self):
+        base, _ = MerkleTests.tables()
+        invector = tree(base).children[('package', 0x7f)]
+        expected = [('stringPool', 0), ('stringPool', 1), ('typeSpec', 7),
+                ('type', 7), ('type', 7)]
+        actual = [k[:2] for k in invector.children]
+
+        self.assertEqual(expected, actual)
+
+    def test_diff_equal(self):
+        base, _ = MerkleTests.tables()
+        expected = []
+        actual = diff(tree(base), tree(base))
+
+        self.assertEqual(expected, actual)
+
+    def test_diff_changed_chunk(self):
+        base, changed = MerkleTests.tables()
+        expected = [((('package', 0x7f), ('type', 7, b'0' + bytes(7) + b'de' +
+            bytes(0x26))), 'changed')]
+        actual = diff(tree(base), tree(changed))
+
+        self.assertEqual(expected, actual)
+
+    def test_diff_removed_chunk(self):
+        base, _ = MerkleTests.tables()
+        # drop 'de' chunk and fix sizes of package and table
+        removed = bytearray(base[:-116])
+        struct.pack_into('<I', removed, 4, len(removed))
+        struct.pack_into('<I', removed, 0x2c, len(removed) - 0x28)
+        expected = [((('package', 0x7f), ('type', 7, b'0' + bytes(7) + b'de' +
+            bytes(0x26))), 'removed')]
+        actual = diff(tree(base), tree(bytes(removed)))
+
+        self.assertEqual(expected, actual)
+
+    def test_cached_tree(self):
+        from arsc.arsc import ResTable
+        base, changed = MerkleTests.tables()
+        table, _ = ResTable.from_bytes(base)
+        first = table.merkle()
+        second = table.merkle()
+        typ = table.packages[0].types[0][-1]
+        typ.rest = typ.rest[:-8] + b'\x09' + typ.rest[-7:]
+        expected = (tree(base), True, tree(changed), True)
+        actual = (first, second is first, table.merkle(),
+                table.merkle().children[('stringPool', 0)].digest is
+                    first.children[('stringPool', 0)].digest)
+
+        self.assertEqual(expected, actual)
@@ -11,7 +11,10 @@ from arsc.tabletype import ResTable_typeSpec
 from arsc.tabletype import ResTable_typeSpec_header
 from arsc.tabletype import ResTable_type
 from arsc.tabletype import ResTable_type_header
+from arsc.library import ResTable_lib
 from arsc.types import ResourceType
+from arsc.tracked import Tracked
+from arsc.scan import scan
 from arsc.external.configuration import AConfiguration
 from arsc.exceptions import WrongTypeException
 from arsc.exceptions import ChunkHeaderWrongTypeException
@@ -129,7 +132,7 @@ class ResTable_package_header:
     def from_bytes(b):
         header, b = ResChunk_header.from_bytes(b)
         id, b = uint32.from_bytes(b, little=True)
-        name, b = b[:256], b[256:]
+        name, b = bytes(b[:256]), b[256:]
         typeStrings, b = uint32.from_bytes(b, little=True)
         lastPublicType, b = uint32.from_bytes(b, little=True)
         keyStrings, b = uint32.from_bytes(b, little=True)
@@ -144,10 +147,10 @@ class ResTable_package_header:
 #  \details Contains ResTable_package_header as a header, then followed by two
 #  ResStringPool objects and interlaced ResTable_typeSpec and multiple
 #  ResTable_type objects
-class ResTable_package:
+class ResTable_package(Tracked):
 
     def __init__(self, header=None, typeStrings=None, keyStrings=None,
-            types=None):
+            types=None, library=None):
 
         if header is None:
             header = ResTable_package_header()
@@ -176,42 +179,125 @@ class ResTable_package:
         # TODO: implement
         self.types = types
 
+        if library is not None and not isinstance(library, ResTable_lib):
+            raise WrongTypeException('library', ResTable_lib)
+        ## Instance of library.ResTable_lib listing shared libraries this
+        #  package references, None if there is no such chunk. Always
+        #  serialized after all types.
+        self.library = library
+
     def __str__(self):
+        library = ''
+        if self.library is not None:
+            library = ', library={}'.format(str(self.library))
         return '{{header={header}, typeStrings={typeStrings}, '\
-                'keyStrings={keyStrings}, types={types}}}'.format(
+                'keyStrings={keyStrings}, types={types}{library}}}'.format(
                         header=str(self.header),
                         typeStrings=str(self.typeStrings),
-                        keyStrings=str(self.keyStrings), types=str(self.types))
+                        keyStrings=str(self.keyStrings), types=str(self.types),
+                        library=library)
 
     def __repr__(self):
+        library = ''
+        if self.library is not None:
+            library = ', {}'.format(repr(self.library))
         return '{c}({header}, {typeStrings}, {keyStrings}, '\
-                '{types})'.format(c=type(self).__name__,
+                '{types}{library})'.format(c=type(self).__name__,
                 header=repr(self.header), typeStrings=repr(self.typeStrings),
-                keyStrings=repr(self.keyStrings), types=repr(self.types))
+                keyStrings=repr(self.keyStrings), types=repr(self.types),
+                library=library)
 
     def __eq__(self, rhs):
         return type(self) == type(rhs) and \
                 self.header == rhs.header and \
                 self.typeStrings == rhs.typeStrings and \
                 self.keyStrings == rhs.keyStrings and \
-                self.types == rhs.types
+                self.types == rhs.types and \
+                self.library == rhs.library
 
     def __len__(self):
         return len(bytes(self))
 
     def __bytes__(self):
-        header = bytes(self.header)
-        # FIXME: determine position and order of types and keys using header
-        typeStrings = bytes(self.typeStrings)
-        keyStrings = bytes(self.keyStrings)
-        types = bytes()
-        for spec in self.types:
-            for obj in spec:
-                types += bytes(obj)
-
-        return header + typeStrings + keyStrings + types
+        return b''.join(self.parts())
 
-    def from_bytes(b, little=True):
+    ## Returns list of chunks contained in the package, in serialization order
+    def chunks(self):
+        # FIXME: determine position and order of types and keys using header
+        ret = [self.typeStrings, self.keyStrings]
+        for spec in self.types or []:
+            ret += spec or []
+        if self.library is not None:
+            ret.append(self.library)
+        return ret
+
+    def snapshot(self):
+        types = None if self.types is None else tuple(
+                None if spec is None else tuple(spec) for spec in self.types)
+        return (bytes(self.header), types)
+
+    def is_dirty(self):
+        if Tracked.is_dirty(self):
+            return True
+        for chunk in self.chunks():
+            if chunk.is_dirty():
+                return True
+        return False
+
+    ## Returns list of bytes-like objects, that serialize the package
+    # \details Clean package is returned as its source. Otherwise only dirty
+    # chunks are encoded, clean ones are views of their source. If package
+    # was parsed, sizes and offsets in its header are updated first.
+    def parts(self):
+        if not self.is_dirty():
+            return [self.source()]
+
+        chunks = [chunk.buffer() for chunk in self.chunks()]
+        if self.source() is not None:
+            headerSize = self.header.header.headerSize.integer
+            self.header.typeStrings = uint32(headerSize, little=True)
+            self.header.keyStrings = uint32(headerSize + len(chunks[0]),
+                    little=True)
+            self.header.header.size = uint32(headerSize +
+                    sum(len(c) for c in chunks), little=True)
+        return [bytes(self.header)] + chunks
+
+    ## Remembers SOURCE as original bytes of the package and its chunks
+    # \details Chunks are located with scan.scan(). Chunks that cannot be
+    # matched with the source stay untracked.
+    def track(self, source):
+        Tracked.track(self, source)
+        ranges = scan(source, self.header.header.headerSize.integer)
+        pools = {}
+        types = []
+        libraries = []
+        for chunk in ranges:
+            if chunk.type == ResourceType.RES_STRING_POOL_TYPE:
+                pools[chunk.offset] = chunk
+            elif chunk.type == ResourceType.RES_TABLE_LIBRARY_TYPE:
+                libraries.append(chunk)
+            else:
+                types.append(chunk)
+
+        for pool, offset in ((self.typeStrings, self.header.typeStrings),
+                (self.keyStrings, self.header.keyStrings)):
+            chunk = pools.get(offset.integer)
+            if chunk is not None:
+                pool.track(chunk.data(source))
+
+        objs = [obj for spec in self.types or [] for obj in spec or []]
+        if len(objs) == len(types):
+            for obj, chunk in zip(objs, types):
+                if chunk.type == obj.header.header.type:
+                    obj.track(chunk.data(source))
+
+        if self.library is not None and len(libraries) == 1:
+            self.library.track(libraries[0].data(source))
+
+    ## Deserializes package from B
+    # \details If CONFIGS pool is given, configurations of all types are
+    # interned in it.
+    def from_bytes(b, little=True, configs=None):
         content = b
         header, b = ResTable_package_header.from_bytes(b)
         content_size = header.header.size.integer
@@ -227,6 +313,7 @@ class ResTable_package:
 
         types = []
         spec = None
+        library = None
         ret_b = b
         b = rest
 
@@ -242,15 +329,19 @@ class ResTable_package:
                 typeSpec, b = ResTable_typeSpec.from_bytes(b)
                 spec.append(typeSpec)
             elif hdr.type == ResourceType.RES_TABLE_TYPE_TYPE:
-                typ, b = ResTable_type.from_bytes(b)
+                typ, b = ResTable_type.from_bytes(b, configs=configs)
                 spec.append(typ)
+            elif hdr.type == ResourceType.RES_TABLE_LIBRARY_TYPE:
+                library, b = ResTable_lib.from_bytes(b)
             else:
                 raise ChunkHeaderWrongTypeException([
                     ResourceType.RES_TABLE_TYPE_SPEC_TYPE,
-                    ResourceType.RES_TABLE_TYPE_TYPE], hdr.type)
+                    ResourceType.RES_TABLE_TYPE_TYPE,
+                    ResourceType.RES_TABLE_LIBRARY_TYPE], hdr.type)
         types.append(spec)
 
-        return ResTable_package(header, typeStrings, keyStrings, types), ret_b
+        return ResTable_package(header, typeStrings, keyStrings, types,
+                library), ret_b
 
 
 class ResTable_package_headerTests(unittest.TestCase):
@@ -646,3 +737,16 @@ class ResTable_packageTests(unittest.TestCase):
         actual = ResTable_package.from_bytes(invector)
 
         self.assertEqual(expected, actual)
+
+    def test_from_bytes_with_library(self):
+        library = b'\3\2\x0c\0\x10\1\0\0\1\0\0\0' + b'\2\0\0\0' + \
+                'com.lib\0'.encode('utf-16-le') + bytes(240)
+        invector = b'\0\2\x20\1\x18\4\0\0' + \
+                ResTable_packageTests.tv1_bytes[8:] + library
+        pkg, b = ResTable_package.from_bytes(invector + b'\x13\x37')
+        expected = ('com.lib', 2, b'\x13\x37')
+        actual = (pkg.library.entries[0].name(),
+                pkg.library.entries[0].packageId.integer, b)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(invector, bytes(pkg))
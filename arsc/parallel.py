@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+## \file parallel.py
+# \brief Parsing chunks of one large table in parallel processes
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from arsc.types import ResourceType
+from arsc.scan import scan
+from arsc.arsc import ResTable
+from arsc.table import ResTable_header
+from arsc.config import ResTable_configPool
+from arsc.package import ResTable_package
+from arsc.package import ResTable_package_header
+from arsc.stringpool import ResStringPool
+from arsc.tabletype import ResTable_typeSpec
+from arsc.tabletype import ResTable_type
+from arsc.library import ResTable_lib
+from arsc.exceptions import ChunkHeaderWrongTypeException
+
+## Classes used to parse chunks of given type in workers
+_parsers = {
+        ResourceType.RES_STRING_POOL_TYPE: ResStringPool,
+        ResourceType.RES_TABLE_TYPE_SPEC_TYPE: ResTable_typeSpec,
+        ResourceType.RES_TABLE_TYPE_TYPE: ResTable_type,
+        ResourceType.RES_TABLE_LIBRARY_TYPE: ResTable_lib,
+        }
+
+## Parses chunks at RANGES of file at PATH
+# \details Runs in worker process. File is mapped into memory, so only bytes
+# of the parsed chunks are read. RANGES is list of (chunk type, offset, size).
+# Returns list of parsed chunks.
+def _parse_ranges(path, ranges):
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_ranges(buf, ranges)
+        finally:
+            buf.close()
+
+## Parses chunks at RANGES of buffer B
+# \details RANGES is list of (chunk type, offset, size), as made by
+# batches(). Returns list of parsed chunks.
+def parse_ranges(b, ranges):
+    ret = []
+    for typ, offset, size in ranges:
+        chunk, _ = _parsers[typ].from_bytes(b[offset:offset + size])
+        ret.append(chunk)
+    return ret
+
+## Finds chunks of table in buffer B, that can be parsed independently
+# \details Returns scan.ChunkRange of the table, list of ranges of its
+# packages and list of ranges of all pools, typeSpec, type and library chunks
+# in buffer order.
+def chunks(b):
+    size, = struct.unpack_from('<I', b, 4)
+    table, = scan(b, 0, size)
+    ret = [c for c in table.children
+            if c.type == ResourceType.RES_STRING_POOL_TYPE]
+    packages = [c for c in table.children
+            if c.type == ResourceType.RES_TABLE_PACKAGE_TYPE]
+    for pkg in packages:
+        ret += pkg.children
+    return table, packages, ret
+
+## Splits CHUNKS into lists of (type, offset, size) of at least SIZE bytes
+def batches(chunks, size):
+    ret = []
+    batch = []
+    total = 0
+    for chunk in chunks:
+        batch.append((chunk.type, chunk.offset, chunk.size))
+        total += chunk.size
+        if total >= size:
+            ret.append(batch)
+            batch = []
+            total = 0
+    if len(batch) > 0:
+        ret.append(batch)
+    return ret
+
+## Builds ResTable_package from its chunk range PKG of buffer B
+# \details PARSED maps offset of every child chunk to parsed object.
+def _package(b, pkg, parsed, configs):
+    header, _ = ResTable_package_header.from_bytes(bytes(
+        b[pkg.offset:pkg.offset + pkg.headerSize]))
+    typeStrings = parsed[pkg.offset + header.typeStrings.integer]
+    keyStrings = parsed[pkg.offset + header.keyStrings.integer]
+
+    types = []
+    spec = None
+    library = None
+    for chunk in pkg.children:
+        obj = parsed[chunk.offset]
+        if chunk.type == ResourceType.RES_TABLE_TYPE_SPEC_TYPE:
+            if spec is not None:
+                types.append(spec)
+            spec = [obj]
+        elif chunk.type == ResourceType.RES_TABLE_TYPE_TYPE:
+            # configurations came from different processes, intern them
+            # again, so they are shared as after ResTable.from_bytes()
+            obj.header.configId = configs.intern(obj.header.config)
+            obj.header.config = configs[obj.header.configId]
+            spec.append(obj)
+        elif chunk.type == ResourceType.RES_TABLE_LIBRARY_TYPE:
+            library = obj
+        elif chunk.type != ResourceType.RES_STRING_POOL_TYPE:
+            raise ChunkHeaderWrongTypeException([
+                ResourceType.RES_TABLE_TYPE_SPEC_TYPE,
+                ResourceType.RES_TABLE_TYPE_TYPE,
+                ResourceType.RES_TABLE_LIBRARY_TYPE], chunk.type)
+    types.append(spec)
+
+    return ResTable_package(header, typeStrings, keyStrings, types, library)
+
+## Writes B to temporary file, that workers can map into memory
+# \details File is created in /dev/shm, if available, so it stays in memory.
+# Returns tempfile.NamedTemporaryFile, that is removed when closed.
+def _share(b):
+    shared = tempfile.NamedTemporaryFile(suffix='.arsc',
+            dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    shared.write(b)
+    shared.flush()
+    return shared
+
+## Parses table from SOURCE, decoding its chunks in pool of processes
+# \details SOURCE is either path to table file or bytes-like object. Workers
+# map the file into memory by themselves, bytes are first written once to
+# temporary file in /dev/shm, if available, so they are shared the same way.
+# Boundaries of all chunks are found by scan.scan() first, then pools,
+# typeSpec, type and library chunks are parsed by workers in batches of at
+# least BATCH bytes and put back in buffer order. Returns the same ResTable
+# (with the same tracked source) and rest of buffer as ResTable.from_bytes().
+#
+# Pool of WORKERS processes is created, unless EXECUTOR is given. Parsing in
+# parallel pays off only for large tables, as every chunk is sent back to
+# the parent pickled.
+def from_bytes(source, workers=None, executor=None, batch=1 << 20):
+    shared = None
+    if isinstance(source, (str, os.PathLike)):
+        path = source
+        with open(path, 'rb') as f:
+            b = f.read()
+    else:
+        b = source
+        shared = _share(b)
+        path = shared.name
+
+    own = executor is None
+    try:
+        table, packages, ranges = chunks(b)
+        if own:
+            executor = ProcessPoolExecutor(workers)
+        futures = [executor.submit(_parse_ranges, path, r)
+                for r in batches(ranges, batch)]
+        objs = [obj for future in futures for obj in future.result()]
+    finally:
+        if own and executor is not None:
+            executor.shutdown()
+        if shared is not None:
+            shared.close()
+
+    return assemble(b, table, packages, ranges, objs)
+
+## Builds ResTable from chunks of buffer B parsed separately
+# \details TABLE, PACKAGES and CHUNKS are as returned by chunks(), OBJS are
+# parsed CHUNKS in the same order. Returns ResTable and rest of B, as
+# ResTable.from_bytes() does.
+def assemble(b, table, packages, chunks, objs):
+    parsed = dict(zip([c.offset for c in chunks], objs))
+    header, _ = ResTable_header.from_bytes(bytes(b[:table.headerSize]))
+    configs = ResTable_configPool()
+    values = parsed[chunks[0].offset]
+    res = ResTable(header, values, [_package(b, pkg, parsed, configs)
+        for pkg in packages], configs)
+    res.track(memoryview(b)[:table.size])
+    return res, b[table.size:]
+
+
+class ParallelTests(unittest.TestCase):
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        return MergeTests.sample(de={'a': 'z'}, fr={'b': 'w'}) + b'\x13\x37'
+
+    def test_batches(self):
+        from arsc.scan import ChunkRange
+        chunks = [ChunkRange(2, 0, 8, 8), ChunkRange(2, 8, 8, 16),
+                ChunkRange(2, 24, 8, 8), ChunkRange(2, 32, 8, 8)]
+        expected = [[(2, 0, 8), (2, 8, 16)], [(2, 24, 8), (2, 32, 8)]]
+        actual = batches(chunks, 16)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        b = ParallelTests.tv1_bytes()
+        expected = ResTable.from_bytes(b)
+        actual = from_bytes(b, workers=2, batch=1)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_shares_configs(self):
+        invector, _ = from_bytes(ParallelTests.tv1_bytes(), workers=2,
+                batch=1)
+        types = invector.packages[0].types[0][1:]
+        expected = ([0, 1, 2], True)
+        actual = ([t.header.configId for t in types],
+                all(t.header.config is invector.configs[t.header.configId]
+                    for t in types))
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_is_clean(self):
+        b = ParallelTests.tv1_bytes()
+        invector, _ = from_bytes(b, workers=1)
+        expected = (False, b[:-2])
+        actual = (invector.is_dirty(), bytes(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_from_path(self):
+        b = ParallelTests.tv1_bytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            expected = ResTable.from_bytes(b)
+            actual = from_bytes(path, workers=2, batch=1)
+
+        self.assertEqual(expected, actual)
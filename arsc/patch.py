@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+## \file patch.py
+# \brief In-place editing of serialized tables
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+from arsc.types import ResourceType
+from arsc.scan import scan
+from arsc.config import ResTable_config
+from arsc.entry import ResTable_entry
+from arsc.entry import Res_value
+from arsc.stringpool import ResStringPool
+from arsc.stringpool import ResStringPool_header
+from arsc.package import ResTable_package_header
+from arsc.tabletype import ResTable_type
+from arsc.exceptions import SizeChangeException
+
+## \class Patcher
+# \brief Edits fields of a table without parsing or serializing it
+# \details Buffer is scanned once for chunk headers (see scan.scan()) to get
+# offsets of packages, pools and type chunks. Every edit then only reads the
+# few fields it needs to locate its target and writes new bytes over the old
+# ones, so it has to keep size of the field. Edits that would change any
+# size raise SizeChangeException and leave the buffer untouched.
+#
+# Buffer may be bytearray or writable mmap, see Patcher.open().
+class Patcher:
+
+    def __init__(self, buf):
+        ## Patched buffer
+        self.buf = buf
+        ## scan.ChunkRange of the table
+        self.table, = scan(buf)
+        ## scan.ChunkRange of value string pool
+        self.values = None
+        ## Dictionary of package id to scan.ChunkRange of package
+        self.packages = {}
+        ## Dictionary of (package id, type id) to list of scan.ChunkRange of
+        #  its ResTable_type chunks
+        self.types = {}
+        self._file = None
+
+        for chunk in self.table.children:
+            if chunk.type == ResourceType.RES_STRING_POOL_TYPE:
+                self.values = chunk
+            elif chunk.type == ResourceType.RES_TABLE_PACKAGE_TYPE:
+                pkgid, = struct.unpack_from('<I', buf, chunk.offset + 8)
+                self.packages[pkgid] = chunk
+                for typ in chunk.children:
+                    if typ.type == ResourceType.RES_TABLE_TYPE_TYPE:
+                        self.types.setdefault((pkgid, buf[typ.offset + 8]),
+                                []).append(typ)
+
+    ## Opens file at PATH for patching through writable mmap
+    # \details If the file can not be mapped or is not a table, both the
+    # file and the mapping are closed before the exception propagates.
+    def open(path):
+        f = open(path, 'r+b')
+        buf = None
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+            patcher = Patcher(buf)
+        except Exception:
+            if buf is not None:
+                buf.close()
+            f.close()
+            raise
+        patcher._file = f
+        return patcher
+
+    ## Flushes changes and closes mmap and file opened by Patcher.open()
+    def close(self):
+        if self._file is not None:
+            self.buf.flush()
+            self.buf.close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    ## Writes DATA at OFFSET in place of SIZE bytes
+    # \details Raises SizeChangeException if DATA is not exactly SIZE bytes
+    # long.
+    def write(self, offset, size, data):
+        if len(data) != size:
+            raise SizeChangeException(size, len(data))
+        self.buf[offset:offset + size] = data
+
+    ## Returns offset of entry INDEX in type chunk TYP, None if not defined
+    def _entry_offset(self, typ, index):
+        buf = self.buf
+        res0 = buf[typ.offset + 9]
+        entryCount, entriesStart = struct.unpack_from('<II', buf,
+                typ.offset + 12)
+        base = typ.offset + typ.headerSize
+        if res0 & ResTable_type.FLAG_SPARSE:
+            # binary search over (index, offset / 4) pairs sorted by index
+            low, high = 0, entryCount
+            while low < high:
+                middle = (low + high) // 2
+                if struct.unpack_from('<H', buf, base + 4 * middle)[0] < index:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low == entryCount:
+                return None
+            found, offset = struct.unpack_from('<HH', buf, base + 4 * low)
+            if found != index:
+                return None
+            offset *= 4
+        else:
+            if index >= entryCount:
+                return None
+            offset, = struct.unpack_from('<I', buf, base + 4 * index)
+            if offset == ResTable_type.NO_ENTRY:
+                return None
+        return typ.offset + entriesStart + offset
+
+    ## Returns offsets of Res_value of resource RESID in every chunk
+    # \details If CONFIG is given, only chunks of that configuration are
+    # searched; configurations are compared by their qualifiers, whatever
+    # their size (see ResTable_config.same_qualifiers()). Complex entries
+    # are skipped.
+    def value_offsets(self, resid, config=None):
+        ret = []
+        for typ in self.types.get((resid >> 24, (resid >> 16) & 0xff), []):
+            if config is not None:
+                chunkConfig, _ = ResTable_config.from_bytes(bytes(
+                    self.buf[typ.offset + 20:typ.offset + typ.headerSize]))
+                if not chunkConfig.same_qualifiers(config):
+                    continue
+            offset = self._entry_offset(typ, resid & 0xffff)
+            if offset is None:
+                continue
+            size, flags = struct.unpack_from('<HH', self.buf, offset)
+            if flags & ResTable_entry.FLAG_COMPLEX:
+                continue
+            ret.append(offset + size)
+        return ret
+
+    ## Sets data (and optionally type) of value of RESID
+    # \details Returns number of patched values.
+    def set_value(self, resid, data, dataType=None, config=None):
+        offsets = self.value_offsets(resid, config)
+        for offset in offsets:
+            if dataType is not None:
+                self.buf[offset + 3] = dataType
+            struct.pack_into('<I', self.buf, offset + 4, data)
+        return len(offsets)
+
+    ## Renames package PKGID to NAME
+    # \details Name must fit in ResTable_package_header.MAX_NAME_LEN
+    # characters including terminating NULL.
+    def rename_package(self, pkgid, name):
+        size = ResTable_package_header.MAX_NAME_LEN * 2
+        encoded = (name + '\0').encode('utf-16-le')
+        if len(encoded) > size:
+            raise SizeChangeException(size, len(encoded))
+        self.write(self.packages[pkgid].offset + 12, size,
+                encoded + bytes(size - len(encoded)))
+
+    ## Replaces string INDEX of value string pool with S
+    # \details Encoded S must have the same length as encoded old string, so
+    # references of other strings stay valid.
+    def set_string(self, index, s):
+        pool = self.values
+        buf = self.buf
+        stringCount, _, flags, stringsStart = struct.unpack_from('<IIII',
+                buf, pool.offset + 8)
+        if index >= stringCount:
+            raise IndexError('string index out of range')
+        ref, = struct.unpack_from('<I', buf, pool.offset + pool.headerSize +
+                4 * index)
+        offset = pool.offset + stringsStart + ref
+        utf8 = bool(flags & ResStringPool_header.Flags.UTF8_FLAG)
+        size = ResStringPool._raw_length(bytes(buf[offset:offset + 4]), utf8)
+        self.write(offset, size, ResStringPool.encode_string(s, utf8))
+
+
+class PatcherTests(unittest.TestCase):
+
+    def tv1_bytes(size=0x30):
+        from arsc.merge import MergeTests
+        return MergeTests.sample(size, default={'a': 'x', 'b': 'yy'})
+
+    def test_set_value(self):
+        from arsc.arsc import ResTable
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        count = invector.set_value(0x7f010000, 7, Res_value.TYPE_INT_DEC)
+        table, _ = ResTable.from_bytes(bytes(invector.buf))
+        expected = (2, [Res_value(8, 0, Res_value.TYPE_INT_DEC, 7)] * 2)
+        actual = (count, [typ.entry(0).value
+            for typ in table.packages[0].types[0][1:]])
+
+        self.assertEqual(expected, actual)
+
+    def test_set_value_in_config(self):
+        de = ResTable_config(locale=ResTable_config.Locale('de'))
+        for size in (0x30, ResTable_config.len):
+            invector = Patcher(bytearray(PatcherTests.tv1_bytes(size)))
+            expected = (1, 1)
+            actual = (invector.set_value(0x7f010000, 7, config=de),
+                    invector.set_value(0x7f010000, 7,
+                        config=ResTable_config()))
+
+            self.assertEqual(expected, actual)
+
+    def test_set_value_undefined(self):
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        expected = 0
+        actual = invector.set_value(0x7f010005, 7)
+
+        self.assertEqual(expected, actual)
+
+    def test_rename_package(self):
+        from arsc.arsc import ResTable
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        invector.rename_package(0x7f, 'renamed')
+        table, _ = ResTable.from_bytes(bytes(invector.buf))
+        expected = 'renamed'
+        actual = table.packages[0].header.name.decode('utf-16-le').split(
+                '\0', 1)[0]
+
+        self.assertEqual(expected, actual)
+
+    def test_rename_package_too_long(self):
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        with self.assertRaises(Exception) as cm:
+            invector.rename_package(0x7f, 'x' * 128)
+
+        expected = 'edit changes size of field from 256 to 258 bytes'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_set_string(self):
+        from arsc.arsc import ResTable
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        invector.set_string(1, 'zz')
+        table, _ = ResTable.from_bytes(bytes(invector.buf))
+        expected = ['x', 'zz', 'z']
+        actual = [table.values.string(i) for i in range(3)]
+
+        self.assertEqual(expected, actual)
+
+    def test_set_string_of_other_length(self):
+        invector = Patcher(bytearray(PatcherTests.tv1_bytes()))
+        with self.assertRaises(Exception) as cm:
+            invector.set_string(1, 'zzz')
+
+        expected = 'edit changes size of field from 5 to 6 bytes'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_entry_offset_sparse(self):
+        from arsc.tabletype import ResTable_typeTests
+        from arsc.scan import ChunkRange
+        typ = ResTable_typeTests.tv3_obj
+        # entries 0 and 2 stored as pairs of index and offset / 4
+        chunk = bytearray(bytes(typ.header) + b'\0\0\0\0\2\0\4\0' +
+                typ.rest[12:])
+        chunk[9] = ResTable_type.FLAG_SPARSE
+        struct.pack_into('<I', chunk, 4, len(chunk))
+        struct.pack_into('<II', chunk, 12, 2, 0x44 + 8)
+        invector = Patcher.__new__(Patcher)
+        invector.buf = chunk
+        rng = ChunkRange(ResourceType.RES_TABLE_TYPE_TYPE, 0, 0x44, len(chunk))
+        expected = [0x4c, None, 0x5c, None]
+        actual = [invector._entry_offset(rng, i) for i in range(4)]
+
+        self.assertEqual(expected, actual)
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'),
+            'open files can not be listed')
+    def test_open_invalid_closes_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'\1\0\x08\0\x04\0\0\0')
+            f.flush()
+            expected = os.listdir('/proc/self/fd')
+            error = None
+            try:
+                Patcher.open(f.name)
+            except Exception as e:
+                # traceback keeps frames alive, so nothing is closed by
+                # garbage collection
+                error = e
+            actual = os.listdir('/proc/self/fd')
+            self.assertIsNotNone(error.__traceback__)
+
+        self.assertEqual(expected, actual)
+
+    def test_open(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(PatcherTests.tv1_bytes())
+            f.flush()
+            with Patcher.open(f.name) as invector:
+                invector.rename_package(0x7f, 'mapped')
+            f.seek(0)
+            data = f.read()
+        offset = Patcher(bytearray(data)).packages[0x7f].offset + 12
+        expected = 'mapped\0'.encode('utf-16-le')
+        actual = data[offset:offset + len(expected)]
+
+        self.assertEqual(expected, actual)
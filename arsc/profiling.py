@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+## \file profiling.py
+# \brief Recording time and memory spent parsing every chunk
+# \details Nothing is instrumented until ParseProfiler is entered: it then
+# replaces from_bytes of profiled classes with timing wrappers and puts the
+# original functions back on exit, so parsing outside of it runs exactly the
+# same code as without this module.
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import unittest
+from arsc.arsc import ResTable
+from arsc.stringpool import ResStringPool
+from arsc.package import ResTable_package
+from arsc.tabletype import ResTable_typeSpec
+from arsc.tabletype import ResTable_type
+from arsc.library import ResTable_lib
+from arsc.exceptions import ProfilerActiveException
+
+## Classes, whose parsing is recorded by ParseProfiler
+PROFILED = (ResTable, ResStringPool, ResTable_package, ResTable_typeSpec,
+        ResTable_type, ResTable_lib)
+
+# type and size fields of ResChunk_header
+_header = struct.Struct('<HHI')
+
+## \class ChunkRecord
+# \brief Parsing of single chunk, as recorded by ParseProfiler
+class ChunkRecord:
+
+    def __init__(self, type, name, offset, size, depth, duration, selfTime,
+            allocated=None, thread=None):
+        ## Chunk type as integer, compared against ResourceType members
+        self.type = type
+        ## Name of class that parsed the chunk
+        self.name = name
+        ## Offset of chunk from start of the outermost parsed buffer
+        self.offset = offset
+        ## Size of whole chunk, as in ResChunk_header
+        self.size = size
+        ## Number of chunks being parsed around this one
+        self.depth = depth
+        ## Time of parsing including contained chunks, in seconds
+        self.duration = duration
+        ## Time of parsing excluding contained chunks, in seconds
+        self.selfTime = selfTime
+        ## Bytes of traced memory still allocated after parsing, including
+        #  contained chunks and excluding remainder of buffer returned with
+        #  the chunk; None if memory was not traced
+        self.allocated = allocated
+        ## Identifier of thread that parsed the chunk (threading.get_ident())
+        self.thread = thread
+
+    def __repr__(self):
+        return '{c}({type}, {name!r}, {offset}, {size}, {depth}, ' \
+                '{duration}, {selfTime}, {allocated}, {thread})'.format(
+                        c=type(self).__name__, type=hex(self.type),
+                        name=self.name, offset=self.offset, size=self.size,
+                        depth=self.depth, duration=self.duration,
+                        selfTime=self.selfTime, allocated=self.allocated,
+                        thread=self.thread)
+
+## \class ParseProfiler
+# \brief Context manager recording every chunk parsed while it is active
+# \details Covers from_bytes of all PROFILED classes, however they are
+# reached, in every thread. Nesting of chunks is followed separately in each
+# thread, so offsets and depths stay right when threads parse at the same
+# time; every record tells its thread. Records are appended to records in
+# order, in which chunks finish parsing (contained chunks before their
+# container in the same thread), and passed to CALLBACK, if given, in the
+# thread that parsed the chunk. If MEMORY is set, allocations are traced with
+# tracemalloc, which slows parsing down considerably. Traced memory is shared
+# by the whole process, so allocations are only exact when a single thread
+# parses. Only one profiler may be active at a time.
+class ParseProfiler:
+
+    # active profiler, if any
+    _active = None
+
+    def __init__(self, callback=None, memory=False):
+        ## Function called with every ChunkRecord, or None
+        self.callback = callback
+        ## Whether allocations are traced
+        self.memory = memory
+        ## List of ChunkRecord of all parsed chunks
+        self.records = []
+        # originals of wrapped functions, keyed by class
+        self._originals = {}
+        # stack of every thread, with frame for every chunk being parsed: end
+        # of buffer its contents are sliced from and time spent in contained
+        # chunks
+        self._local = threading.local()
+        self._tracing = False
+
+    def __enter__(self):
+        if ParseProfiler._active is not None:
+            raise ProfilerActiveException()
+        ParseProfiler._active = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        for cls in PROFILED:
+            original = cls.__dict__['from_bytes']
+            self._originals[cls] = original
+            setattr(cls, 'from_bytes', self._wrap(cls.__name__, original))
+        return self
+
+    def __exit__(self, *exc):
+        for cls, original in self._originals.items():
+            setattr(cls, 'from_bytes', original)
+        self._originals = {}
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        ParseProfiler._active = None
+        return False
+
+    ## Returns replacement of from_bytes function FN of class NAME
+    def _wrap(self, name, fn):
+        def from_bytes(b, *args, **kwargs):
+            return self._call(name, fn, b, args, kwargs)
+        return from_bytes
+
+    ## Calls FN of class NAME on B and records it
+    # \details Offset of the chunk is found from length of B: every parser
+    # gets buffer running to end of its container, so container remembers
+    # where that end is.
+    def _call(self, name, fn, b, args, kwargs):
+        if len(b) < _header.size:
+            return fn(b, *args, **kwargs)
+        chunkType, _, size = _header.unpack_from(b)
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        end = stack[-1][0] if stack else len(b)
+        offset = end - len(b)
+        # table is followed by its chunks in the same buffer, other
+        # containers (packages) slice their contents to their size
+        inner = end if fn is self._originals[ResTable] else offset + size
+        frame = [inner, 0.0]
+        stack.append(frame)
+        memory = tracemalloc.get_traced_memory()[0] if self.memory else None
+        start = time.perf_counter()
+        result = None
+        try:
+            result = fn(b, *args, **kwargs)
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            if memory is not None:
+                memory = tracemalloc.get_traced_memory()[0] - memory
+                # remainder of bytes buffer is a copy, that belongs to caller
+                if result is not None and isinstance(result[1], bytes) and \
+                        result[1] is not b:
+                    memory -= sys.getsizeof(result[1])
+            stack.pop()
+            if stack:
+                stack[-1][1] += duration
+            record = ChunkRecord(chunkType, name, offset, size, len(stack),
+                    duration, duration - frame[1], memory,
+                    threading.get_ident())
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    ## Returns records aggregated by class that parsed them
+    # \details Result is dictionary of class name to dictionary with 'count'
+    # of chunks, their total 'size', 'time' spent parsing them without
+    # contained chunks and, if memory was traced, 'allocated' bytes excluding
+    # contained chunks. Sum of all 'time' is the time of whole parse.
+    def summary(self):
+        ret = {}
+        children = {}
+        for record in self.records:
+            # contained chunks are recorded before their container
+            inner = children.pop((record.thread, record.depth + 1), 0)
+            if record.allocated is not None:
+                key = (record.thread, record.depth)
+                children[key] = children.get(key, 0) + record.allocated
+            stats = ret.setdefault(record.name, {'count': 0, 'size': 0,
+                'time': 0.0})
+            stats['count'] += 1
+            stats['size'] += record.size
+            stats['time'] += record.selfTime
+            if record.allocated is not None:
+                stats['allocated'] = stats.get('allocated', 0) + \
+                        record.allocated - inner
+        return ret
+
+## Returns ParseProfiler, to be used in with statement
+def profile(callback=None, memory=False):
+    return ParseProfiler(callback, memory)
+
+
+class ParseProfilerTests(unittest.TestCase):
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        return MergeTests.sample()
+
+    def test_records(self):
+        from arsc.scan import scan
+        b = ParseProfilerTests.tv1_bytes()
+        with profile() as profiler:
+            ResTable.from_bytes(b)
+        ranges = scan(b)
+        expected = sorted((c.type, c.offset, c.size) for c in [ranges[0]] +
+                ranges[0].children + ranges[0].children[1].children)
+        actual = sorted((r.type, r.offset, r.size) for r in profiler.records)
+
+        self.assertEqual(expected, actual)
+
+    def test_order_and_depth(self):
+        with profile() as profiler:
+            ResTable.from_bytes(ParseProfilerTests.tv1_bytes())
+        expected = [('ResStringPool', 1), ('ResStringPool', 2),
+                ('ResStringPool', 2), ('ResTable_typeSpec', 2),
+                ('ResTable_type', 2), ('ResTable_type', 2),
+                ('ResTable_package', 1), ('ResTable', 0)]
+        actual = [(r.name, r.depth) for r in profiler.records]
+
+        self.assertEqual(expected, actual)
+
+    def test_self_time(self):
+        with profile() as profiler:
+            ResTable.from_bytes(ParseProfilerTests.tv1_bytes())
+        table = profiler.records[-1]
+        expected = table.duration
+        actual = sum(r.selfTime for r in profiler.records)
+
+        self.assertAlmostEqual(expected, actual)
+
+    def test_callback(self):
+        names = []
+        with profile(callback=lambda r: names.append(r.name)):
+            ResTable.from_bytes(ParseProfilerTests.tv1_bytes())
+        expected = 'ResTable'
+        actual = names[-1]
+
+        self.assertEqual(expected, actual)
+
+    def test_summary(self):
+        with profile(memory=True) as profiler:
+            table, _ = ResTable.from_bytes(ParseProfilerTests.tv1_bytes())
+        invector = profiler.summary()
+        expected = ({'count': 2, 'size': 200}, True, True)
+        actual = ({k: invector['ResTable_type'][k] for k in ('count', 'size')},
+                invector['ResStringPool']['allocated'] > 0,
+                sum(s['allocated'] for s in invector.values()) ==
+                profiler.records[-1].allocated)
+
+        self.assertEqual(expected, actual)
+
+    def test_disabled_is_original(self):
+        originals = [cls.__dict__['from_bytes'] for cls in PROFILED]
+        with profile():
+            wrapped = [cls.__dict__['from_bytes'] for cls in PROFILED]
+        expected = (originals, False)
+        actual = ([cls.__dict__['from_bytes'] for cls in PROFILED],
+                any(w is o for w, o in zip(wrapped, originals)))
+
+        self.assertEqual(expected, actual)
+
+    def test_nested_profiler(self):
+        with profile():
+            with self.assertRaises(ProfilerActiveException):
+                with profile():
+                    pass
+        expected = None
+        actual = ParseProfiler._active
+
+        self.assertEqual(expected, actual)
+
+    def test_restored_on_error(self):
+        original = ResTable_type.__dict__['from_bytes']
+        with self.assertRaises(Exception):
+            with profile():
+                ResTable.from_bytes(ParseProfilerTests.tv1_bytes()[:100])
+        expected = original
+        actual = ResTable_type.__dict__['from_bytes']
+
+        self.assertEqual(expected, actual)
+
+    def test_threads(self):
+        from arsc.scan import scan
+        b = ParseProfilerTests.tv1_bytes()
+        ranges = scan(b)
+        chunks = sorted((c.type, c.offset, c.size) for c in [ranges[0]] +
+                ranges[0].children + ranges[0].children[1].children)
+        barrier = threading.Barrier(4)
+
+        def parse():
+            barrier.wait()
+            for i in range(20):
+                ResTable.from_bytes(b)
+
+        threads = [threading.Thread(target=parse) for i in range(4)]
+        with profile() as profiler:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        byThread = {}
+        for r in profiler.records:
+            byThread.setdefault(r.thread, []).append(r)
+        expected = [sorted(chunks * 20)] * 4
+        actual = [sorted((r.type, r.offset, r.size) for r in records)
+                for records in byThread.values()]
+
+        self.assertEqual(expected, actual)
+        self.assertEqual({0}, {r.depth for r in profiler.records
+            if r.name == 'ResTable'})
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+## \file query.py
+# \brief Finding entries of a table by predicates pushed down to indexes
+import struct
+import unittest
+from arsc.config import ResTable_config
+from arsc.index import QualifierIndex
+
+## Returns QualifierIndex of TABLE, building it on first use
+# \details Index is kept by the table, so it is built once for all queries.
+# It is built again after the table changes, see ResTable.touch(); checking
+# that does not visit any chunks.
+def qualifier_index(table):
+    index = getattr(table, '_qualifierIndex', None)
+    if index is None or not index.is_current():
+        index = QualifierIndex(table)
+        table._qualifierIndex = index
+    return index
+
+## Returns ResTable_config.Config mask described by VARIES
+# \details VARIES is either the flag itself (or int) or its name without
+# CONFIG_ prefix, eg. 'locale' or 'density'.
+def _config_mask(varies):
+    if isinstance(varies, str):
+        return int(ResTable_config.Config['CONFIG_' + varies.upper()])
+    return int(varies)
+
+## Generates entries of TABLE that match all given predicates
+# \details Every result is a tuple of resource id, ResTable_type chunk and
+# entry.ResTable_entry. Predicates left None are not checked:
+#
+#   * PACKAGE - package id
+#   * TYPE - type name, looked up once in typeStrings of every package, so
+#     chunks of other types are never visited
+#   * TYPE_ID - type id, as in resource id; chunks of other types are never
+#     visited
+#   * INDEX - entry index, as in resource id; only that entry of every chunk
+#     is decoded
+#   * NAME - entry name, looked up once in keyStrings, then compared as key
+#     index
+#   * VARIES - only entries, whose configurations differ in that dimension
+#     (see _config_mask()), checked in typeSpec bitsets before any entry is
+#     decoded
+#   * VALUE_TYPE - data type of value (Res_value.TYPE_*), complex entries
+#     never match it
+#   * QUALIFIERS - any qualifier of ResTable_config.qualifiers(), eg.
+#     locale='de' or density=480; matching chunks are taken from
+#     QualifierIndex, built on first query
+#
+# Only chunks that pass type and qualifier predicates are decoded.
+def query(table, type=None, name=None, package=None, varies=None,
+        value_type=None, type_id=None, index=None, **qualifiers):
+    chunks = None
+    if qualifiers:
+        qualifierIndex = qualifier_index(table)
+        for qualifier, value in qualifiers.items():
+            found = {id(typ) for typ in qualifierIndex.get(qualifier, value)}
+            chunks = found if chunks is None else chunks & found
+        if not chunks:
+            return
+
+    mask = None if varies is None else _config_mask(varies)
+    for pkg in table.packages:
+        pkgid = pkg.header.id.integer
+        if package is not None and pkgid != package:
+            continue
+
+        typeId = None
+        if type is not None:
+            typeId = pkg.typeStrings.index(type)
+            if typeId is None:
+                continue
+            typeId += 1
+            if type_id is not None and typeId != type_id:
+                continue
+        elif type_id is not None:
+            typeId = type_id
+
+        key = None
+        if name is not None:
+            key = pkg.keyStrings.index(name)
+            if key is None:
+                continue
+
+        for spec in pkg.types or []:
+            if not spec or (typeId is not None and
+                    spec[0].header.id.integer != typeId):
+                continue
+
+            allowed = None
+            if mask is not None:
+                flags = struct.unpack('<{}I'.format(len(spec[0].configs) //
+                    4), spec[0].configs)
+                allowed = {i for i, f in enumerate(flags) if f & mask}
+                if not allowed:
+                    continue
+
+            for typ in spec[1:]:
+                if chunks is not None and id(typ) not in chunks:
+                    continue
+                offsets = typ.entry_offsets()
+                if index is not None:
+                    indices = [index] if index < len(offsets) and \
+                            (allowed is None or index in allowed) else []
+                elif allowed is None:
+                    indices = range(len(offsets))
+                else:
+                    indices = sorted(i for i in allowed if i < len(offsets))
+                base = (pkgid << 24) | (typ.header.id.integer << 16)
+                for i in indices:
+                    entry = typ.entry(i, offsets)
+                    if entry is None:
+                        continue
+                    if key is not None and entry.key.integer != key:
+                        continue
+                    if value_type is not None and (entry.is_complex() or
+                            entry.value.dataType.integer != value_type):
+                        continue
+                    yield base | i, typ, entry
+
+
+class QueryTests(unittest.TestCase):
+
+    def tv1_obj():
+        from arsc.arsc import ResTable
+        from arsc.merge import MergeTests
+        table, _ = ResTable.from_bytes(MergeTests.sample(
+            default={'a': 'x', 'b': 'y', 'c': 'w'}))
+        return table
+
+    def ids(results):
+        return [(resid, typ.header.configId) for resid, typ, _ in results]
+
+    def test_all(self):
+        invector = QueryTests.tv1_obj()
+        expected = [(0x7f010000, 0), (0x7f010001, 0), (0x7f010002, 0),
+                (0x7f010000, 1)]
+        actual = QueryTests.ids(query(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_type(self):
+        invector = QueryTests.tv1_obj()
+        expected = ([], 4)
+        actual = (QueryTests.ids(query(invector, type='drawable')),
+                len(QueryTests.ids(query(invector, type='string'))))
+
+        self.assertEqual(expected, actual)
+
+    def test_locale(self):
+        invector = QueryTests.tv1_obj()
+        expected = [(0x7f010000, 1)]
+        actual = QueryTests.ids(query(invector, type='string', locale='de'))
+
+        self.assertEqual(expected, actual)
+
+    def test_unknown_qualifier_value(self):
+        invector = QueryTests.tv1_obj()
+        expected = []
+        actual = QueryTests.ids(query(invector, locale='fr'))
+
+        self.assertEqual(expected, actual)
+
+    def test_name(self):
+        invector = QueryTests.tv1_obj()
+        expected = [(0x7f010001, 0)]
+        actual = QueryTests.ids(query(invector, name='b'))
+
+        self.assertEqual(expected, actual)
+
+    def test_type_id(self):
+        invector = QueryTests.tv1_obj()
+        expected = ([], 4, [])
+        actual = (QueryTests.ids(query(invector, type_id=2)),
+                len(QueryTests.ids(query(invector, type_id=1))),
+                QueryTests.ids(query(invector, type='string', type_id=2)))
+
+        self.assertEqual(expected, actual)
+
+    def test_index(self):
+        invector = QueryTests.tv1_obj()
+        expected = ([(0x7f010000, 0), (0x7f010000, 1)], [(0x7f010002, 0)],
+                [])
+        actual = (QueryTests.ids(query(invector, type_id=1, index=0)),
+                QueryTests.ids(query(invector, index=2)),
+                QueryTests.ids(query(invector, index=3)))
+
+        self.assertEqual(expected, actual)
+
+    def test_value_type(self):
+        from arsc.entry import Res_value
+        invector = QueryTests.tv1_obj()
+        expected = (4, 0)
+        actual = (len(list(query(invector,
+            value_type=Res_value.TYPE_STRING))), len(list(query(invector,
+                value_type=Res_value.TYPE_INT_DEC))))
+
+        self.assertEqual(expected, actual)
+
+    def test_varies(self):
+        invector = QueryTests.tv1_obj()
+        spec = invector.packages[0].types[0][0]
+        spec.configs = struct.pack('<III',
+                int(ResTable_config.Config.CONFIG_LOCALE), 0, 0)
+        expected = [(0x7f010000, 0), (0x7f010000, 1)]
+        actual = QueryTests.ids(query(invector, varies='locale'))
+
+        self.assertEqual(expected, actual)
+
+    def test_index_follows_config_change(self):
+        invector = QueryTests.tv1_obj()
+        QueryTests.ids(query(invector, locale='de'))
+        typ = invector.packages[0].types[0][2]
+        typ.header.config = ResTable_config(
+                locale=ResTable_config.Locale('fr'))
+        invector.touch()
+        expected = ([], [0x7f010000])
+        actual = (QueryTests.ids(query(invector, locale='de')),
+                [resid for resid, _, _ in query(invector, locale='fr')])
+
+        self.assertEqual(expected, actual)
+
+    def test_index_follows_removed_chunk(self):
+        invector = QueryTests.tv1_obj()
+        QueryTests.ids(query(invector, locale='de'))
+        del invector.packages[0].types[0][2]
+        invector.touch()
+        expected = []
+        actual = QueryTests.ids(query(invector, locale='de'))
+
+        self.assertEqual(expected, actual)
+
+    def test_index_kept_until_touched(self):
+        invector = QueryTests.tv1_obj()
+        index = qualifier_index(invector)
+        # chunks are not visited, so in-place edit is not noticed yet
+        del invector.packages[0].types[0][2]
+        kept = qualifier_index(invector)
+        invector.touch()
+        expected = (True, False, [])
+        actual = (kept is index, qualifier_index(invector) is index,
+                QueryTests.ids(query(invector, locale='de')))
+
+        self.assertEqual(expected, actual)
+
+    def test_table_query(self):
+        invector = QueryTests.tv1_obj()
+        expected = [(0x7f010000, 1)]
+        actual = QueryTests.ids(invector.query(locale='de'))
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+## \file resolver.py
+# \brief Selection of best matching configuration for a device
+import unittest
+from functools import cmp_to_key
+from arsc.arsc import ResTable
+from arsc.arsc import ResTableTests
+from arsc.config import ResTable_config
+from arsc.tabletype import ResTable_type
+from arsc.exceptions import WrongTypeException
+
+## \class Resolver
+# \brief Picks ResTable_type chunks the platform would use for given device
+# \details Candidate chunks of every type are grouped by id of their interned
+# configuration once, when resolver is created. For each device configuration
+# every unique configuration of the table is checked with
+# ResTable_config.match() only once, then groups are filtered and sorted best
+# first with ResTable_config.isBetterThan(), and the result is cached. A lookup
+# of single entry only walks that short, already ordered list until it finds
+# a chunk defining the entry.
+class Resolver:
+
+    def __init__(self, table):
+        if not isinstance(table, ResTable):
+            raise WrongTypeException('table', ResTable)
+
+        ## Resolved ResTable
+        self.table = table
+        # chunks added after table was created may not be interned yet
+        table.intern_configs()
+        ## Candidates of each type, keyed by (package id, type id). Every
+        #  candidate is a pair of config id and list of (ResTable_type,
+        #  entry offsets) pairs using it, sorted by config id.
+        self.candidates = {}
+        ## Number of entries of each type, as declared by ResTable_typeSpec
+        self.entryCounts = {}
+        # results of ResTable_config.match() for every config id, keyed by
+        # device key
+        self._matches = {}
+        # candidates ordered best first, keyed by device key and type
+        self._ranked = {}
+        ## library.DynamicRefTable of every package, keyed by package id
+        self.refs = table.dynamic_ref_tables()
+
+        for pkg in table.packages:
+            pkgid = pkg.header.id.integer
+            for spec in pkg.types or []:
+                if not spec:
+                    continue
+                typeid = spec[0].header.id.integer
+                groups = {}
+                for typ in spec[1:]:
+                    configId = typ.header.configId
+                    if configId not in groups:
+                        groups[configId] = (configId, [])
+                    groups[configId][1].append((typ, typ.entry_offsets()))
+                key = (pkgid, typeid)
+                self.candidates[key] = [groups[k] for k in sorted(groups)]
+                self.entryCounts[key] = spec[0].header.entryCount.integer
+
+    ## Returns list of ResTable_config.match() results, indexed by config id
+    def matches(self, device):
+        matches = self._matches.get(device.key)
+        if matches is None:
+            matches = [c.match(device) for c in self.table.configs]
+            self._matches[device.key] = matches
+        return matches
+
+    ## Returns candidates of type matching DEVICE, best first
+    # \details Every element is a pair of config id and list of
+    # (ResTable_type, entry offsets) pairs.
+    def ranked(self, device, package_id, type_id):
+        key = (device.key, package_id, type_id)
+        ranked = self._ranked.get(key)
+        if ranked is not None:
+            return ranked
+
+        configs = self.table.configs
+
+        def compare(lhs, rhs):
+            if lhs[0] == rhs[0]:
+                return 0
+            if configs[lhs[0]].isBetterThan(configs[rhs[0]], device):
+                return -1
+            if configs[rhs[0]].isBetterThan(configs[lhs[0]], device):
+                return 1
+            return 0
+
+        matches = self.matches(device)
+        candidates = self.candidates.get((package_id, type_id), [])
+        ranked = [c for c in candidates if matches[c[0]]]
+        ranked.sort(key=cmp_to_key(compare))
+        self._ranked[key] = ranked
+        return ranked
+
+    ## Returns ResTable_type defining resource RESID that matches DEVICE best
+    # \details Returns None, if no matching configuration defines the entry.
+    # If RESID is a reference found in package PACKAGE_ID, its package id is
+    # first translated with DynamicRefTable of that package.
+    def resolve(self, resid, device, package_id=None):
+        if package_id is not None:
+            resid = self.refs[package_id].lookup_resource_id(resid)
+        entry = resid & 0xffff
+        for configId, chunks in self.ranked(device, resid >> 24,
+                (resid >> 16) & 0xff):
+            for typ, offsets in chunks:
+                if entry < len(offsets) and \
+                        offsets[entry] != ResTable_type.NO_ENTRY:
+                    return typ
+        return None
+
+    ## Returns list of best ResTable_type for every entry of type
+    # \details List is indexed by entry index. Entries not defined for DEVICE
+    # are None.
+    def resolve_entries(self, device, package_id, type_id):
+        count = self.entryCounts.get((package_id, type_id), 0)
+        ret = [None] * count
+        missing = count
+        for configId, chunks in self.ranked(device, package_id, type_id):
+            for typ, offsets in chunks:
+                for entry, offset in enumerate(offsets[:count]):
+                    if offset != ResTable_type.NO_ENTRY and ret[entry] is None:
+                        ret[entry] = typ
+                        missing -= 1
+            if missing == 0:
+                break
+        return ret
+
+
+class ResolverTests(unittest.TestCase):
+
+    tv1_obj, _ = ResTable.from_bytes(ResTableTests.tv1_bytes)
+
+    default, de = tv1_obj.packages[0].types[0][1:]
+
+    def device(language):
+        return ResTable_config(locale=ResTable_config.Locale(language))
+
+    def test_table_is_invalid(self):
+        with self.assertRaises(Exception) as cm:
+            invector = Resolver(b'\x13\x37')
+
+        expected = 'table must be of type ResTable'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_resolve_locale(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = ResolverTests.de
+        actual = invector.resolve(0x7f070001, ResolverTests.device('de'))
+
+        self.assertIs(expected, actual)
+
+    def test_resolve_fallback_to_default(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = ResolverTests.default
+        actual = invector.resolve(0x7f070001, ResolverTests.device('fr'))
+
+        self.assertIs(expected, actual)
+
+    def test_resolve_missing_entry(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = None
+        actual = invector.resolve(0x7f070004, ResolverTests.device('de'))
+
+        self.assertEqual(expected, actual)
+
+    def test_resolve_unknown_type(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = None
+        actual = invector.resolve(0x7f020000, ResolverTests.device('de'))
+
+        self.assertEqual(expected, actual)
+
+    def test_resolve_entries(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = [ResolverTests.de] * 4
+        actual = invector.resolve_entries(ResolverTests.device('de'), 0x7f, 7)
+
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            self.assertIs(e, a)
+
+    def test_ranked_is_cached(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        device = ResolverTests.device('de')
+        expected = invector.ranked(device, 0x7f, 7)
+        actual = invector.ranked(ResolverTests.device('de'), 0x7f, 7)
+
+        self.assertIs(expected, actual)
+        self.assertEqual(2, len(actual))
+
+    def test_resolve_dynamic_reference(self):
+        invector = Resolver(ResolverTests.tv1_obj)
+        expected = ResolverTests.de
+        actual = invector.resolve(0x00070001, ResolverTests.device('de'),
+                package_id=0x7f)
+
+        self.assertIs(expected, actual)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+## \file scan.py
+# \brief Locating chunks in a buffer without deserializing them
+import struct
+import unittest
+from arsc.types import ResourceType
+from arsc.exceptions import ChunkOutOfBoundsException
+
+## \class ChunkRange
+# \brief Position of a chunk within a buffer
+# \details Only ResChunk_header of each chunk is read, so scanning whole table
+# is cheap even for huge files and works on bytes, memoryview or mmap alike.
+class ChunkRange:
+
+    ## Types of chunks that are followed by other chunks
+    CONTAINERS = (ResourceType.RES_TABLE_TYPE,
+            ResourceType.RES_TABLE_PACKAGE_TYPE, ResourceType.RES_XML_TYPE)
+
+    def __init__(self, type, offset, headerSize, size, children=None):
+        if children is None:
+            children = []
+
+        ## Chunk type as integer, compared against ResourceType members
+        self.type = type
+        ## Offset of chunk from start of the buffer
+        self.offset = offset
+        ## Size of chunk header, as in ResChunk_header
+        self.headerSize = headerSize
+        ## Size of whole chunk, as in ResChunk_header
+        self.size = size
+        ## List of ChunkRange of chunks contained in this one
+        self.children = children
+
+    def __str__(self):
+        return '{{type={type}, offset={offset}, headerSize={headerSize}, '\
+                'size={size}, children=[{children}]}}'.format(
+                        type=hex(self.type), offset=self.offset,
+                        headerSize=self.headerSize, size=self.size,
+                        children=', '.join(str(c) for c in self.children))
+
+    def __repr__(self):
+        return '{c}({type}, {offset}, {headerSize}, {size}, {children})'.format(
+                c=type(self).__name__, type=hex(self.type), offset=self.offset,
+                headerSize=self.headerSize, size=self.size,
+                children=repr(self.children))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.type == rhs.type and \
+                self.offset == rhs.offset and \
+                self.headerSize == rhs.headerSize and \
+                self.size == rhs.size and \
+                self.children == rhs.children
+
+    ## Returns offset of first byte after the chunk
+    def end(self):
+        return self.offset + self.size
+
+    ## Returns view of header of the chunk in buffer B
+    def header(self, b):
+        return memoryview(b)[self.offset:self.offset + self.headerSize]
+
+    ## Returns view of the whole chunk in buffer B
+    def data(self, b):
+        return memoryview(b)[self.offset:self.end()]
+
+    ## Returns all chunks of given TYPE from this subtree, in buffer order
+    def find(self, type):
+        ret = [self] if self.type == type else []
+        for child in self.children:
+            ret += child.find(type)
+        return ret
+
+## Returns list of ChunkRange of chunks stored in B between OFFSET and END
+# \details Containers (table, package and XML document) are scanned
+# recursively. Raises ChunkOutOfBoundsException, if chunk header does not fit
+# in its parent.
+def scan(b, offset=0, end=None):
+    if end is None:
+        end = len(b)
+
+    ret = []
+    while offset < end:
+        if offset + 8 > end:
+            raise ChunkOutOfBoundsException(offset)
+        chunkType, headerSize, size = struct.unpack_from('<HHI', b, offset)
+        if headerSize < 8 or size < headerSize or offset + size > end:
+            raise ChunkOutOfBoundsException(offset)
+
+        chunk = ChunkRange(chunkType, offset, headerSize, size)
+        if chunkType in ChunkRange.CONTAINERS:
+            chunk.children = scan(b, offset + headerSize, offset + size)
+        ret.append(chunk)
+        offset += size
+    return ret
+
+
+class ScanTests(unittest.TestCase):
+
+    tv1_bytes = b'\2\0\x0c\0\x28\0\0\0\1\0\0\0' + \
+            b'\1\0\x08\0\x0c\0\0\0\x13\x37\0\0' + \
+            b'\0\2\x08\0\x10\0\0\0' + b'\2\2\x08\0\x08\0\0\0'
+
+    def test_scan(self):
+        invector = ScanTests.tv1_bytes
+        expected = [ChunkRange(ResourceType.RES_TABLE_TYPE, 0, 12, 40, [
+            ChunkRange(ResourceType.RES_STRING_POOL_TYPE, 12, 8, 12),
+            ChunkRange(ResourceType.RES_TABLE_PACKAGE_TYPE, 24, 8, 16, [
+                ChunkRange(ResourceType.RES_TABLE_TYPE_SPEC_TYPE, 32, 8, 8)
+                ])
+            ])]
+        actual = scan(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_scan_truncated(self):
+        with self.assertRaises(Exception) as cm:
+            invector = scan(ScanTests.tv1_bytes[:-4])
+
+        expected = 'chunk at offset 0 does not fit in its parent'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_find(self):
+        invector, = scan(ScanTests.tv1_bytes)
+        expected = [32]
+        actual = [c.offset for c in invector.find(
+            ResourceType.RES_TABLE_TYPE_SPEC_TYPE)]
+
+        self.assertEqual(expected, actual)
+
+    def test_data(self):
+        invector, = scan(ScanTests.tv1_bytes)
+        expected = b'\x13\x37\0\0'
+        actual = bytes(invector.children[0].data(ScanTests.tv1_bytes)[8:])
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+## \file sidecar.py
+# \brief .arscidx sidecar index files for random access to tables
+import hashlib
+import os
+import struct
+import tempfile
+import unittest
+from functools import cmp_to_key
+from arsc.types import ResourceType
+from arsc.scan import scan
+from arsc.config import ResTable_config
+from arsc.entry import ResTable_entry
+from arsc.stringpool import ResStringPool
+from arsc.stringpool import ResStringPool_header
+from arsc.tabletype import ResTable_type
+from arsc.exceptions import IndexFormatException
+
+## \class Sidecar
+# \brief Offsets of all chunks of a table, stored next to it as .arscidx
+# \details Sidecar file is little-endian and consists of:
+#
+#   * header: magic b'ARSCIDX\0', uint32 version, uint32 size of the table
+#     file, 16 bytes of BLAKE2b digest of the table file, then uint32 number
+#     of chunk, pool and type records
+#   * chunk records, one for every chunk of the table in file order:
+#     uint16 chunk type, uint16 header size, uint32 offset, uint32 size and
+#     int32 index of parent chunk record (-1 for top level chunk)
+#   * pool records, one for every ResStringPool: uint32 index of chunk
+#     record, uint32 number of strings, uint32 flags, uint32 offset of
+#     array of string references and uint32 offset of string data. First
+#     pool is the value string pool.
+#   * type records, one for every ResTable_type: uint32 package id, uint8
+#     type id, uint8 flags (res0), uint16 padding, uint32 entry count,
+#     uint32 offset of array of entry offsets, uint32 offset of entries, and
+#     uint32 index of chunk record, followed by 0x40 bytes of configuration
+#
+# All offsets are absolute offsets in the table file. With sidecar loaded,
+# value of a resource is read with two seeks: one to its slot in entry offset
+# array and another one to the entry itself. Only complex entries with more
+# than one value need one more read for the rest of their map.
+class Sidecar:
+
+    MAGIC = b'ARSCIDX\0'
+    VERSION = 1
+    SUFFIX = '.arscidx'
+    _header = struct.Struct('<8sII16sIII')
+    _chunk = struct.Struct('<HHIIi')
+    _pool = struct.Struct('<IIIII')
+    _type = struct.Struct('<IBBHIIII')
+
+    def __init__(self, size=0, checksum=bytes(16), chunks=None, pools=None,
+            types=None):
+        if chunks is None:
+            chunks = []
+        if pools is None:
+            pools = []
+        if types is None:
+            types = []
+
+        ## Size of the table file
+        self.size = size
+        ## BLAKE2b digest of the table file
+        self.checksum = checksum
+        ## List of (type, headerSize, offset, size, parent) of every chunk
+        self.chunks = chunks
+        ## List of (chunk, stringCount, flags, refsOffset, stringsOffset)
+        self.pools = pools
+        ## List of (package id, type id, res0, entryCount, offsetsOffset,
+        #  entriesOffset, chunk, ResTable_config)
+        self.types = types
+        ## Dictionary of (package id, type id) to list of type records
+        self.byType = {}
+        for record in types:
+            self.byType.setdefault(record[:2], []).append(record)
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.size == rhs.size and \
+                self.checksum == rhs.checksum and \
+                self.chunks == rhs.chunks and \
+                self.pools == rhs.pools and \
+                self.types == rhs.types
+
+    ## Returns digest used as checksum of table B
+    def digest(b):
+        return hashlib.blake2b(b, digest_size=16).digest()
+
+    ## Creates Sidecar of table stored in B
+    def build(b):
+        chunks = []
+        pools = []
+        types = []
+
+        def walk(ranges, parent, pkgid):
+            for chunk in ranges:
+                index = len(chunks)
+                chunks.append((chunk.type, chunk.headerSize, chunk.offset,
+                    chunk.size, parent))
+                if chunk.type == ResourceType.RES_STRING_POOL_TYPE:
+                    stringCount, styleCount, flags, stringsStart = \
+                            struct.unpack_from('<IIII', b, chunk.offset + 8)
+                    pools.append((index, stringCount, flags,
+                        chunk.offset + chunk.headerSize,
+                        chunk.offset + stringsStart))
+                elif chunk.type == ResourceType.RES_TABLE_TYPE_TYPE:
+                    typeId, res0 = b[chunk.offset + 8], b[chunk.offset + 9]
+                    entryCount, entriesStart = struct.unpack_from('<II', b,
+                            chunk.offset + 12)
+                    config, _ = ResTable_config.from_bytes(bytes(
+                        b[chunk.offset + 20:chunk.offset + chunk.headerSize]))
+                    types.append((pkgid, typeId, res0, entryCount,
+                        chunk.offset + chunk.headerSize,
+                        chunk.offset + entriesStart, index, config))
+                elif chunk.type == ResourceType.RES_TABLE_PACKAGE_TYPE:
+                    walk(chunk.children, index, struct.unpack_from('<I', b,
+                        chunk.offset + 8)[0])
+                    continue
+                walk(chunk.children, index, pkgid)
+
+        walk(scan(b), -1, 0)
+        return Sidecar(len(b), Sidecar.digest(b), chunks, pools, types)
+
+    def __bytes__(self):
+        ret = [Sidecar._header.pack(Sidecar.MAGIC, Sidecar.VERSION, self.size,
+            self.checksum, len(self.chunks), len(self.pools),
+            len(self.types))]
+        ret += [Sidecar._chunk.pack(*c) for c in self.chunks]
+        ret += [Sidecar._pool.pack(*p) for p in self.pools]
+        for pkgid, typeId, res0, count, offsets, entries, chunk, config in \
+                self.types:
+            ret.append(Sidecar._type.pack(pkgid, typeId, res0, 0, count,
+                offsets, entries, chunk))
+            ret.append(bytes(config).ljust(ResTable_config.len, b'\0')
+                    [:ResTable_config.len])
+        return b''.join(ret)
+
+    def from_bytes(b):
+        if len(b) < Sidecar._header.size:
+            raise IndexFormatException('file too short')
+        magic, version, size, checksum, chunkCount, poolCount, typeCount = \
+                Sidecar._header.unpack_from(b, 0)
+        if magic != Sidecar.MAGIC:
+            raise IndexFormatException('wrong magic')
+        if version != Sidecar.VERSION:
+            raise IndexFormatException('unsupported version {}'.format(
+                version))
+        typeSize = Sidecar._type.size + ResTable_config.len
+        expected = Sidecar._header.size + chunkCount * Sidecar._chunk.size + \
+                poolCount * Sidecar._pool.size + typeCount * typeSize
+        if len(b) < expected:
+            raise IndexFormatException('file too short')
+
+        offset = Sidecar._header.size
+        chunks = [Sidecar._chunk.unpack_from(b, offset + i *
+            Sidecar._chunk.size) for i in range(chunkCount)]
+        offset += chunkCount * Sidecar._chunk.size
+        pools = [Sidecar._pool.unpack_from(b, offset + i * Sidecar._pool.size)
+                for i in range(poolCount)]
+        offset += poolCount * Sidecar._pool.size
+        types = []
+        for i in range(typeCount):
+            pkgid, typeId, res0, _, count, offsets, entries, chunk = \
+                    Sidecar._type.unpack_from(b, offset)
+            config, _ = ResTable_config.from_bytes(bytes(b[offset +
+                Sidecar._type.size:offset + typeSize]))
+            types.append((pkgid, typeId, res0, count, offsets, entries, chunk,
+                config))
+            offset += typeSize
+
+        return Sidecar(size, checksum, chunks, pools, types), b[offset:]
+
+    ## Writes sidecar to PATH
+    def write(self, path):
+        with open(path, 'wb') as f:
+            f.write(bytes(self))
+
+    ## Reads sidecar from PATH
+    def load(path):
+        with open(path, 'rb') as f:
+            sidecar, _ = Sidecar.from_bytes(f.read())
+        return sidecar
+
+
+## \class IndexedTable
+# \brief Table file accessed through its Sidecar, without parsing it
+# \details Only the fields needed for a lookup are read from the file.
+class IndexedTable:
+
+    def __init__(self, f, sidecar, verify=False):
+        ## File object of the table, opened in binary mode
+        self.file = f
+        ## Sidecar of the table
+        self.sidecar = sidecar
+
+        size = os.fstat(f.fileno()).st_size
+        if size != sidecar.size:
+            raise IndexFormatException('table size does not match index')
+        if verify:
+            f.seek(0)
+            if Sidecar.digest(f.read()) != sidecar.checksum:
+                raise IndexFormatException('table checksum does not match '
+                        'index')
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read(self, offset, size):
+        self.file.seek(offset)
+        return self.file.read(size)
+
+    ## Returns offset of entry INDEX of type described by RECORD
+    # \details Returns None if entry is not defined there.
+    def _entry_offset(self, record, index):
+        _, _, res0, count, offsets, entries, _, _ = record
+        if res0 & ResTable_type.FLAG_SPARSE:
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                found, offset = struct.unpack('<HH', self._read(offsets +
+                    4 * middle, 4))
+                if found == index:
+                    return entries + offset * 4
+                if found < index:
+                    low = middle + 1
+                else:
+                    high = middle
+            return None
+        if index >= count:
+            return None
+        offset, = struct.unpack('<I', self._read(offsets + 4 * index, 4))
+        if offset == ResTable_type.NO_ENTRY:
+            return None
+        return entries + offset
+
+    ## Reads ResTable_entry at OFFSET
+    # \details First read takes 16 bytes: whole simple entry (header and
+    # Res_value) or header of complex one with its first map value. Rest of
+    # the entry, if any, is read after that.
+    def _entry(self, offset):
+        b = self._read(offset, 16)
+        size, flags = struct.unpack_from('<HH', b)
+        if flags & ResTable_entry.FLAG_COMPLEX:
+            count, = struct.unpack_from('<I', b, 12)
+            length = size + count * 12
+        else:
+            length = size + 8
+        if length > len(b):
+            b += self._read(offset + len(b), length - len(b))
+        entry, _ = ResTable_entry.from_bytes(b[:length])
+        return entry
+
+    ## Returns ResTable_entry of RESID in configuration CONFIG
+    # \details Default configuration is used, if CONFIG is None. Returns
+    # None, if entry is not defined there.
+    def entry(self, resid, config=None):
+        if config is None:
+            config = ResTable_config()
+        for record in self.sidecar.byType.get((resid >> 24,
+                (resid >> 16) & 0xff), []):
+            if record[7].same_qualifiers(config):
+                offset = self._entry_offset(record, resid & 0xffff)
+                if offset is not None:
+                    return self._entry(offset)
+        return None
+
+    ## Returns ResTable_entry of RESID, that matches DEVICE best
+    def resolve(self, resid, device):
+        def compare(lhs, rhs):
+            if lhs[7].isBetterThan(rhs[7], device):
+                return -1
+            if rhs[7].isBetterThan(lhs[7], device):
+                return 1
+            return 0
+
+        records = [r for r in self.sidecar.byType.get((resid >> 24,
+            (resid >> 16) & 0xff), []) if r[7].match(device)]
+        records.sort(key=cmp_to_key(compare))
+        for record in records:
+            offset = self._entry_offset(record, resid & 0xffff)
+            if offset is not None:
+                return self._entry(offset)
+        return None
+
+    ## Returns string INDEX of value string pool
+    def string(self, index):
+        _, count, flags, refs, strings = self.sidecar.pools[0]
+        if index >= count:
+            raise IndexError('string index out of range')
+        ref, = struct.unpack('<I', self._read(refs + 4 * index, 4))
+        utf8 = bool(flags & ResStringPool_header.Flags.UTF8_FLAG)
+        prefix = self._read(strings + ref, 4)
+        size = ResStringPool._raw_length(prefix, utf8)
+        pool = ResStringPool(ResStringPool_header(flags=flags),
+                strings=[self._read(strings + ref, size)])
+        return pool.string(0)
+
+    ## Opens table file at PATH with sidecar INDEX
+    # \details INDEX is either Sidecar or path to .arscidx file. If VERIFY is
+    # set, checksum of the whole file is checked.
+    def open(path, index, verify=False):
+        if not isinstance(index, Sidecar):
+            index = Sidecar.load(index)
+        f = open(path, 'rb')
+        try:
+            return IndexedTable(f, index, verify)
+        except Exception:
+            f.close()
+            raise
+
+
+class SidecarTests(unittest.TestCase):
+
+    def tv1_bytes(size=0x30):
+        from arsc.merge import MergeTests
+        return MergeTests.sample(size, default={'app_name': 'App',
+            'title': 'Title'}, de={'title': 'Titel'})
+
+    def test_build(self):
+        invector = Sidecar.build(SidecarTests.tv1_bytes())
+        expected = ([ResourceType.RES_TABLE_TYPE,
+            ResourceType.RES_STRING_POOL_TYPE,
+            ResourceType.RES_TABLE_PACKAGE_TYPE,
+            ResourceType.RES_STRING_POOL_TYPE,
+            ResourceType.RES_STRING_POOL_TYPE,
+            ResourceType.RES_TABLE_TYPE_SPEC_TYPE,
+            ResourceType.RES_TABLE_TYPE_TYPE,
+            ResourceType.RES_TABLE_TYPE_TYPE], 3, 2)
+        actual = ([c[0] for c in invector.chunks], len(invector.pools),
+                len(invector.types))
+
+        self.assertEqual(expected, actual)
+
+    def test_bytes_roundtrip(self):
+        invector = Sidecar.build(SidecarTests.tv1_bytes())
+        expected = invector, b'\x13\x37'
+        actual = Sidecar.from_bytes(bytes(invector) + b'\x13\x37')
+
+        self.assertEqual(expected, actual)
+
+    def test_wrong_magic(self):
+        with self.assertRaises(Exception) as cm:
+            invector = Sidecar.from_bytes(bytes(Sidecar._header.size))
+
+        expected = 'wrong index format: wrong magic'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_indexed_table(self):
+        for size in (0x30, ResTable_config.len):
+            with self.subTest(size=size):
+                self.check_indexed_table(SidecarTests.tv1_bytes(size))
+
+    def check_indexed_table(self, b):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            Sidecar.build(b).write(path + Sidecar.SUFFIX)
+            with IndexedTable.open(path, path + Sidecar.SUFFIX,
+                    verify=True) as invector:
+                de = ResTable_config(locale=ResTable_config.Locale('de'))
+                expected = ['Title', 'Titel', 'App', None]
+                actual = [
+                        invector.string(invector.entry(0x7f010001).value.data
+                            .integer),
+                        invector.string(invector.resolve(0x7f010001, de).value
+                            .data.integer),
+                        invector.string(invector.resolve(0x7f010000, de).value
+                            .data.integer),
+                        invector.entry(0x7f010000, de)]
+
+        self.assertEqual(expected, actual)
+
+    def test_entry_reads(self):
+        b = SidecarTests.tv1_bytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b)
+            with IndexedTable.open(path, Sidecar.build(b)) as invector:
+                reads = []
+                read = invector._read
+
+                def counting(offset, size):
+                    reads.append(size)
+                    return read(offset, size)
+
+                invector._read = counting
+                entry = invector.entry(0x7f010001)
+                sizes = list(reads)
+                value = invector.string(entry.value.data.integer)
+        # slot in offset array, then the whole entry
+        expected = ([4, 16], 'Title')
+        actual = (sizes, value)
+
+        self.assertEqual(expected, actual)
+
+    def test_indexed_table_size_mismatch(self):
+        b = SidecarTests.tv1_bytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resources.arsc')
+            with open(path, 'wb') as f:
+                f.write(b + bytes(4))
+            with self.assertRaises(Exception) as cm:
+                IndexedTable.open(path, Sidecar.build(b))
+
+        expected = 'wrong index format: table size does not match index'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
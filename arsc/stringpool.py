@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 ## \file stringpool.py
 # \brief ResStringPool and related
+import struct
 import unittest
+from itertools import islice
 from arsc.type.uint32 import uint32
 from arsc.type.flag import Flag
 from arsc.chunk import ResChunk_header
 from arsc.table import ResTable_header
 from arsc.types import ResourceType
+from arsc.tracked import Tracked
 from arsc.exceptions import WrongTypeException
 from arsc.exceptions import ChunkHeaderWrongTypeException
+from arsc.exceptions import StringTooLongException
 
 ## \class ResStringPool_header
 #
@@ -135,7 +139,7 @@ class ResStringPool_header:
 
 
 ## \class ResStringPool
-class ResStringPool:
+class ResStringPool(Tracked):
 
     ## Converts every element of list to newtype
     def _convert_list_elements(l, newtype):
@@ -154,10 +158,11 @@ class ResStringPool:
     ## Splits BUF into list of buffers, whose lengths are in LENGTH_LIST
     def _split_variable_length_strings(buf, length_list):
         ret = []
-        b = buf
+        # slicing a view does not copy the rest of buffer on every string
+        b = memoryview(buf)
         for l in length_list:
             e, b = b[:l], b[l:]
-            ret.append(e)
+            ret.append(bytes(e))
         return ret
 
     ## Counts lengths between offsets and returns them as list
@@ -234,6 +239,10 @@ class ResStringPool:
         # Each entry in the style table is an array of ResStringPool_span
         # structures.
         self.styles = styles
+        # lists of strings and references were made for this pool (their
+        # elements are even converted above), so set_string() may edit them
+        # in place
+        self._owner = id(self)
 
     def __str__(self):
         return '{{header={header}, strrefs={strrefs}, stylerefs={stylerefs}, ' \
@@ -260,26 +269,36 @@ class ResStringPool:
     def __len__(self):
         return len(bytes(self))
 
+    ## Drops index of strings, when they are replaced
+    # \details Lists assigned from outside may be shared, so set_string()
+    # has to copy them before editing.
+    def __setattr__(self, name, value):
+        Tracked.__setattr__(self, name, value)
+        if name == 'strings':
+            self.__dict__.pop('_index', None)
+        if name in ('strings', 'strrefs'):
+            self.__dict__.pop('_owner', None)
+
+    def snapshot(self):
+        return (bytes(self.header), tuple(self.strrefs),
+                tuple(self.stylerefs), tuple(self.strings),
+                tuple(self.styles))
+
     def __bytes__(self):
+        if not self.is_dirty():
+            return bytes(self.source())
         header = bytes(self.header)
 
         # FIXME: determine position and order of strings and styles using header
-        strrefs = bytes()
-        for ref in self.strrefs:
-            strrefs += bytes(ref)
-
-        stylerefs = bytes()
-        for ref in self.stylerefs:
-            stylerefs += bytes(ref)
+        # offsets are all little-endian, pack them at once
+        strrefs = struct.pack('<{}I'.format(len(self.strrefs)),
+                *(ref.integer for ref in self.strrefs))
+        stylerefs = struct.pack('<{}I'.format(len(self.stylerefs)),
+                *(ref.integer for ref in self.stylerefs))
 
-        strings = bytes()
-        for s in self.strings:
-            strings += bytes(s)
-        styles = bytes()
-        for s in self.styles:
-            styles += bytes(s)
-
-        return header + strrefs + stylerefs + strings + styles
+        return b''.join([header, strrefs, stylerefs] +
+                [bytes(s) for s in self.strings] +
+                [bytes(s) for s in self.styles])
 
     def from_bytes(b, little=True):
         content = b
@@ -331,6 +350,192 @@ class ResStringPool:
         return ResStringPool(header, strrefs, stylerefs, strings,
                 styles), rest
 
+    ## Decodes length prefix of UTF-8 string at POS, returns it and new POS
+    def _decode_length8(raw, pos):
+        length = raw[pos]
+        if length & 0x80:
+            return ((length & 0x7f) << 8) | raw[pos + 1], pos + 2
+        return length, pos + 1
+
+    ## Decodes length prefix of UTF-16 string at POS, returns it and new POS
+    def _decode_length16(raw, pos):
+        length = raw[pos] | (raw[pos + 1] << 8)
+        if length & 0x8000:
+            low = raw[pos + 2] | (raw[pos + 3] << 8)
+            return ((length & 0x7fff) << 16) | low, pos + 4
+        return length, pos + 2
+
+    ## Encodes LENGTH as prefix of UTF-8 string
+    # \details Two bytes hold at most 0x7fff, longer strings can not be
+    # stored in UTF-8 pool.
+    def _encode_length8(length):
+        if length > 0x7fff:
+            raise StringTooLongException(length, 0x7fff)
+        if length > 0x7f:
+            return bytes([0x80 | (length >> 8), length & 0xff])
+        return bytes([length])
+
+    def _encode_length16(length):
+        if length > 0x7fff:
+            high = 0x8000 | (length >> 16)
+            return bytes([high & 0xff, high >> 8, length & 0xff,
+                (length >> 8) & 0xff])
+        return bytes([length & 0xff, length >> 8])
+
+    ## Checks whether strings of this pool are encoded in UTF-8
+    def is_utf8(self):
+        return bool(self.header.flags & ResStringPool_header.Flags.UTF8_FLAG)
+
+    ## Returns length of encoded string RAW, without padding that may follow
+    def _raw_length(raw, utf8):
+        if utf8:
+            _, pos = ResStringPool._decode_length8(raw, 0)
+            length, pos = ResStringPool._decode_length8(raw, pos)
+            return pos + length + 1
+        length, pos = ResStringPool._decode_length16(raw, 0)
+        return pos + length * 2 + 2
+
+    ## Returns string at INDEX decoded to str
+    def string(self, index):
+        raw = self.strings[index]
+        if self.is_utf8():
+            _, pos = ResStringPool._decode_length8(raw, 0)
+            length, pos = ResStringPool._decode_length8(raw, pos)
+            return raw[pos:pos + length].decode('utf-8', 'replace')
+        length, pos = ResStringPool._decode_length16(raw, 0)
+        return raw[pos:pos + length * 2].decode('utf-16-le', 'replace')
+
+    ## Encodes string S as stored in pool of given encoding
+    # \details First prefix of UTF-8 string is its length in UTF-16 units,
+    # so characters outside of BMP count twice.
+    def encode_string(s, utf8=True):
+        if utf8:
+            encoded = s.encode('utf-8')
+            units = len(s.encode('utf-16-le')) // 2
+            return ResStringPool._encode_length8(units) + \
+                    ResStringPool._encode_length8(len(encoded)) + \
+                    encoded + b'\0'
+        encoded = s.encode('utf-16-le')
+        return ResStringPool._encode_length16(len(encoded) // 2) + \
+                encoded + b'\0\0'
+
+    ## Returns index of string S in the pool, None if it is not there
+    # \details Dictionary of all strings is built on first call. It is
+    # dropped whenever strings are replaced (see __setattr__()) and rebuilt
+    # if number of strings changes, eg. when list of strings is appended to.
+    def index(self, s):
+        index = self.__dict__.get('_index')
+        if index is None or index[0] != len(self.strings):
+            lookup = {}
+            for i in range(len(self.strings)):
+                lookup.setdefault(self.string(i), i)
+            index = (len(self.strings), lookup)
+            self._index = index
+        return index[1].get(s)
+
+    ## Returns list of raw strings without padding after the last one
+    def _unpadded(self):
+        raws = list(self.strings)
+        if len(raws) > 0:
+            raws[-1] = raws[-1][:ResStringPool._raw_length(raws[-1],
+                self.is_utf8())]
+        return raws
+
+    ## Lays out RAWS as strings of this pool
+    # \details Returns new header, list of string references and RAWS with
+    # last one padded. Styles of this pool are kept.
+    def _layout(self, raws):
+        strrefs = []
+        offset = 0
+        for raw in raws:
+            strrefs.append(uint32(offset, little=True))
+            offset += len(raw)
+        padded = (offset + 3) & ~3
+        if len(raws) > 0:
+            raws[-1] = raws[-1] + bytes(padded - offset)
+
+        stylesLength = sum(len(st) for st in self.styles)
+
+        headerLength = self.header.header.headerSize.integer
+        stringsStart = headerLength + 4 * (len(strrefs) + len(self.stylerefs))
+        stylesStart = stringsStart + padded if len(self.styles) > 0 else 0
+        if len(raws) == 0:
+            stringsStart = 0
+        size = headerLength + 4 * (len(strrefs) + len(self.stylerefs)) + \
+                padded + stylesLength
+
+        header = ResStringPool_header(ResChunk_header(
+            ResourceType.RES_STRING_POOL_TYPE, headerLength, size),
+            len(raws), len(self.stylerefs), self.header.flags, stringsStart,
+            stylesStart)
+
+        return header, strrefs, raws
+
+    ## Returns new pool with strings of this one followed by STRINGS
+    # \details Indices of strings already present do not change, so anything
+    # referencing this pool stays valid for the new one. Header is
+    # recomputed.
+    def extended(self, strings):
+        utf8 = self.is_utf8()
+        raws = self._unpadded()
+        raws += [ResStringPool.encode_string(s, utf8) for s in strings]
+        header, strrefs, raws = self._layout(raws)
+
+        stylerefs = [uint32(r.integer, little=True) for r in self.stylerefs]
+        return ResStringPool(header, strrefs, stylerefs, raws,
+                list(self.styles))
+
+    ## Replaces string at INDEX with S
+    # \details Only the string itself, references of following strings and
+    # sizes in header are updated, other strings are not touched. Lists of
+    # the pool are edited in place, unless they may be shared with another
+    # pool (eg. its shallow copy) - then they are copied first. Pool is
+    # marked dirty and its index (see index()) is dropped.
+    def set_string(self, index, s):
+        utf8 = self.is_utf8()
+        raw = ResStringPool.encode_string(s, utf8)
+        owned = self.__dict__.get('_owner') == id(self)
+        strings = self.strings if owned else list(self.strings)
+        last = len(strings) - 1
+        # padding of string data is kept after the last string
+        tail = strings[last][:ResStringPool._raw_length(strings[last], utf8)]
+        oldLength = self.strrefs[last].integer + len(tail)
+        oldPadded = self.strrefs[last].integer + len(strings[last])
+        if index == last:
+            delta = len(raw) - len(tail)
+            tail = raw
+        else:
+            delta = len(raw) - len(strings[index])
+            strings[index] = raw
+        length = oldLength + delta
+        padded = (length + 3) & ~3
+        strings[last] = tail + bytes(padded - length)
+
+        if owned:
+            strrefs = self.strrefs
+            if delta != 0:
+                for ref in islice(strrefs, index + 1, None):
+                    ref.integer += delta
+        else:
+            strrefs = self.strrefs[:index + 1] + \
+                    [uint32(ref.integer + delta, little=True)
+                            for ref in self.strrefs[index + 1:]]
+
+        # header is replaced, as it may be shared with copies of the pool
+        old = self.header
+        grow = padded - oldPadded
+        stylesStart = old.stylesStart.integer
+        if stylesStart != 0:
+            stylesStart += grow
+        self.header = ResStringPool_header(ResChunk_header(
+            ResourceType.RES_STRING_POOL_TYPE, old.header.headerSize.integer,
+            old.header.size.integer + grow), old.stringCount.integer,
+            old.styleCount.integer, old.flags, old.stringsStart.integer,
+            stylesStart)
+        self.strrefs = strrefs
+        self.strings = strings
+        self._owner = id(self)
+
 
 class ResStringPool_headerTests(unittest.TestCase):
 
@@ -474,3 +679,155 @@ class ResStringPoolTests(unittest.TestCase):
         actual = ResStringPool.from_bytes(invector)
 
         self.assertEqual(expected, actual)
+
+    def test_string_utf8(self):
+        invector = ResStringPoolTests.tv1_obj
+        expected = ['attr', 'drawable', 'id']
+        actual = [invector.string(0), invector.string(1), invector.string(9)]
+
+        self.assertEqual(expected, actual)
+
+    def test_string_utf16(self):
+        invector = ResStringPool(strings=[b'\2\0d\0e\0\0\0'])
+        expected = 'de'
+        actual = invector.string(0)
+
+        self.assertEqual(expected, actual)
+
+    def test_encode_string(self):
+        invector = 'drawable'
+        expected = b'\x08\x08drawable\0'
+        actual = ResStringPool.encode_string(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_encode_long_string(self):
+        invector = 'a' * 200
+        expected = b'\x80\xc8\x80\xc8' + b'a' * 200 + b'\0'
+        actual = ResStringPool.encode_string(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_encode_string_outside_bmp(self):
+        invector = 'a\U0001f600'
+        expected = b'\x03\x05a\xf0\x9f\x98\x80\0'
+        actual = ResStringPool.encode_string(invector)
+
+        self.assertEqual(expected, actual)
+
+    def test_encode_too_long_string(self):
+        with self.assertRaises(StringTooLongException):
+            ResStringPool.encode_string('a' * 0x8000)
+        expected = b'\xff\xff'
+        actual = ResStringPool.encode_string('a' * 0x7fff)[:2]
+
+        self.assertEqual(expected, actual)
+
+    def test_index(self):
+        invector = ResStringPoolTests.tv1_obj
+        expected = (6, None)
+        actual = (invector.index('string'), invector.index('nope'))
+
+        self.assertEqual(expected, actual)
+
+    def test_index_after_set_string(self):
+        invector, _ = ResStringPool.from_bytes(ResStringPoolTests.tv1_bytes)
+        invector.index('string')
+        invector.set_string(6, 'changed')
+        expected = (6, None)
+        actual = (invector.index('changed'), invector.index('string'))
+
+        self.assertEqual(expected, actual)
+
+    def test_index_after_append(self):
+        invector, _ = ResStringPool.from_bytes(ResStringPoolTests.tv1_bytes)
+        invector.index('string')
+        invector.strings.append(ResStringPool.encode_string('added',
+            invector.is_utf8()))
+        expected = len(invector.strings) - 1
+        actual = invector.index('added')
+
+        self.assertEqual(expected, actual)
+
+    def test_extended_without_strings_is_same(self):
+        invector = ResStringPoolTests.tv1_obj
+        expected = ResStringPoolTests.tv1_bytes
+        actual = bytes(invector.extended([]))
+
+        self.assertEqual(expected, actual)
+
+    def test_extended(self):
+        invector = ResStringPoolTests.tv1_obj.extended(['bool'])
+        expected = (11, 'id', 'bool', 0x48, len(bytes(invector)))
+        actual = (invector.header.stringCount.integer, invector.string(9),
+                invector.string(10), invector.header.stringsStart.integer,
+                invector.header.header.size.integer)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(0, len(bytes(invector)) % 4)
+
+    def test_set_string(self):
+        invector = ResStringPool.from_bytes(ResStringPoolTests.tv1_bytes)[0]
+        invector.set_string(9, 'identifier')
+        expected = (['attr', 'identifier'], 156, True)
+        actual = ([invector.string(0), invector.string(9)],
+                invector.header.header.size.integer, invector.is_dirty())
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(len(invector), invector.header.header.size.integer)
+
+    def utf8_pool(strings):
+        return ResStringPool(ResStringPool_header(
+            flags=ResStringPool_header.Flags.UTF8_FLAG)).extended(strings)
+
+    def test_set_string_is_like_new_pool(self):
+        strings = ['a', 'bc', 'def', 'ghij', 'k']
+        for flags in (ResStringPool_header.Flags.UTF8_FLAG, 0):
+            for index in (0, 2, 4):
+                for s in ('', 'xy', 'long replacement'):
+                    edited = list(strings)
+                    edited[index] = s
+                    header = ResStringPool_header(flags=flags)
+                    invector = ResStringPool(header).extended(strings)
+                    invector.set_string(index, s)
+                    expected = bytes(ResStringPool(header).extended(edited))
+                    actual = bytes(invector)
+
+                    self.assertEqual(expected, actual)
+
+    def test_set_string_copies_shared_lists(self):
+        import copy
+        pool = ResStringPoolTests.utf8_pool(['a', 'b', 'c'])
+        expected = bytes(pool)
+        invector = copy.copy(pool)
+        invector.set_string(0, 'changed')
+        actual = bytes(pool)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual('changed', invector.string(0))
+
+    def test_set_string_keeps_other_strings(self):
+        invector = ResStringPoolTests.utf8_pool(['a', 'b', 'c', 'd'])
+        before = list(invector.strings)
+        invector.set_string(1, 'changed')
+        expected = [True, False, True, False]
+        actual = [a is b for a, b in zip(before, invector.strings)]
+
+        self.assertEqual(expected, actual)
+
+    def test_set_string_in_large_pool(self):
+        import time
+        from arsc.arsc import ResTable
+        from arsc.bench import generate
+        # about 10 MB table with 50000 values; encoding whole pool again
+        # took seconds
+        table, _ = ResTable.from_bytes(bytes(generate(entries=50000)))
+        start = time.perf_counter()
+        table.values.set_string(5, 'hello')
+        b = bytes(table)
+        elapsed = time.perf_counter() - start
+        expected = 'hello'
+        actual = ResTable.from_bytes(b)[0].values.string(5)
+
+        self.assertEqual(expected, actual)
+        self.assertLess(elapsed, 0.5)
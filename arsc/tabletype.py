@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 ## \file type.py
 # \brief ResTable_typeSpec and ResTable_type
+import struct
 import unittest
 from arsc.type.uint8 import uint8
 from arsc.type.uint16 import uint16
 from arsc.type.uint32 import uint32
 from arsc.chunk import ResChunk_header
 from arsc.types import ResourceType
+from arsc.tracked import Tracked
 from arsc.config import ResTable_config
+from arsc.config import ResTable_configPool
+from arsc.entry import ResTable_entry
+from arsc.entry import Res_value
 from arsc.exceptions import WrongTypeException
 from arsc.exceptions import ChunkHeaderWrongTypeException
 
@@ -100,7 +105,7 @@ class ResTable_typeSpec_header:
 
 
 ## \class ResTable_typeSpec
-class ResTable_typeSpec:
+class ResTable_typeSpec(Tracked):
 
     def __init__(self, header=None, configs=None):
         if header is None:
@@ -132,7 +137,12 @@ class ResTable_typeSpec:
     def __len__(self):
         return len(bytes(self))
 
+    def snapshot(self):
+        return (bytes(self.header), Tracked.frozen(self.configs))
+
     def __bytes__(self):
+        if not self.is_dirty():
+            return bytes(self.source())
         header = bytes(self.header)
         configs = bytes(self.configs)
 
@@ -166,7 +176,7 @@ class ResTable_type_header:
     len = 0x44
 
     def __init__(self, header=None, id=1, res0=0, res1=0, entryCount=0,
-            entriesStart=0, config=None):
+            entriesStart=0, config=None, configId=None):
         if header is None:
             header = ResChunk_header(ResourceType.RES_TABLE_TYPE_TYPE,
                     headerSize=ResTable_type_header.len,
@@ -211,7 +221,12 @@ class ResTable_type_header:
         ## Number of uint32_t entry configuration masks that follow.
         self.entryCount = entryCount
         self.entriesStart = entriesStart
+        ## Configuration of this chunk, shared with other chunks of the table
+        #  using the same configuration
         self.config = config
+        ## Id of config in table.ResTable_configPool of the table, None if
+        #  chunk does not belong to any table yet
+        self.configId = configId
 
     def __str__(self):
         return '{{header={header}, id={id}, res0={res0}, res1={res1}, '\
@@ -253,21 +268,34 @@ class ResTable_type_header:
 
         return header + id + res0 + res1 + entryCount + entriesStart + config
 
-    def from_bytes(b, little=True):
+    ## Deserializes header from B
+    # \details If CONFIGS pool is given, configuration is interned in it.
+    def from_bytes(b, little=True, configs=None):
         header, b = ResChunk_header.from_bytes(b)
         id, b = uint8.from_bytes(b)
         res0, b = uint8.from_bytes(b)
         res1, b = uint16.from_bytes(b, True)
         entryCount, b = uint32.from_bytes(b, True)
         entriesStart, b = uint32.from_bytes(b, True)
-        config, b = ResTable_config.from_bytes(b)
+        if configs is None:
+            configId = None
+            config, b = ResTable_config.from_bytes(b)
+        else:
+            configId, b = configs.intern_bytes(b)
+            config = configs[configId]
 
         return ResTable_type_header(header, id, res0, res1, entryCount,
-                entriesStart, config), b
+                entriesStart, config, configId), b
 
 
 ## \class ResTable_type
-class ResTable_type:
+class ResTable_type(Tracked):
+
+    ## Value of offset meaning that entry is not defined in this configuration
+    NO_ENTRY = 0xffffffff
+    ## Flag in res0, entry offsets are stored as pairs of uint16 (entry index
+    #  and offset divided by 4) sorted by index
+    FLAG_SPARSE = 0x01
 
     def __init__(self, header=None, rest=None):
         if header is None:
@@ -299,14 +327,83 @@ class ResTable_type:
     def __len__(self):
         return len(bytes(self))
 
+    def snapshot(self):
+        return (bytes(self.header), Tracked.frozen(self.rest))
+
     def __bytes__(self):
+        if not self.is_dirty():
+            return bytes(self.source())
         header = bytes(self.header)
         rest = bytes(self.rest)
 
         return header + rest
 
-    def from_bytes(b, little=True):
-        header, b = ResTable_type_header.from_bytes(b)
+    ## Returns list of entry offsets relative to entriesStart
+    # \details List is indexed by entry index, undefined entries are
+    # NO_ENTRY. Whole array is decoded with single struct unpack.
+    def entry_offsets(self):
+        count = self.header.entryCount.integer
+        if self.header.res0.integer & ResTable_type.FLAG_SPARSE:
+            pairs = struct.unpack_from('<{}H'.format(count * 2), self.rest)
+            indices = pairs[0::2]
+            offsets = [ResTable_type.NO_ENTRY] * \
+                    (indices[-1] + 1 if count > 0 else 0)
+            for index, offset in zip(indices, pairs[1::2]):
+                offsets[index] = offset * 4
+            return offsets
+
+        return list(struct.unpack_from('<{}I'.format(count), self.rest))
+
+    ## Returns ResTable_entry with index INDEX, None if it is not defined
+    def entry(self, index, offsets=None):
+        if offsets is None:
+            offsets = self.entry_offsets()
+        if index >= len(offsets) or offsets[index] == ResTable_type.NO_ENTRY:
+            return None
+        start = self.header.entriesStart.integer - \
+                self.header.header.headerSize.integer + offsets[index]
+        entry, _ = ResTable_entry.from_bytes(self.rest[start:])
+        return entry
+
+    ## Returns list of all entries, indexed by entry index
+    # \details Undefined entries are None.
+    def entries(self):
+        offsets = self.entry_offsets()
+        return [self.entry(i, offsets) for i in range(len(offsets))]
+
+    ## Creates chunk holding ENTRIES
+    # \details ENTRIES is list of serialized entries or None for undefined
+    # ones. Chunk uses dense array of offsets. Fields of HEADER are copied
+    # except for sizes, entryCount and entriesStart, which are computed.
+    # Header size follows size of the configuration (aapt2 writes 0x40 bytes
+    # long ones), not the header size of HEADER.
+    def from_entries(header, entries):
+        offsets = []
+        data = []
+        offset = 0
+        for entry in entries:
+            if entry is None:
+                offsets.append(ResTable_type.NO_ENTRY)
+                continue
+            offsets.append(offset)
+            data.append(entry)
+            offset += len(entry)
+        # fields before configuration take 0x14 bytes
+        headerSize = 0x14 + len(bytes(header.config))
+        entriesStart = headerSize + 4 * len(offsets)
+        rest = struct.pack('<{}I'.format(len(offsets)), *offsets) + \
+                b''.join(data)
+
+        header = ResTable_type_header(ResChunk_header(
+            ResourceType.RES_TABLE_TYPE_TYPE, headerSize,
+            headerSize + len(rest)), header.id, header.res0.integer &
+            ~ResTable_type.FLAG_SPARSE, header.res1, len(offsets),
+            entriesStart, header.config, header.configId)
+
+        return ResTable_type(header, rest)
+
+    def from_bytes(b, little=True, configs=None):
+        header, b = ResTable_type_header.from_bytes(b, configs=configs)
         # FIXME: implement object contents
         restlen = header.header.size.integer - header.header.headerSize.integer
         rest, b = b[:restlen], b[restlen:]
@@ -493,6 +590,21 @@ class ResTable_typeTests(unittest.TestCase):
                 ((b'\x08' + bytes(7)) * 4)
             )
 
+    # three entries, second one undefined
+    tv3_obj = \
+            ResTable_type(
+                ResTable_type_header(
+                    ResChunk_header(
+                        ResourceType.RES_TABLE_TYPE_TYPE, 68, 112
+                    ),
+                    2, 0, 0, 3, 80,
+                    ResTable_config(0x30)
+                ),
+                b'\0\0\0\0\xff\xff\xff\xff\x10\0\0\0' + \
+                b'\x08\0\0\0\0\0\0\0\x08\0\0\x03\x01\0\0\0' + \
+                b'\x08\0\0\0\x02\0\0\0\x08\0\0\x10\x05\0\0\0'
+            )
+
     def test_str(self):
         invector = ResTable_typeTests.tv1_obj
         expected = '{header={header={type=ResourceType.RES_TABLE_TYPE_TYPE, ' \
@@ -536,3 +648,71 @@ class ResTable_typeTests(unittest.TestCase):
         actual = ResTable_type.from_bytes(invector)
 
         self.assertEqual(expected, actual)
+
+    def test_entry_offsets(self):
+        invector = ResTable_type(ResTable_type_header(entryCount=3),
+                b'\0\0\0\0\xff\xff\xff\xff\x10\0\0\0')
+        expected = [0, ResTable_type.NO_ENTRY, 0x10]
+        actual = invector.entry_offsets()
+
+        self.assertEqual(expected, actual)
+
+    def test_entry_offsets_sparse(self):
+        invector = ResTable_type(ResTable_type_header(
+            res0=ResTable_type.FLAG_SPARSE, entryCount=2),
+            b'\1\0\0\0\3\0\4\0')
+        expected = [ResTable_type.NO_ENTRY, 0, ResTable_type.NO_ENTRY, 0x10]
+        actual = invector.entry_offsets()
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes_interns_config(self):
+        configs = ResTable_configPool()
+        lhs, _ = ResTable_type.from_bytes(ResTable_typeTests.tv1_bytes,
+                configs=configs)
+        rhs, _ = ResTable_type.from_bytes(ResTable_typeTests.tv1_bytes,
+                configs=configs)
+        expected = (0, 0, 1)
+        actual = (lhs.header.configId, rhs.header.configId, len(configs))
+
+        self.assertEqual(expected, actual)
+        self.assertIs(lhs.header.config, rhs.header.config)
+
+    def test_entry(self):
+        invector = ResTable_typeTests.tv3_obj
+        expected = ResTable_entry(8, 0, 2, Res_value(8, 0,
+            Res_value.TYPE_INT_DEC, 5))
+        actual = invector.entry(2)
+
+        self.assertEqual(expected, actual)
+
+    def test_entries(self):
+        invector = ResTable_typeTests.tv3_obj
+        expected = [ResTable_entry(8, 0, 0, Res_value(8, 0,
+            Res_value.TYPE_STRING, 1)), None, ResTable_entry(8, 0, 2,
+                Res_value(8, 0, Res_value.TYPE_INT_DEC, 5))]
+        actual = invector.entries()
+
+        self.assertEqual(expected, actual)
+
+    def test_from_entries(self):
+        invector = [bytes(e) if e is not None else None
+                for e in ResTable_typeTests.tv3_obj.entries()]
+        expected = bytes(ResTable_typeTests.tv3_obj)
+        actual = bytes(ResTable_type.from_entries(
+            ResTable_typeTests.tv3_obj.header, invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_from_entries_config_size(self):
+        from arsc.scan import scan
+        from arsc.config import ResTable_config
+        header = ResTable_type_header(config=ResTable_config(
+            ResTable_config.len))
+        entry = bytes(ResTable_entry())
+        invector = bytes(ResTable_type.from_entries(header, [entry]))
+        chunk, = scan(invector)
+        expected = (0x54, 0x54 + 4 + len(entry), len(invector))
+        actual = (chunk.headerSize, chunk.size, chunk.end())
+
+        self.assertEqual(expected, actual)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+## \file tracked.py
+# \brief Remembering original bytes of parsed chunks
+import unittest
+
+## \class Tracked
+# \brief Base of chunks that can be serialized by copying their source bytes
+# \details Chunk parsed as part of a table remembers view of its original
+# bytes. As long as it is clean, serialization copies these bytes instead of
+# encoding the object. Assigning any public attribute marks the chunk dirty.
+# Changes made deeper, eg. to fields of a header object or to lists of
+# contained chunks, are found by comparing snapshot() taken when the chunk
+# was tracked with the current one.
+#
+# Chunks that were created directly, not parsed, have no source and are
+# always considered dirty.
+class Tracked:
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if not name.startswith('_') and \
+                self.__dict__.get('_source') is not None:
+            object.__setattr__(self, '_dirty', True)
+
+    ## Remembers SOURCE as original bytes of the chunk and marks it clean
+    # \details SOURCE is usually memoryview into buffer the table was parsed
+    # from, so no bytes are copied.
+    def track(self, source):
+        object.__setattr__(self, '_source', source)
+        object.__setattr__(self, '_dirty', False)
+        object.__setattr__(self, '_snapshot', self.snapshot())
+
+    ## Returns tuple describing contents, that assignment does not reveal
+    # \details Subclasses return encoded header and tuples of contained
+    # objects, so edits of nested objects and lists change the snapshot.
+    # Elements are compared by identity first, so unchanged ones are cheap to
+    # check. Mutable buffers have to be copied, see frozen().
+    def snapshot(self):
+        return ()
+
+    ## Returns VALUE, or its copy as bytes if it may change in place
+    def frozen(value):
+        if isinstance(value, (bytearray, list)):
+            return bytes(value)
+        return value
+
+    ## Returns original bytes of the chunk, None if it was not parsed
+    def source(self):
+        return self.__dict__.get('_source')
+
+    ## Marks chunk as changed, so it is encoded again on serialization
+    def touch(self):
+        object.__setattr__(self, '_dirty', True)
+
+    ## Checks whether serialization has to encode the chunk
+    def is_dirty(self):
+        if self.__dict__.get('_source') is None or self._dirty:
+            return True
+        old = self._snapshot
+        new = self.snapshot()
+        if len(old) != len(new) or \
+                not all(a is b or a == b for a, b in zip(old, new)):
+            object.__setattr__(self, '_dirty', True)
+            return True
+        return False
+
+    ## Returns bytes-like object with serialized chunk
+    # \details For clean chunks this is the source itself, without copying.
+    def buffer(self):
+        if self.is_dirty():
+            return bytes(self)
+        return self.source()
+
+
+class TrackedTests(unittest.TestCase):
+
+    class Chunk(Tracked):
+
+        def __init__(self, value, items=None):
+            self.value = value
+            self.items = [] if items is None else items
+
+        def __bytes__(self):
+            return bytes([self.value] + self.items)
+
+        def snapshot(self):
+            return (tuple(self.items),)
+
+    def test_untracked_is_dirty(self):
+        invector = TrackedTests.Chunk(1)
+        expected = True
+        actual = invector.is_dirty()
+
+        self.assertEqual(expected, actual)
+
+    def test_tracked_is_clean(self):
+        invector = TrackedTests.Chunk(1)
+        invector.track(memoryview(b'\x02'))
+        expected = (False, b'\x02')
+        actual = (invector.is_dirty(), bytes(invector.buffer()))
+
+        self.assertEqual(expected, actual)
+
+    def test_assignment_marks_dirty(self):
+        invector = TrackedTests.Chunk(1)
+        invector.track(memoryview(b'\x02'))
+        invector.value = 3
+        expected = (True, b'\x03')
+        actual = (invector.is_dirty(), invector.buffer())
+
+        self.assertEqual(expected, actual)
+
+    def test_private_assignment_keeps_clean(self):
+        invector = TrackedTests.Chunk(1)
+        invector.track(memoryview(b'\x02'))
+        invector._cache = 3
+        expected = False
+        actual = invector.is_dirty()
+
+        self.assertEqual(expected, actual)
+
+    def test_touch(self):
+        invector = TrackedTests.Chunk(1)
+        invector.track(memoryview(b'\x02'))
+        invector.touch()
+        expected = True
+        actual = invector.is_dirty()
+
+        self.assertEqual(expected, actual)
+
+    def test_nested_edit_marks_dirty(self):
+        invector = TrackedTests.Chunk(1, [2])
+        invector.track(memoryview(b'\x01\x02'))
+        invector.items.append(3)
+        expected = (True, b'\x01\x02\x03')
+        actual = (invector.is_dirty(), invector.buffer())
+
+        self.assertEqual(expected, actual)
+
+    def test_frozen(self):
+        b = bytearray(b'\x01')
+        expected = (b'\x01', bytes, True)
+        frozen = Tracked.frozen(b)
+        b[0] = 2
+        actual = (frozen, type(frozen), Tracked.frozen(frozen) is frozen)
+
+        self.assertEqual(expected, actual)
@@ -27,6 +27,8 @@ class ResourceType(Enum):
     RES_TABLE_PACKAGE_TYPE = 0x0200
     RES_TABLE_TYPE_TYPE = 0x0201
     RES_TABLE_TYPE_SPEC_TYPE = 0x0202
+    ## ResChunk_header is part of \link library.ResTable_lib_header \endlink
+    RES_TABLE_LIBRARY_TYPE = 0x0203
 
 
 class ResourceTypeTests(unittest.TestCase):
@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+## \file xmltree.py
+# \brief Streaming parser of compiled (binary) XML files
+import io
+import struct
+import sys
+import unittest
+from array import array
+from arsc.chunk import ResChunk_header
+from arsc.types import ResourceType
+from arsc.entry import Res_value
+from arsc.stringpool import ResStringPool
+from arsc.exceptions import ChunkHeaderWrongTypeException
+from arsc.exceptions import ChunkOutOfBoundsException
+
+## Index of string that is not set, eg. namespace of attribute without one
+NO_STRING = 0xffffffff
+
+## \class XmlNode
+# \brief Event of XmlParser, base of all of them
+# \details Node keeps string pool of the document and only indices into it,
+# strings are decoded when asked for.
+class XmlNode:
+
+    def __init__(self, chunkType, lineNumber, comment, strings):
+        ## ResourceType of chunk the node was read from
+        self.type = chunkType
+        ## Line in original XML source
+        self.lineNumber = lineNumber
+        ## Index of comment string, NO_STRING if there is none
+        self.comment = comment
+        self._strings = strings
+
+    def __repr__(self):
+        return '{c}({fields})'.format(c=type(self).__name__,
+                fields=', '.join('{}={}'.format(k, repr(v))
+                    for k, v in self._fields()))
+
+    def __str__(self):
+        return '{{{fields}}}'.format(fields=', '.join('{}={}'.format(k, v)
+            for k, v in self._fields()))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and self._fields() == rhs._fields()
+
+    def _fields(self):
+        return [('type', self.type), ('lineNumber', self.lineNumber)]
+
+    ## Returns string INDEX of the document, None for NO_STRING
+    def string(self, index):
+        if index == NO_STRING:
+            return None
+        return self._strings.string(index)
+
+## \class XmlNamespace
+# \brief Start or end of namespace mapping
+class XmlNamespace(XmlNode):
+
+    def __init__(self, chunkType, lineNumber, comment, strings, prefix, uri):
+        super().__init__(chunkType, lineNumber, comment, strings)
+        ## Index of prefix string
+        self.prefixIndex = prefix
+        ## Index of URI string
+        self.uriIndex = uri
+
+    def _fields(self):
+        return super()._fields() + [('prefix', self.prefix()),
+                ('uri', self.uri())]
+
+    def prefix(self):
+        return self.string(self.prefixIndex)
+
+    def uri(self):
+        return self.string(self.uriIndex)
+
+## \class XmlResourceMap
+# \brief Resource ids of attribute names of compiled XML document
+# \details Decoded RES_XML_RESOURCE_MAP_TYPE chunk. First strings of the
+# document pool are names of attributes and the map holds resource id of
+# every one of them, indexed by its string index. Reverse index, from
+# resource id to string index, is built on first use, so attributes can be
+# found by comparing string indices, without decoding any names.
+class XmlResourceMap:
+
+    def __init__(self, ids=None):
+        if ids is None:
+            ids = []
+
+        ## array of uint32 resource ids, indexed by string index
+        self.ids = array('I', ids)
+        self._index = None
+
+    def __str__(self):
+        return '[{}]'.format(', '.join(hex(i) for i in self.ids))
+
+    def __repr__(self):
+        return '{c}({ids})'.format(c=type(self).__name__,
+                ids=repr(list(self.ids)))
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and self.ids == rhs.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bytes__(self):
+        ids = array('I', self.ids)
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        body = ids.tobytes()
+        return bytes(ResChunk_header(ResourceType.RES_XML_RESOURCE_MAP_TYPE,
+            ResChunk_header.ResChunk_header_len,
+            ResChunk_header.ResChunk_header_len + len(body))) + body
+
+    ## Returns resource id of string INDEX, None if it has none
+    def resid(self, index):
+        if index < len(self.ids):
+            return self.ids[index]
+        return None
+
+    ## Returns string index of attribute RESID, None if it is not used
+    def index(self, resid):
+        if self._index is None:
+            self._index = {}
+            for i, r in enumerate(self.ids):
+                self._index.setdefault(r, i)
+        return self._index.get(resid)
+
+    def from_bytes(b, little=True):
+        header, _ = ResChunk_header.from_bytes(b)
+        if header.type != ResourceType.RES_XML_RESOURCE_MAP_TYPE:
+            raise ChunkHeaderWrongTypeException(
+                    ResourceType.RES_XML_RESOURCE_MAP_TYPE, header.type)
+        start = header.headerSize.integer
+        end = header.size.integer
+        ids = array('I')
+        ids.frombytes(bytes(b[start:start + (end - start) // 4 * 4]))
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        return XmlResourceMap(ids), b[end:]
+
+## \class XmlAttribute
+# \brief Attribute of XmlStartElement
+class XmlAttribute:
+
+    ## Size of attribute record
+    size = 20
+
+    def __init__(self, ns, name, rawValue, typedValue, strings, resid=None):
+        ## Index of namespace URI string, NO_STRING if there is none
+        self.nsIndex = ns
+        ## Index of name string
+        self.nameIndex = name
+        ## Index of original value string, NO_STRING if there is none
+        self.rawValueIndex = rawValue
+        ## entry.Res_value with compiled value
+        self.typedValue = typedValue
+        ## Resource id of the attribute from resource map, None if unknown
+        self.resid = resid
+        self._strings = strings
+
+    def __repr__(self):
+        return '{c}({ns}, {name}, {raw}, {value}, {resid})'.format(
+                c=type(self).__name__, ns=repr(self.ns()),
+                name=repr(self.name()), raw=repr(self.rawValue()),
+                value=repr(self.typedValue), resid=self.resid)
+
+    def __eq__(self, rhs):
+        return type(self) == type(rhs) and \
+                self.ns() == rhs.ns() and \
+                self.name() == rhs.name() and \
+                self.rawValue() == rhs.rawValue() and \
+                self.typedValue == rhs.typedValue and \
+                self.resid == rhs.resid
+
+    def _string(self, index):
+        if index == NO_STRING:
+            return None
+        return self._strings.string(index)
+
+    def ns(self):
+        return self._string(self.nsIndex)
+
+    def name(self):
+        return self._string(self.nameIndex)
+
+    def rawValue(self):
+        return self._string(self.rawValueIndex)
+
+    ## Returns value as Python object
+    # \details Strings (raw or typed) are decoded, integers and booleans are
+    # converted, other types are returned as entry.Res_value.
+    def value(self):
+        dataType = self.typedValue.dataType.integer
+        data = self.typedValue.data.integer
+        if dataType == Res_value.TYPE_STRING:
+            return self._string(data)
+        if dataType == Res_value.TYPE_INT_BOOLEAN:
+            return data != 0
+        if dataType in (Res_value.TYPE_INT_DEC, Res_value.TYPE_INT_HEX):
+            return data - (1 << 32) if data & 0x80000000 else data
+        if self.rawValueIndex != NO_STRING:
+            return self.rawValue()
+        return self.typedValue
+
+## \class XmlStartElement
+# \brief Start of element with its attributes
+# \details Attributes are kept as raw records and decoded only when
+# attributes() or attribute() is called.
+class XmlStartElement(XmlNode):
+
+    _ext = struct.Struct('<IIHHHHHH')
+    _attr = struct.Struct('<IIIHBBI')
+    _name = struct.Struct('<I')
+
+    def __init__(self, chunkType, lineNumber, comment, strings, ns, name,
+            attributes=b'', attributeSize=XmlAttribute.size, attributeCount=0,
+            resourceMap=None):
+        super().__init__(chunkType, lineNumber, comment, strings)
+        ## Index of namespace URI string, NO_STRING if there is none
+        self.nsIndex = ns
+        ## Index of name string
+        self.nameIndex = name
+        if resourceMap is None:
+            resourceMap = XmlResourceMap()
+
+        self._attributes = attributes
+        self._attributeSize = attributeSize
+        self._attributeCount = attributeCount
+        self._resourceMap = resourceMap
+
+    def __len__(self):
+        return self._attributeCount
+
+    def _fields(self):
+        return super()._fields() + [('ns', self.ns()), ('name', self.name()),
+                ('attributes', list(self.attributes()))]
+
+    def ns(self):
+        return self.string(self.nsIndex)
+
+    def name(self):
+        return self.string(self.nameIndex)
+
+    ## Returns XmlAttribute number INDEX
+    def attributeAt(self, index):
+        ns, name, raw, size, res0, dataType, data = \
+                XmlStartElement._attr.unpack_from(self._attributes,
+                        index * self._attributeSize)
+        return XmlAttribute(ns, name, raw, Res_value(size, res0, dataType,
+            data), self._strings, self._resourceMap.resid(name))
+
+    ## Generates XmlAttribute of every attribute in document order
+    def attributes(self):
+        for i in range(self._attributeCount):
+            yield self.attributeAt(i)
+
+    ## Returns attribute called NAME in namespace NS, None if there is none
+    # \details NAME may also be resource id of the attribute, eg.
+    # 0x0101021b for android:versionCode. Such lookup only compares string
+    # indices found through XmlResourceMap, no string is decoded.
+    def attribute(self, name, ns=None):
+        if isinstance(name, int):
+            index = self._resourceMap.index(name)
+            if index is None:
+                return None
+            for i in range(self._attributeCount):
+                if XmlStartElement._name.unpack_from(self._attributes,
+                        i * self._attributeSize + 4)[0] == index:
+                    return self.attributeAt(i)
+            return None
+
+        for attr in self.attributes():
+            if attr.name() == name and (ns is None or attr.ns() == ns):
+                return attr
+        return None
+
+    ## Checks whether element has attribute NAME (see attribute())
+    def has_attribute(self, name, ns=None):
+        return self.attribute(name, ns) is not None
+
+    ## Creates element from extension B of node chunk
+    def from_bytes(b, lineNumber, comment, strings, resourceMap):
+        ns, name, start, size, count, _, _, _ = \
+                XmlStartElement._ext.unpack_from(b)
+        return XmlStartElement(ResourceType.RES_XML_START_ELEMENT_TYPE,
+                lineNumber, comment, strings, ns, name,
+                b[start:start + size * count], size, count, resourceMap)
+
+## \class XmlEndElement
+# \brief End of element
+class XmlEndElement(XmlNode):
+
+    def __init__(self, chunkType, lineNumber, comment, strings, ns, name):
+        super().__init__(chunkType, lineNumber, comment, strings)
+        ## Index of namespace URI string, NO_STRING if there is none
+        self.nsIndex = ns
+        ## Index of name string
+        self.nameIndex = name
+
+    def _fields(self):
+        return super()._fields() + [('ns', self.ns()), ('name', self.name())]
+
+    def ns(self):
+        return self.string(self.nsIndex)
+
+    def name(self):
+        return self.string(self.nameIndex)
+
+## \class XmlCData
+# \brief Character data inside element
+class XmlCData(XmlNode):
+
+    def __init__(self, chunkType, lineNumber, comment, strings, data,
+            typedValue):
+        super().__init__(chunkType, lineNumber, comment, strings)
+        ## Index of text string
+        self.dataIndex = data
+        ## entry.Res_value with compiled value
+        self.typedValue = typedValue
+
+    def _fields(self):
+        return super()._fields() + [('data', self.data())]
+
+    def data(self):
+        return self.string(self.dataIndex)
+
+## \class XmlParser
+# \brief SAX-like parser of compiled XML
+# \details Iterating over parser generates XmlNode events in document order.
+# Chunks are read from file object one at a time and dropped once handled,
+# so apart from string pool and resource map memory use does not depend on
+# size of the document.
+class XmlParser:
+
+    _node = struct.Struct('<HHIII')
+    ## Types of chunks generating XmlNode events, others are skipped
+    _nodes = frozenset((ResourceType.RES_XML_START_NAMESPACE_TYPE,
+        ResourceType.RES_XML_END_NAMESPACE_TYPE,
+        ResourceType.RES_XML_START_ELEMENT_TYPE,
+        ResourceType.RES_XML_END_ELEMENT_TYPE,
+        ResourceType.RES_XML_CDATA_TYPE))
+
+    def __init__(self, source):
+        if not hasattr(source, 'read'):
+            source = io.BytesIO(source)
+        ## File object the document is read from
+        self.file = source
+        ## ResStringPool of the document, set once it is read
+        self.strings = None
+        ## XmlResourceMap of the document, empty until it is read
+        self.resourceMap = XmlResourceMap()
+
+        header, _ = ResChunk_header.from_bytes(self._read(
+            ResChunk_header.ResChunk_header_len))
+        if header.type != ResourceType.RES_XML_TYPE:
+            raise ChunkHeaderWrongTypeException(ResourceType.RES_XML_TYPE,
+                    header.type)
+        if header.headerSize.integer < ResChunk_header.ResChunk_header_len \
+                or header.size.integer < header.headerSize.integer:
+            raise ChunkOutOfBoundsException(0)
+        ## ResChunk_header of the document
+        self.header = header
+        self._read(header.headerSize.integer -
+                ResChunk_header.ResChunk_header_len)
+        self._left = header.size.integer - header.headerSize.integer
+
+    def _read(self, size):
+        b = self.file.read(size)
+        if len(b) != size:
+            raise EOFError('document ends inside chunk')
+        return b
+
+    ## Reads next chunk and returns its type, header size and whole bytes
+    # \details Raises ChunkOutOfBoundsException, if sizes in chunk header are
+    # smaller than the header itself or chunk does not fit in the document.
+    def _chunk(self):
+        head = self._read(8)
+        chunkType, headerSize, size = struct.unpack('<HHI', head)
+        if headerSize < 8 or size < headerSize or size > self._left:
+            raise ChunkOutOfBoundsException(self.header.size.integer -
+                    self._left)
+        return chunkType, headerSize, head + self._read(size - 8)
+
+    def __iter__(self):
+        while self._left > 0:
+            offset = self.header.size.integer - self._left
+            chunkType, headerSize, b = self._chunk()
+            self._left -= len(b)
+
+            if chunkType == ResourceType.RES_STRING_POOL_TYPE:
+                self.strings, _ = ResStringPool.from_bytes(b)
+                continue
+            if chunkType == ResourceType.RES_XML_RESOURCE_MAP_TYPE:
+                self.resourceMap, _ = XmlResourceMap.from_bytes(b)
+                continue
+            if chunkType not in XmlParser._nodes:
+                # unknown chunk, skip it
+                continue
+            if headerSize < XmlParser._node.size:
+                raise ChunkOutOfBoundsException(offset)
+
+            _, _, _, lineNumber, comment = XmlParser._node.unpack_from(b)
+            chunkType = ResourceType(chunkType)
+            ext = b[headerSize:]
+            if chunkType in (ResourceType.RES_XML_START_NAMESPACE_TYPE,
+                    ResourceType.RES_XML_END_NAMESPACE_TYPE):
+                prefix, uri = struct.unpack_from('<II', ext)
+                yield XmlNamespace(chunkType, lineNumber, comment,
+                        self.strings, prefix, uri)
+            elif chunkType == ResourceType.RES_XML_START_ELEMENT_TYPE:
+                yield XmlStartElement.from_bytes(ext, lineNumber, comment,
+                        self.strings, self.resourceMap)
+            elif chunkType == ResourceType.RES_XML_END_ELEMENT_TYPE:
+                ns, name = struct.unpack_from('<II', ext)
+                yield XmlEndElement(chunkType, lineNumber, comment,
+                        self.strings, ns, name)
+            elif chunkType == ResourceType.RES_XML_CDATA_TYPE:
+                data, = struct.unpack_from('<I', ext)
+                value, _ = Res_value.from_bytes(ext[4:12])
+                yield XmlCData(chunkType, lineNumber, comment, self.strings,
+                        data, value)
+
+## Generates XmlNode events of compiled XML in SOURCE
+# \details SOURCE is bytes-like object or file object opened in binary mode.
+def parse(source):
+    return iter(XmlParser(source))
+
+
+class XmlParserTests(unittest.TestCase):
+
+    ANDROID = 'http://schemas.android.com/apk/res/android'
+
+    ## Strings of test document, attribute names first for resource map
+    strings = ['versionCode', 'package', 'android', ANDROID, 'manifest',
+            'com.example', 'text', 'label']
+
+    def chunk(chunkType, headerSize, body):
+        return struct.pack('<HHI', chunkType, headerSize, 8 + len(body)) + \
+                body
+
+    def node(chunkType, line, ext):
+        return XmlParserTests.chunk(chunkType, 16, struct.pack('<II', line,
+            NO_STRING) + ext)
+
+    def tv1_bytes():
+        from arsc.merge import MergeTests
+        T = XmlParserTests
+        uri = T.strings.index(T.ANDROID)
+        attrs = struct.pack('<IIIHBBI', uri, 0, NO_STRING, 8, 0,
+                Res_value.TYPE_INT_DEC, 7) + \
+                struct.pack('<IIIHBBI', NO_STRING, 1, 5, 8, 0,
+                        Res_value.TYPE_STRING, 5)
+        body = bytes(MergeTests.pool(T.strings)) + \
+                bytes(XmlResourceMap([0x0101021b])) + \
+                T.node(ResourceType.RES_XML_START_NAMESPACE_TYPE, 1,
+                        struct.pack('<II', 2, uri)) + \
+                T.node(ResourceType.RES_XML_START_ELEMENT_TYPE, 1,
+                        struct.pack('<IIHHHHHH', NO_STRING, 4, 20, 20, 2, 0,
+                            0, 0) + attrs) + \
+                T.node(ResourceType.RES_XML_CDATA_TYPE, 2,
+                        struct.pack('<IHBBI', 6, 8, 0, Res_value.TYPE_NULL,
+                            0)) + \
+                T.node(ResourceType.RES_XML_END_ELEMENT_TYPE, 3,
+                        struct.pack('<II', NO_STRING, 4)) + \
+                T.node(ResourceType.RES_XML_END_NAMESPACE_TYPE, 3,
+                        struct.pack('<II', 2, uri))
+        return T.chunk(ResourceType.RES_XML_TYPE, 8, body)
+
+    def test_events(self):
+        invector = parse(XmlParserTests.tv1_bytes())
+        expected = [
+                (ResourceType.RES_XML_START_NAMESPACE_TYPE, 1),
+                (ResourceType.RES_XML_START_ELEMENT_TYPE, 1),
+                (ResourceType.RES_XML_CDATA_TYPE, 2),
+                (ResourceType.RES_XML_END_ELEMENT_TYPE, 3),
+                (ResourceType.RES_XML_END_NAMESPACE_TYPE, 3)]
+        actual = [(e.type, e.lineNumber) for e in invector]
+
+        self.assertEqual(expected, actual)
+
+    def test_namespace(self):
+        invector = next(parse(XmlParserTests.tv1_bytes()))
+        expected = ('android', XmlParserTests.ANDROID)
+        actual = (invector.prefix(), invector.uri())
+
+        self.assertEqual(expected, actual)
+
+    def test_start_element(self):
+        events = parse(XmlParserTests.tv1_bytes())
+        next(events)
+        invector = next(events)
+        expected = ('manifest', None, 2, [
+            (XmlParserTests.ANDROID, 'versionCode', 7, 0x0101021b),
+            (None, 'package', 'com.example', None)])
+        actual = (invector.name(), invector.ns(), len(invector), [
+            (a.ns(), a.name(), a.value(), a.resid)
+            for a in invector.attributes()])
+
+        self.assertEqual(expected, actual)
+
+    def test_attribute(self):
+        events = parse(XmlParserTests.tv1_bytes())
+        next(events)
+        invector = next(events)
+        expected = ('com.example', 7, 7, None)
+        actual = (invector.attribute('package').value(),
+                invector.attribute('versionCode',
+                    XmlParserTests.ANDROID).value(),
+                invector.attribute(0x0101021b).value(),
+                invector.attribute('label'))
+
+        self.assertEqual(expected, actual)
+
+    def test_cdata_and_end(self):
+        events = list(parse(XmlParserTests.tv1_bytes()))
+        expected = ('text', 'manifest')
+        actual = (events[2].data(), events[3].name())
+
+        self.assertEqual(expected, actual)
+
+    def test_file_object(self):
+        expected = list(parse(XmlParserTests.tv1_bytes()))
+        actual = list(parse(io.BytesIO(XmlParserTests.tv1_bytes())))
+
+        self.assertEqual(expected, actual)
+
+    def test_not_xml(self):
+        with self.assertRaises(Exception) as cm:
+            parse(b'\2\0\x0c\0\x0c\0\0\0\0\0\0\0')
+
+        expected = 'header must describe resource of type ' \
+                'ResourceType.RES_XML_TYPE (got ResourceType.RES_TABLE_TYPE)'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
+
+    def test_truncated(self):
+        with self.assertRaises(EOFError):
+            list(parse(XmlParserTests.tv1_bytes()[:-4]))
+
+    def test_wrong_chunk_size(self):
+        b = XmlParserTests.tv1_bytes()
+        # string pool is the first chunk, right after document header
+        small = b[:12] + struct.pack('<I', 4) + b[16:]
+        large = b[:12] + struct.pack('<I', len(b)) + b[16:]
+        header = b[:2] + struct.pack('<H', 4) + b[4:]
+        expected = ['chunk at offset 8 does not fit in its parent'] * 2 + \
+                ['chunk at offset 0 does not fit in its parent']
+        actual = []
+        for invector in (small, large, header):
+            with self.assertRaises(ChunkOutOfBoundsException) as cm:
+                list(parse(invector))
+            actual.append(cm.exception.args[1])
+
+        self.assertEqual(expected, actual)
+
+    def test_unknown_chunk(self):
+        T = XmlParserTests
+        b = T.tv1_bytes()
+        # 0x0110 is in range of XML node types, but is not one of them
+        unknown = T.node(0x0110, 1, b'') + T.chunk(0x0180, 8, b'')
+        invector = b[:4] + struct.pack('<I', len(b) + len(unknown)) + \
+                b[8:] + unknown
+        expected = list(parse(b))
+        actual = list(parse(invector))
+
+        self.assertEqual(expected, actual)
+
+    def test_small_node_header(self):
+        T = XmlParserTests
+        b = T.tv1_bytes()
+        node = T.chunk(ResourceType.RES_XML_END_ELEMENT_TYPE, 12,
+                struct.pack('<IIII', 1, NO_STRING, NO_STRING, 4))
+        invector = b[:4] + struct.pack('<I', len(b) + len(node)) + b[8:] + \
+                node
+        expected = 'chunk at offset %d does not fit in its parent' % len(b)
+        with self.assertRaises(ChunkOutOfBoundsException) as cm:
+            list(parse(invector))
+        actual = cm.exception.args[1]
+
+        self.assertEqual(expected, actual)
+
+    def test_has_attribute(self):
+        events = parse(XmlParserTests.tv1_bytes())
+        next(events)
+        invector = next(events)
+        expected = (True, False, True)
+        actual = (invector.has_attribute(0x0101021b),
+                invector.has_attribute(0x01010010),
+                invector.has_attribute('package'))
+
+        self.assertEqual(expected, actual)
+
+
+class XmlResourceMapTests(unittest.TestCase):
+
+    tv1_bytes = b'\x80\1\x08\0\x10\0\0\0\x1b\2\1\1\x10\0\1\1\x13\x37'
+
+    tv1_obj = XmlResourceMap([0x0101021b, 0x01010010])
+
+    def test_bytes(self):
+        expected = XmlResourceMapTests.tv1_bytes[:-2]
+        actual = bytes(XmlResourceMapTests.tv1_obj)
+
+        self.assertEqual(expected, actual)
+
+    def test_from_bytes(self):
+        expected = XmlResourceMapTests.tv1_obj, b'\x13\x37'
+        actual = XmlResourceMap.from_bytes(XmlResourceMapTests.tv1_bytes)
+
+        self.assertEqual(expected, actual)
+
+    def test_resid(self):
+        invector = XmlResourceMapTests.tv1_obj
+        expected = (0x01010010, None)
+        actual = (invector.resid(1), invector.resid(2))
+
+        self.assertEqual(expected, actual)
+
+    def test_index(self):
+        invector = XmlResourceMap([0x0101021b, 0x01010010, 0x0101021b])
+        expected = (0, 1, None)
+        actual = (invector.index(0x0101021b), invector.index(0x01010010),
+                invector.index(0x01010001))
+
+        self.assertEqual(expected, actual)
+
+    def test_wrong_type(self):
+        with self.assertRaises(Exception) as cm:
+            XmlResourceMap.from_bytes(b'\3\0\x08\0\x08\0\0\0')
+
+        expected = 'header must describe resource of type ' \
+                'ResourceType.RES_XML_RESOURCE_MAP_TYPE (got ' \
+                'ResourceType.RES_XML_TYPE)'
+        _, actual = cm.exception.args
+
+        self.assertEqual(expected, actual)
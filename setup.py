@@ -4,6 +4,7 @@ from distutils.core import setup
 setup(
         name = 'libarsc',
         packages = ['arsc', 'arsc.type', 'arsc.external'],
+        scripts = ['bin/arsc'],
         version = '0.2.0',
         description = 'Python library to manipulate resources.arsc files',
         url = 'https://github.com/v3l0c1r4pt0r/libarsc',